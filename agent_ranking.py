@@ -0,0 +1,77 @@
+"""Ranking de agentes robusto ao volume de ligações.
+
+A média bruta favorece quem tem poucas ligações: um agente com 2 análises a
+100% passa à frente de outro com 300 análises a 95%. Aqui cada agente recebe
+uma nota ajustada (média bayesiana, que puxa para a média geral quem tem pouco
+volume) e um intervalo de Wilson, todos calculados numa única passada a partir
+das somas e contagens por agente.
+"""
+import numpy as np
+import pandas as pd
+
+from schema import SCORE_COLUMN
+
+# Peso da média geral, em "ligações": com 10 ligações o agente já pesa metade
+DEFAULT_PRIOR_CALLS = 10
+# z de 95% para o intervalo de Wilson
+DEFAULT_Z = 1.96
+
+
+def wilson_interval(p, n, z=DEFAULT_Z):
+    """Intervalo de Wilson para proporções p (0-1) com n observações, vetorizado"""
+    p = np.asarray(p, dtype=float)
+    n = np.asarray(n, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = 1 + z ** 2 / n
+        center = (p + z ** 2 / (2 * n)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return center - half_width, center + half_width
+
+
+def build_agent_ranking(df, prior_calls=DEFAULT_PRIOR_CALLS, z=DEFAULT_Z, agent_col='CustomerAgent'):
+    """
+    Acerto bruto, nota ajustada e intervalo de Wilson por agente (sem ordenação).
+    Cada ligação entra no intervalo como uma proporção de acerto, o que o torna
+    uma aproximação conservadora para notas do checklist.
+    """
+    if agent_col not in df.columns:
+        return None
+
+    codes, agents = pd.factorize(df[agent_col], sort=True)
+    n_agents = len(agents)
+    has_agent = codes >= 0
+
+    scores = df[SCORE_COLUMN].to_numpy(dtype=float)
+    valid = has_agent & ~np.isnan(scores)
+    raw_sums = np.bincount(codes[valid], weights=scores[valid], minlength=n_agents)
+    counts = np.bincount(codes[valid], minlength=n_agents)
+
+    if 'IdAnalysis' in df.columns:
+        counted = has_agent & df['IdAnalysis'].notna().to_numpy()
+    else:
+        counted = has_agent
+    calls = np.bincount(codes[counted], minlength=n_agents)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw_mean = np.round(raw_sums / counts, 1)
+        prior_mean = raw_sums.sum() / counts.sum() if counts.sum() else np.nan
+        adjusted = (raw_sums + prior_calls * prior_mean) / (counts + prior_calls)
+        lower, upper = wilson_interval(np.clip(raw_sums / counts / 100, 0, 1), counts, z)
+
+    return pd.DataFrame({
+        'Porcentagem Média': raw_mean,
+        'Total Ligações': calls,
+        'Nota Ajustada': np.round(adjusted, 1),
+        'Limite Inferior': np.round(lower * 100, 1),
+        'Limite Superior': np.round(upper * 100, 1)
+    }, index=pd.Index(agents, name=agent_col))
+
+
+def rank_agents(ranking, n=None, ascending=False):
+    """Ordena pela nota ajustada; empates vão para quem tem mais ligações"""
+    ordered = ranking.sort_values(
+        ['Nota Ajustada', 'Total Ligações'],
+        ascending=[ascending, False],
+        na_position='last'
+    )
+    return ordered if n is None else ordered.head(n)
@@ -0,0 +1,73 @@
+"""Agregados do dashboard sem dependência do Streamlit.
+
+Usados pelos gráficos do app e pela API HTTP, para que os dois mostrem
+exatamente os mesmos números.
+"""
+import pandas as pd
+
+from checklist_bits import checklist_questions, question_values
+from question_matrix import QUESTION_NAMES
+from schema import SCORE_COLUMN
+
+
+def filter_dataset(df, empresa=None, agent=None, risk=None, start=None, end=None):
+    """Aplica os mesmos filtros da barra lateral; datas são inclusivas e None não filtra"""
+    mask = pd.Series(True, index=df.index)
+    if empresa is not None and 'Empresas' in df.columns:
+        mask &= df['Empresas'] == empresa
+    if agent is not None and 'CustomerAgent' in df.columns:
+        mask &= df['CustomerAgent'] == agent
+    if risk is not None and 'ClientRisk' in df.columns:
+        mask &= df['ClientRisk'] == risk
+    if 'AnalysisDateTime' in df.columns:
+        tz = df['AnalysisDateTime'].dt.tz
+        if start is not None:
+            mask &= df['AnalysisDateTime'] >= pd.Timestamp(start).tz_localize(tz)
+        if end is not None:
+            mask &= df['AnalysisDateTime'] < pd.Timestamp(end).tz_localize(tz) + pd.Timedelta(days=1)
+    return df if mask.all() else df[mask]
+
+
+def compute_kpis(df):
+    """Valores dos cards de KPI: total, acerto médio, % risco baixo e taxa de saudação"""
+    total_analyses = len(df)
+
+    avg_score = df[SCORE_COLUMN].mean()
+
+    low_risk_pct = (df['ClientRisk'] == 'BAIXO').sum() / len(df) * 100 if 'ClientRisk' in df.columns and len(df) > 0 else 0
+
+    # Taxa de Saudação (Question1) - mesmo cálculo do gráfico de performance
+    saudacao_pct = pd.Series(question_values(df, 'Question1')).mean() * 100 if 'Question1' in checklist_questions(df) else 0
+
+    return {
+        'total_analyses': total_analyses,
+        'avg_score': avg_score,
+        'low_risk_pct': low_risk_pct,
+        'saudacao_pct': saudacao_pct
+    }
+
+
+def compute_company_stats(df):
+    """Acerto médio, total de análises e % de risco baixo por empresa, do melhor para o pior"""
+    if 'Empresas' not in df.columns:
+        return None
+
+    by_company = df.groupby('Empresas')
+    company_stats = pd.DataFrame({
+        'Porcentagem Média': by_company[SCORE_COLUMN].mean(),
+        # size() conta TODOS os registros (não ignora NaN)
+        'Total Análises': by_company.size(),
+        '% Risco Baixo': (df['ClientRisk'] == 'BAIXO').groupby(df['Empresas']).mean() * 100 if 'ClientRisk' in df.columns else 0.0
+    })
+    company_stats[['Porcentagem Média', '% Risco Baixo']] = company_stats[['Porcentagem Média', '% Risco Baixo']].round(1)
+
+    return company_stats.sort_values('Porcentagem Média', ascending=False)
+
+
+def compute_improvement_points(question_matrix, limit=3):
+    """Critérios abaixo da meta de 70%, do pior para o melhor"""
+    weak_questions = [(q, perf) for q, perf in question_matrix.overall_by_question().items() if perf < 70]
+    weak_questions.sort(key=lambda x: x[1])
+    return [(QUESTION_NAMES.get(q, q), perf) for q, perf in weak_questions[:limit]]
+
+
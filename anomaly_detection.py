@@ -0,0 +1,164 @@
+"""Detecção de dias anômalos por agente e por empresa.
+
+Parte dos agregados diários do motor de KPIs (kpi_engine.py). Para cada
+entidade, as somas diárias viram uma matriz entidade × dia com somas de
+prefixo ao longo dos dias; a referência de cada dia é a janela móvel dos
+BASELINE_DAYS dias anteriores, obtida pela diferença de dois prefixos.
+Cada dia é comparado à sua referência por um z-score:
+
+- Queda de acerto: média do dia contra média e desvio das ligações da janela
+- Pico de risco alto: contagem de ALTO do dia contra a taxa binomial da janela
+"""
+import numpy as np
+import pandas as pd
+
+BASELINE_DAYS = 28
+Z_THRESHOLD = 3.0
+CRITICAL_Z = 4.0
+MIN_DAY_CALLS = 3
+MIN_BASELINE_CALLS = 20
+# Com poucos ALTO esperados no dia a aproximação normal da binomial gera falsos picos
+MIN_EXPECTED_ALTO = 1.0
+# Piso do desvio por ligação (em p.p.), para janelas em que todas as notas coincidem
+MIN_SCORE_STD = 1.0
+
+DETECTION_FIELDS = ['calls', 'score_sum', 'score_sq', 'score_n', 'alto']
+
+ENTITY_LEVELS = {
+    'Empresa': 'Empresas',
+    'Agente': 'CustomerAgent'
+}
+
+ALERT_COLUMNS = ['Data', 'Nível', 'Nome', 'Empresa', 'Alerta', 'Valor do Dia', 'Referência', 'Ligações', 'z', 'Severidade']
+
+
+def daily_matrices(daily, entity_col, first_day, n_days):
+    """Matrizes entidade × dia de cada campo somado, mais os nomes e a empresa de cada entidade"""
+    codes, names = pd.factorize(daily[entity_col], sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+    positions = (daily['day'][valid] - first_day).dt.days.to_numpy()
+    flat = codes * n_days + positions
+    size = len(names) * n_days
+
+    matrices = {
+        field: np.bincount(flat, weights=daily[field].to_numpy(dtype=float)[valid], minlength=size).reshape(len(names), n_days)
+        for field in DETECTION_FIELDS
+    }
+
+    if entity_col == 'Empresas':
+        return names, np.asarray(names, dtype=object), matrices
+
+    # Empresa de referência de cada entidade: a de maior volume
+    volume = daily[valid].groupby([entity_col, 'Empresas'], dropna=False)['calls'].sum()
+    companies = volume.sort_values(ascending=False).reset_index().drop_duplicates(entity_col).set_index(entity_col)['Empresas']
+    return names, companies.reindex(names).to_numpy(), matrices
+
+
+def trailing_window(matrix, days):
+    """Soma, para cada dia, dos `days` dias anteriores (exclusive o próprio dia)"""
+    n_days = matrix.shape[1]
+    prefix = np.concatenate([np.zeros((matrix.shape[0], 1)), np.cumsum(matrix, axis=1)], axis=1)
+    end = np.arange(n_days)
+    start = np.maximum(end - days, 0)
+    return prefix[:, end] - prefix[:, start]
+
+
+def score_drop_z(matrices, days=BASELINE_DAYS):
+    """z-score da média do dia contra a janela; também retorna a média do dia e a da janela"""
+    n = matrices['score_n']
+    base_n = trailing_window(n, days)
+    base_sum = trailing_window(matrices['score_sum'], days)
+    base_sq = trailing_window(matrices['score_sq'], days)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        day_mean = matrices['score_sum'] / n
+        base_mean = base_sum / base_n
+        base_std = np.sqrt(np.maximum(base_sq / base_n - base_mean ** 2, MIN_SCORE_STD ** 2))
+        z = (day_mean - base_mean) / (base_std / np.sqrt(n))
+
+    eligible = (n >= MIN_DAY_CALLS) & (base_n >= MIN_BASELINE_CALLS)
+    return np.where(eligible, z, np.nan), day_mean, base_mean, n
+
+
+def high_risk_spike_z(matrices, days=BASELINE_DAYS):
+    """z-score binomial da contagem de ALTO do dia contra a taxa da janela (em %)"""
+    calls = matrices['calls']
+    base_calls = trailing_window(calls, days)
+    # Suavização evita taxa de referência zero, que tornaria qualquer ALTO infinitamente anômalo
+    base_rate = (trailing_window(matrices['alto'], days) + 0.5) / (base_calls + 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = calls * base_rate
+        # Correção de continuidade: contagens pequenas não viram desvios grandes por arredondamento
+        z = (matrices['alto'] - expected - 0.5) / np.sqrt(expected * (1 - base_rate))
+        day_rate = matrices['alto'] / calls * 100
+
+    eligible = (calls >= MIN_DAY_CALLS) & (base_calls >= MIN_BASELINE_CALLS) & (expected >= MIN_EXPECTED_ALTO)
+    return np.where(eligible, z, np.nan), day_rate, base_rate * 100, calls
+
+
+def collect_alerts(level, names, companies, days, label, z, day_value, base_value, volume, flagged):
+    rows, cols = np.nonzero(flagged)
+    return pd.DataFrame({
+        'Data': days[cols],
+        'Nível': level,
+        'Nome': names[rows],
+        'Empresa': companies[rows],
+        'Alerta': label,
+        'Valor do Dia': day_value[rows, cols],
+        'Referência': base_value[rows, cols],
+        'Ligações': volume[rows, cols].astype(np.int64),
+        'z': z[rows, cols]
+    })
+
+
+def detect_anomalies(daily, z_threshold=Z_THRESHOLD, days=BASELINE_DAYS):
+    """
+    Alertas de queda de acerto e de pico de risco alto por agente e por empresa,
+    ordenados do mais para o menos anômalo (|z| decrescente).
+    """
+    if daily is None or len(daily) == 0:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    first_day = daily['day'].min()
+    n_days = (daily['day'].max() - first_day).days + 1
+    calendar = pd.date_range(first_day, periods=n_days, freq='D')
+
+    alerts = []
+    for level, entity_col in ENTITY_LEVELS.items():
+        if entity_col not in daily.columns:
+            continue
+        names, companies, matrices = daily_matrices(daily, entity_col, first_day, n_days)
+        names = np.asarray(names, dtype=object)
+
+        z, day_mean, base_mean, n = score_drop_z(matrices, days)
+        alerts.append(collect_alerts(
+            level, names, companies, calendar, 'Queda de Acerto',
+            z, day_mean, base_mean, n, z <= -z_threshold
+        ))
+
+        z, day_rate, base_rate, calls = high_risk_spike_z(matrices, days)
+        alerts.append(collect_alerts(
+            level, names, companies, calendar, 'Pico de Risco Alto',
+            z, day_rate, base_rate, calls, z >= z_threshold
+        ))
+
+    result = pd.concat(alerts, ignore_index=True)
+    result['Severidade'] = np.where(result['z'].abs() >= CRITICAL_Z, 'Crítico', 'Atenção')
+    result = result.iloc[np.argsort(-result['z'].abs().to_numpy(), kind='stable')].reset_index(drop=True)
+    return result[ALERT_COLUMNS]
+
+
+def filter_alerts(alerts, empresa=None, agent=None, start=None, end=None):
+    """Restringe os alertas à seleção da barra lateral; None não filtra"""
+    mask = np.ones(len(alerts), dtype=bool)
+    if empresa is not None:
+        mask &= (alerts['Empresa'] == empresa).to_numpy()
+    if agent is not None:
+        mask &= ((alerts['Nível'] == 'Agente') & (alerts['Nome'] == agent)).to_numpy()
+    if start is not None:
+        mask &= (alerts['Data'].dt.date >= start).to_numpy()
+    if end is not None:
+        mask &= (alerts['Data'].dt.date <= end).to_numpy()
+    return alerts[mask]
@@ -0,0 +1,154 @@
+"""Armazenamento do dataset tratado em arquivos Arrow IPC (Feather v2).
+
+O arquivo é gravado sem compressão e aberto via memory-map, de modo que
+vários processos do servidor leem as mesmas páginas do cache do sistema
+operacional em vez de manter cada um a sua cópia. Colunas numéricas e de
+data sem valores nulos chegam ao pandas sem cópia; com pandas >= 3 as
+colunas de texto também permanecem apoiadas na memória do Arrow.
+
+O diretório tem limite de bytes (MONITORAI_STORE_MB): a cada gravação, os
+arquivos de versões anteriores do armazenamento saem, e os datasets usados
+há mais tempo (pela data de modificação, renovada a cada abertura) são
+apagados, com suas tabelas auxiliares, até o total caber no limite. Um
+processo que ainda tenha o arquivo aberto via memory-map continua lendo-o.
+"""
+import os
+import re
+import tempfile
+import time
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+STORE_DIR_ENV_VAR = 'MONITORAI_STORE_DIR'
+STORE_BUDGET_ENV_VAR = 'MONITORAI_STORE_MB'
+DEFAULT_STORE_BUDGET_MB = 4096
+# Temporários mais antigos que isso são gravações interrompidas, não em andamento
+STALE_TMP_SECONDS = 3600
+STORE_FILE_RE = re.compile(r'^(?P<key>[^.]+)(?:\.[^.]+)?\.v(?P<version>\d+)\.arrow$')
+
+# Incrementar sempre que o tratamento feito em load_data mudar, para que
+# arquivos gravados por versões anteriores não sejam reaproveitados
+STORE_VERSION = 5
+
+
+def store_dir():
+    path = os.environ.get(STORE_DIR_ENV_VAR) or os.path.join(tempfile.gettempdir(), 'monitorai_store')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def store_path(key):
+    return os.path.join(store_dir(), f"{key}.v{STORE_VERSION}.arrow")
+
+
+def side_table_key(key, name):
+    """Chave de uma tabela auxiliar do dataset (ex.: quarentena), fora de list_datasets"""
+    return f"{key}.{name}"
+
+
+def list_datasets():
+    """Chaves dos datasets gravados na versão atual, do mais recente para o mais antigo"""
+    suffix = f".v{STORE_VERSION}.arrow"
+    directory = store_dir()
+    # Tabelas auxiliares têm "." na chave e não são datasets por si
+    entries = [name for name in os.listdir(directory) if name.endswith(suffix) and '.' not in name[:-len(suffix)]]
+    entries.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+    return [name[:-len(suffix)] for name in entries]
+
+
+def save_dataset(key, df):
+    """Grava o DataFrame tratado; retorna False se o Arrow não estiver disponível ou a gravação falhar"""
+    if not ARROW_AVAILABLE:
+        return False
+
+    path = store_path(key)
+    if os.path.exists(path):
+        return True
+
+    # Grava em arquivo temporário e renomeia: outro processo nunca vê um arquivo pela metade
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir(), suffix='.tmp')
+    os.close(fd)
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(table, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, path)
+    except (OSError, pa.ArrowException):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    prune_store(keep=key.split('.')[0])
+    return True
+
+
+def prune_store(keep=None, budget_bytes=None):
+    """
+    Apaga os arquivos de outras versões, os temporários abandonados e, acima
+    do limite de bytes, os datasets usados há mais tempo (exceto `keep`)
+    """
+    if budget_bytes is None:
+        budget_bytes = float(os.environ.get(STORE_BUDGET_ENV_VAR, DEFAULT_STORE_BUDGET_MB)) * 1024 ** 2
+    directory = store_dir()
+    now = time.time()
+    # dataset -> [bytes, uso mais recente, arquivos], somando as tabelas auxiliares
+    datasets = {}
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            info = os.stat(path)
+            if name.endswith('.tmp'):
+                if now - info.st_mtime > STALE_TMP_SECONDS:
+                    os.remove(path)
+                continue
+            match = STORE_FILE_RE.match(name)
+            if match is None:
+                continue
+            if int(match.group('version')) != STORE_VERSION:
+                os.remove(path)
+                continue
+        except OSError:
+            continue
+        entry = datasets.setdefault(match.group('key'), [0, 0.0, []])
+        entry[0] += info.st_size
+        entry[1] = max(entry[1], info.st_mtime)
+        entry[2].append(path)
+
+    total = sum(entry[0] for entry in datasets.values())
+    for key, (nbytes, _, paths) in sorted(datasets.items(), key=lambda item: item[1][1]):
+        if total <= budget_bytes:
+            break
+        if key == keep:
+            continue
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= nbytes
+
+
+def open_dataset(key):
+    """Abre o dataset gravado via memory-map; retorna None se ele não existir"""
+    if not ARROW_AVAILABLE:
+        return None
+
+    path = store_path(key)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        # A data de modificação marca o último uso, para a limpeza por LRU
+        os.utime(path)
+    except OSError:
+        pass
+    try:
+        with pa.memory_map(path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        # split_blocks evita consolidar colunas num bloco 2D, o que forçaria cópia
+        return table.to_pandas(split_blocks=True)
+    except (OSError, pa.ArrowException):
+        return None
@@ -0,0 +1,181 @@
+"""Benchmark de latência da API JSON sob carga concorrente, todo local.
+
+Sobe a API numa porta livre com um dataset sintético e dispara requisições
+com combinações aleatórias de filtros a partir de várias threads cliente,
+medindo p50/p95/p99 por nível de concorrência em duas fases:
+
+- cache frio: com o cache de respostas vazio, cada combinação é pedida uma
+  única vez, então toda requisição é um miss (a resposta é calculada);
+- cache quente: as combinações são sorteadas, com repetição, depois de
+  calculadas uma vez, como numa API já em uso; a coluna "hits" traz a
+  fração de respostas servidas do cache.
+
+Uso:
+    python bench_api.py [--rows 200000] [--concurrency 1,8,32] [--requests 2000]
+                        [--p99-target-ms 50] [--cold-p99-target-ms 2000]
+
+Sai com código 1 se o p99 de algum nível com o cache quente ultrapassar a
+meta, ou, quando --cold-p99-target-ms é informado, se o de algum nível com o
+cache frio ultrapassar a dele. Sem essa opção, o cache frio é só medido.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+
+from ingestion import clean_dataframe
+from monitor_api import AggregateStore, DatasetCatalog, MonitorApi, create_server
+from synthetic_data import make_consulta1
+
+
+def build_request_pool(df, size, seed=0):
+    """Caminhos de requisição com filtros variados, amostrados de valores reais do dataset"""
+    rng = random.Random(seed)
+    empresas = [None] + sorted(df['Empresas'].unique().tolist())
+    agents = [None] + sorted(df['CustomerAgent'].unique().tolist())
+    risks = [None, 'BAIXO', 'MEDIO', 'ALTO']
+    months = [None] + [f"2025-{month:02d}" for month in range(1, 7)]
+
+    pool = []
+    for _ in range(size * 10):
+        if len(pool) == size:
+            break
+        params = {}
+        empresa, agent, risk, month = rng.choice(empresas), rng.choice(agents), rng.choice(risks), rng.choice(months)
+        if empresa:
+            params['empresa'] = empresa
+        if agent and rng.random() < 0.3:
+            params['agente'] = agent
+        if risk:
+            params['risco'] = risk
+        if month:
+            params['inicio'] = f"{month}-01"
+            params['fim'] = f"{month}-28"
+        endpoint = rng.choice(['/kpis', '/empresas', '/agentes', '/criterios'])
+        path = f"{endpoint}?{urlencode(params)}" if params else endpoint
+        # Combinações distintas: no cache frio, cada uma é um miss
+        if path not in pool:
+            pool.append(path)
+    return pool
+
+
+def run_level(base_url, store, pool, concurrency, n_requests, cold=False):
+    """
+    Latências de n_requests requisições sorteadas do pool, ou, com cold, de
+    cada caminho do pool uma única vez, repartidos entre as threads
+    """
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        if cold:
+            paths = pool[worker_id::concurrency]
+        else:
+            paths = [rng.choice(pool) for _ in range(n_requests // concurrency)]
+        local = []
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=30) as response:
+                    response.read()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    before = store.stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = store.stats()
+    hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+
+    values = np.array(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': len(values),
+        'errors': len(errors),
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'rps': len(values) / elapsed if elapsed > 0 else 0,
+        'p50': np.percentile(values, 50) if len(values) else float('nan'),
+        'p95': np.percentile(values, 95) if len(values) else float('nan'),
+        'p99': np.percentile(values, 99) if len(values) else float('nan')
+    }
+
+
+def print_header():
+    print(f"{'conc.':>6} {'req':>7} {'erros':>6} {'hits':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+
+def print_result(result, p99_target_ms):
+    """Imprime a linha do nível; retorna True se ele falhou"""
+    if p99_target_ms is None:
+        status = '-'
+    else:
+        status = 'ok' if result['p99'] <= p99_target_ms else 'ACIMA DA META'
+    print(f"{result['concurrency']:>6} {result['requests']:>7} {result['errors']:>6} {result['hit_ratio']:>6.0%} {result['rps']:>9.0f} "
+          f"{result['p50']:>8.2f} {result['p95']:>8.2f} {result['p99']:>8.2f}  {status}")
+    return status == 'ACIMA DA META' or result['errors'] > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de latência da API do Monitor AI')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=2000, help='requisições por nível de concorrência')
+    parser.add_argument('--distinct', type=int, default=300, help='combinações distintas de filtros')
+    parser.add_argument('--p99-target-ms', type=float, default=50.0, help='meta do p99 com o cache quente')
+    parser.add_argument('--cold-p99-target-ms', type=float, help='meta do p99 com o cache frio (sem meta, se omitido)')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    # Armazenamento isolado para não misturar com os datasets reais do dashboard
+    os.environ.setdefault('MONITORAI_STORE_DIR', tempfile.mkdtemp(prefix='monitorai_bench_'))
+
+    print(f"Gerando {args.rows} linhas sintéticas...")
+    df = clean_dataframe(make_consulta1(args.rows))
+    api = MonitorApi(catalog=DatasetCatalog(), store=AggregateStore())
+    api.catalog.register('bench', df)
+
+    server = create_server(api, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    pool = build_request_pool(df, args.distinct)
+    failed = False
+
+    cold_target = f"meta p99 {args.cold_p99_target_ms:.0f} ms" if args.cold_p99_target_ms is not None else "sem meta"
+    print(f"Cache frio: {len(pool)} combinações distintas, cada uma pedida uma vez ({cold_target})")
+    print_header()
+    for concurrency in levels:
+        # Cache vazio a cada nível: toda requisição calcula a resposta
+        api.store = AggregateStore()
+        result = run_level(base_url, api.store, pool, concurrency, len(pool), cold=True)
+        failed = print_result(result, args.cold_p99_target_ms) or failed
+
+    print(f"Cache quente: {args.requests} requisições sorteadas por nível (meta p99 {args.p99_target_ms:.0f} ms)")
+    print_header()
+    for concurrency in levels:
+        result = run_level(base_url, api.store, pool, concurrency, args.requests)
+        failed = print_result(result, args.p99_target_ms) or failed
+
+    print(f"Cache: {api.store.stats()}")
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
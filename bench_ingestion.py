@@ -0,0 +1,143 @@
+"""Benchmark de ingestão: vazão (linhas/s) de cada formato de entrada, todo local.
+
+Gera um único dataset sintético, grava-o em cada formato aceito e mede a
+leitura e o tratamento (esquema + regras de descarte) de cada arquivo. Todos
+os formatos precisam chegar ao mesmo resultado tratado. A planilha também é
+lida em blocos (prepare_workbook_chunked, a leitura da tela de
+carregamento), que precisa sair idêntica à leitura de uma vez, inclusive a
+quarentena. Em todos os formatos, as linhas da quarentena (malformadas ou
+descartadas pelas regras) trazem o checklist em Question1..12, sem as
+máscaras de bits.
+
+Uso:
+    python bench_ingestion.py [--rows 100000] [--formats xlsx,csv,parquet,jsonl] [--repeat 3]
+
+Sai com código 1 se algum formato divergir do resultado da planilha, se a
+leitura em blocos não for idêntica à de uma vez ou se a quarentena de algum
+formato não tiver as colunas Question1..12.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from checklist_bits import ANSWERED_COLUMN, PASSED_COLUMN, QUESTION_COLUMNS
+from ingestion import INPUT_EXTENSIONS, prepare_dataframe, prepare_input, prepare_workbook_chunked, read_input
+from synthetic_data import make_consulta1, write_workbook
+
+WRITERS = {
+    'xlsx': write_workbook,
+    'csv': lambda df, path: df.to_csv(path, index=False),
+    'parquet': lambda df, path: df.to_parquet(path, index=False),
+    'jsonl': lambda df, path: df.to_json(path, orient='records', lines=True, date_format='iso', force_ascii=False)
+}
+
+
+def measure(path, repeat):
+    """Melhor tempo de leitura e de tratamento entre `repeat` execuções, e o resultado (df, quarentena)"""
+    read_times, clean_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        raw = read_input(path)
+        read_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = prepare_dataframe(raw)
+        clean_times.append(time.perf_counter() - start)
+    return min(read_times), min(clean_times), result
+
+
+def identical(left, right):
+    """True se os dois resultados (df, quarentena) são iguais, valores e tipos"""
+    try:
+        pd.testing.assert_frame_equal(left[0], right[0])
+        pd.testing.assert_frame_equal(left[1], right[1])
+    except AssertionError:
+        return False
+    return True
+
+
+def quarantine_unpacked(quarantine):
+    """True se a quarentena tem as colunas Question1..12 e nenhuma das máscaras de bits"""
+    return (all(q in quarantine.columns for q in QUESTION_COLUMNS)
+            and PASSED_COLUMN not in quarantine.columns and ANSWERED_COLUMN not in quarantine.columns)
+
+
+def measure_progressive(path):
+    """Tempo da leitura em blocos da planilha e se ela sai idêntica à leitura de uma vez"""
+    start = time.perf_counter()
+    progressive = prepare_workbook_chunked(path, lambda partial: None)
+    elapsed = time.perf_counter() - start
+    return elapsed, identical(progressive, prepare_input(path))
+
+
+def fingerprint(df):
+    """Resumo do resultado tratado para comparar formatos"""
+    return (
+        len(df),
+        round(float(df['PERCENTUAL'].sum()), 6),
+        tuple(sorted(df['ClientRisk'].value_counts().items())),
+        tuple(sorted(df['Empresas'].value_counts().items()))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de ingestão por formato do Monitor AI')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--formats', default='xlsx,csv,parquet,jsonl')
+    parser.add_argument('--repeat', type=int, default=3, help='execuções por formato (vale a melhor)')
+    args = parser.parse_args()
+
+    formats = [fmt for fmt in args.formats.split(',') if fmt in INPUT_EXTENSIONS and fmt in WRITERS]
+    workdir = tempfile.mkdtemp(prefix='monitorai_ingestion_')
+
+    print(f"Gerando {args.rows} linhas sintéticas...")
+    raw = make_consulta1(args.rows)
+
+    results = []
+    try:
+        for fmt in formats:
+            path = os.path.join(workdir, f"consulta1.{fmt}")
+            WRITERS[fmt](raw, path)
+            # A planilha é lenta demais para repetir; os demais formatos usam a melhor de `repeat`
+            read_s, clean_s, (df, quarantine) = measure(path, 1 if fmt == 'xlsx' else args.repeat)
+            results.append({
+                'format': fmt,
+                'mb': os.path.getsize(path) / 1024 ** 2,
+                'read_s': read_s,
+                'clean_s': clean_s,
+                'rows_s': args.rows / (read_s + clean_s),
+                'fingerprint': fingerprint(df),
+                'quarantine_ok': quarantine_unpacked(quarantine)
+            })
+            if fmt == 'xlsx':
+                progressive_s, progressive_ok = measure_progressive(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = results[0]
+    print(f"{'formato':>8} {'MB':>8} {'leitura s':>10} {'trat. s':>8} {'linhas/s':>11} {'x ' + baseline['format']:>8}")
+    failed = False
+    for result in results:
+        matches = result['fingerprint'] == baseline['fingerprint']
+        failed = failed or not matches or not result['quarantine_ok']
+        print(f"{result['format']:>8} {result['mb']:>8.1f} {result['read_s']:>10.2f} {result['clean_s']:>8.2f} "
+              f"{result['rows_s']:>11,.0f} {result['rows_s'] / baseline['rows_s']:>8.1f}"
+              f"{'' if matches else '  RESULTADO DIVERGENTE'}"
+              f"{'' if result['quarantine_ok'] else '  QUARENTENA SEM Question1..12'}")
+
+    if 'xlsx' in formats:
+        failed = failed or not progressive_ok
+        print(f"Planilha em blocos: {progressive_s:.2f}s ({args.rows / progressive_s:,.0f} linhas/s), "
+              f"{'idêntica à leitura de uma vez' if progressive_ok else 'RESULTADO DIVERGENTE da leitura de uma vez'}")
+    print(f"Threads disponíveis: {os.cpu_count()}; registros válidos: {baseline['fingerprint'][0]} "
+          f"(acerto médio {baseline['fingerprint'][1] / max(baseline['fingerprint'][0], 1):.2f}%)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+"""Teste de carga do dashboard com várias sessões simultâneas, todo local.
+
+Cada sessão é um AppTest do Streamlit rodando o streamlit_app.py no mesmo
+processo, como as sessões de um servidor: caches de recurso, registro de
+datasets e filas de exportação são compartilhados, o session_state não. A
+sessão envia uma planilha Consulta1 sintética, troca empresa, agente, risco
+e período, pede o PDF e o Excel e espera os downloads. As abas não disparam
+rerun (o Streamlit troca de aba no navegador), mas todas são renderizadas em
+cada rerun medido.
+
+Para cada nível de concorrência, mede a latência dos reruns (p50/p95/p99), o
+tempo até as exportações ficarem prontas, a CPU do processo e o pico de RSS.
+
+Uso:
+    python bench_sessions.py [--rows 20000] [--concurrency 1,4,8] [--interactions 8] [--think-ms 200]
+
+Sai com código 1 se algum rerun falhar ou se o p95 passar de --p95-target-ms.
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from synthetic_data import make_consulta1, write_workbook
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_app.py')
+XLSX_MIME = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Botões de exportação da barra lateral, na ordem do dashboard
+EXPORT_BUTTONS = ['📄 Gerar Relatório PDF', '📊 Gerar Relatório Excel']
+
+
+class RssSampler:
+    """Pico de RSS do processo, amostrado numa thread enquanto o nível roda"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # Sem /proc (macOS): o pico desde o início do processo, em bytes
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+class Session:
+    """Uma sessão simulada; cada interação é um rerun cronometrado"""
+
+    def __init__(self, workbook, timeout, think_ms, seed):
+        from streamlit.testing.v1 import AppTest
+
+        self.workbook = workbook
+        self.think_ms = think_ms
+        self.rng = random.Random(seed)
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.reruns = []
+        self.exports = []
+        self.errors = []
+
+    def timed(self, label, action):
+        if self.think_ms:
+            time.sleep(self.rng.uniform(0, 2 * self.think_ms) / 1000)
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            self.errors.append(f"{label}: {e}")
+            return
+        self.reruns.append((label, (time.perf_counter() - start) * 1000))
+        self.errors.extend(f"{label}: {exception.value}" for exception in self.at.exception)
+
+    def select(self, label, option=None):
+        box = next((box for box in self.at.sidebar.selectbox if box.label == label), None)
+        if box is None or len(box.options) < 2:
+            return
+        choice = option if option is not None else self.rng.choice(box.options[1:])
+        self.timed(label, lambda: box.select(choice).run())
+
+    def pick_period(self):
+        date_inputs = self.at.sidebar.date_input
+        if not date_inputs:
+            return
+        start, end = date_inputs[0].value
+        days = (end - start).days
+        if days < 2:
+            return
+        first = start + (end - start) * self.rng.uniform(0, 0.5)
+        self.timed('📅 Período', lambda: date_inputs[0].set_value((first, end)).run())
+
+    def wait_exports(self, expected, poll_s=0.5, timeout_s=120):
+        """Reexecuta até os downloads das exportações pedidas aparecerem"""
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout_s:
+            downloads = [button for button in self.at.sidebar.get('download_button')
+                         if 'Registros Descartados' not in button.proto.label]
+            if len(downloads) >= expected:
+                self.exports.append(time.perf_counter() - start)
+                return
+            time.sleep(poll_s)
+            self.timed('poll', lambda: self.at.run())
+        self.errors.append(f"exportações não ficaram prontas em {timeout_s}s")
+
+    def run(self, interactions):
+        self.timed('abrir', lambda: self.at.run())
+        self.timed('upload', lambda: self.at.file_uploader[0].set_value(
+            (os.path.basename(self.workbook['path']), self.workbook['data'], XLSX_MIME)).run())
+        if self.errors:
+            return
+
+        for _ in range(interactions):
+            step = self.rng.choice(['🏢 Empresa', '👤 Agente', '⚠️ Nível de Risco', '📅 Período', 'limpar'])
+            if step == '📅 Período':
+                self.pick_period()
+            elif step == 'limpar':
+                self.select('🏢 Empresa', 'Todas')
+            else:
+                self.select(step)
+
+        buttons = [button for button in self.at.sidebar.button if button.label in EXPORT_BUTTONS]
+        for button in buttons:
+            self.timed(button.label, lambda button=button: button.click().run())
+        self.wait_exports(len(buttons))
+
+
+def run_level(workbook, concurrency, args):
+    sessions = [Session(workbook, args.timeout, args.think_ms, seed=concurrency * 1000 + i) for i in range(concurrency)]
+    threads = [threading.Thread(target=session.run, args=(args.interactions,)) for session in sessions]
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    with RssSampler() as rss:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    # Os polls de exportação só esperam o trabalho em segundo plano; ficam fora dos percentis
+    latencies = np.array([ms for session in sessions for label, ms in session.reruns if label != 'poll'])
+    exports = np.array([seconds for session in sessions for seconds in session.exports])
+    errors = [error for session in sessions for error in session.errors]
+    return {
+        'concurrency': concurrency,
+        'reruns': len(latencies),
+        'errors': errors,
+        'p50': np.percentile(latencies, 50) if len(latencies) else float('nan'),
+        'p95': np.percentile(latencies, 95) if len(latencies) else float('nan'),
+        'p99': np.percentile(latencies, 99) if len(latencies) else float('nan'),
+        'export_p50': np.percentile(exports, 50) if len(exports) else float('nan'),
+        'cpu_s': cpu,
+        'cpu_pct': cpu / elapsed * 100 if elapsed > 0 else 0,
+        'rss_mb': rss.peak / 1024 ** 2,
+        'elapsed': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga de sessões simultâneas do Monitor AI')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--concurrency', default='1,4,8')
+    parser.add_argument('--interactions', type=int, default=8, help='trocas de filtro por sessão')
+    parser.add_argument('--think-ms', type=float, default=200, help='pausa média entre interações')
+    parser.add_argument('--timeout', type=float, default=300, help='tempo máximo de um rerun, em segundos')
+    parser.add_argument('--p95-target-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    # Armazenamento isolado para não misturar com os datasets reais do dashboard
+    os.environ.setdefault('MONITORAI_STORE_DIR', tempfile.mkdtemp(prefix='monitorai_bench_'))
+    workdir = tempfile.mkdtemp(prefix='monitorai_sessions_')
+
+    print(f"Gerando planilha com {args.rows} linhas sintéticas...")
+    path = os.path.join(workdir, 'consulta1_sintetica.xlsx')
+    write_workbook(make_consulta1(args.rows), path)
+    with open(path, 'rb') as workbook_file:
+        workbook = {'path': path, 'data': workbook_file.read()}
+
+    # Uma sessão de aquecimento carrega o dataset; os níveis medem o uso em regime
+    warmup = Session(workbook, args.timeout, 0, seed=0)
+    warmup.run(0)
+    load_ms = dict(warmup.reruns).get('upload', float('nan'))
+    if warmup.errors:
+        print(f"Falha no aquecimento: {warmup.errors[:3]}")
+        sys.exit(1)
+    print(f"Carga inicial da planilha: {load_ms / 1000:.1f}s")
+
+    print(f"{'sessões':>8} {'reruns':>7} {'erros':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'export s':>9} {'CPU s':>7} {'CPU %':>6} {'RSS MB':>8}")
+    failed = False
+    for concurrency in [int(level) for level in args.concurrency.split(',')]:
+        result = run_level(workbook, concurrency, args)
+        over_target = args.p95_target_ms is not None and result['p95'] > args.p95_target_ms
+        failed = failed or over_target or bool(result['errors'])
+        print(f"{result['concurrency']:>8} {result['reruns']:>7} {len(result['errors']):>6} {result['p50']:>8.0f} "
+              f"{result['p95']:>8.0f} {result['p99']:>8.0f} {result['export_p50']:>9.1f} {result['cpu_s']:>7.1f} "
+              f"{result['cpu_pct']:>6.0f} {result['rss_mb']:>8.0f}{'  ACIMA DA META' if over_target else ''}")
+        for error in result['errors'][:3]:
+            print(f"         {error}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Cache do processo para agregados derivados, com orçamento de memória.
+
+Os valores (agregados do dataset, visões por empresa, resultados da seleção
+de cada sessão) ficam numa única fila LRU. Quando a soma dos tamanhos
+estimados, mais os bytes fixos informados por pinned_bytes (os datasets em
+uso), passa do orçamento, os valores usados há mais tempo saem da memória.
+Os bytes fixos contam no máximo até MAX_PINNED_SHARE do orçamento: com
+datasets maiores que ele, os agregados ainda têm o restante para si, em vez
+de serem despejados (e recalculados) a cada rerun.
+O orçamento limita só os valores derivados. Os datasets pertencem ao
+registro e saem quando nenhuma sessão os usa; o cache nunca os despeja, só
+reduz o espaço dos agregados. A memória do processo pode, portanto, passar
+do orçamento: ela é o orçamento mais os bytes dos datasets acima de
+MAX_PINNED_SHARE.
+Com um diretório de spill configurado, os despejados são gravados em disco
+comprimidos (pickle + zlib) e voltam à memória no próximo pedido, sem serem
+recalculados; o próprio spill tem um limite de bytes, também LRU.
+
+Como no cache de visões, um valor sendo calculado não é recalculado por quem
+o pedir ao mesmo tempo: o pedido espera o cálculo em andamento.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+CACHE_BUDGET_ENV_VAR = 'MONITORAI_CACHE_BUDGET_MB'
+SPILL_DIR_ENV_VAR = 'MONITORAI_CACHE_SPILL_DIR'
+SPILL_BUDGET_ENV_VAR = 'MONITORAI_CACHE_SPILL_MB'
+DEFAULT_BUDGET_MB = 1024
+DEFAULT_SPILL_BUDGET_MB = 4096
+# Nível baixo: o spill acontece no caminho de quem inseriu o valor
+SPILL_COMPRESSION_LEVEL = 1
+# Fração máxima do orçamento que os bytes fixos (datasets) podem ocupar
+MAX_PINNED_SHARE = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_nbytes(value, _seen=None):
+    """Tamanho aproximado em memória de um valor (DataFrames, arrays, figuras, objetos simples)"""
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_nbytes(k, seen) + estimate_nbytes(v, seen) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item, seen) for item in value)
+    if hasattr(value, 'to_plotly_json'):
+        return estimate_nbytes(value.to_plotly_json(), seen)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + estimate_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+class BoundedCache:
+    def __init__(self, budget_bytes=None, spill_dir=None, spill_budget_bytes=None, pinned_bytes=None):
+        if budget_bytes is None:
+            budget_bytes = float(os.environ.get(CACHE_BUDGET_ENV_VAR, DEFAULT_BUDGET_MB)) * 1024 ** 2
+        if spill_dir is None:
+            spill_dir = os.environ.get(SPILL_DIR_ENV_VAR) or None
+        if spill_budget_bytes is None:
+            spill_budget_bytes = float(os.environ.get(SPILL_BUDGET_ENV_VAR, DEFAULT_SPILL_BUDGET_MB)) * 1024 ** 2
+        self.budget_bytes = int(budget_bytes)
+        self.spill_budget_bytes = int(spill_budget_bytes)
+        self.pinned_bytes = pinned_bytes
+        self.spill_dir = None
+        if spill_dir:
+            # Um subdiretório por processo: o índice do spill vive na memória, e
+            # arquivos de um processo encerrado não teriam como ser relidos
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_dir = tempfile.mkdtemp(prefix='cache_', dir=spill_dir)
+            atexit.register(shutil.rmtree, self.spill_dir, ignore_errors=True)
+
+        self._lock = threading.Lock()
+        # chave -> {'future', 'nbytes', 'spill'}, da usada há mais tempo para a mais recente
+        self._entries = OrderedDict()
+        # chave -> (arquivo, bytes comprimidos), na mesma ordem LRU
+        self._spilled = OrderedDict()
+        self._bytes = 0
+        self._spilled_bytes = 0
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'spills': 0, 'spill_hits': 0}
+
+    def get_or_build(self, key, builder, spill=True):
+        """
+        Valor de `key`; calculado com builder() só se não estiver na memória,
+        no spill nem sendo calculado. spill=False descarta o valor ao despejá-lo.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = {'future': Future(), 'nbytes': 0, 'spill': spill}
+                spilled = self._spilled.pop(key, None)
+                if spilled is not None:
+                    self._spilled_bytes -= spilled[1]
+                else:
+                    self._counters['misses'] += 1
+            else:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+        future = entry['future']
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._load_spilled(spilled) if spilled is not None else None
+            if value is None:
+                value = builder()
+        except BaseException as e:
+            # Falhas não ficam no cache: o próximo pedido tenta de novo
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            future.set_exception(e)
+            raise
+        future.set_result(value)
+        self._admit(key, entry, value)
+        return value
+
+    def put(self, key, value, spill=True):
+        """Guarda um valor já calculado, substituindo o anterior"""
+        entry = {'future': Future(), 'nbytes': 0, 'spill': spill}
+        entry['future'].set_result(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous['nbytes']
+            self._entries[key] = entry
+        self._admit(key, entry, value)
+
+    def peek(self, key):
+        """True se o valor já está pronto na memória ou no spill (sem esperar nem calcular)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return key in self._spilled
+        future = entry['future']
+        return future.done() and future.exception() is None
+
+    def stats(self):
+        with self._lock:
+            pinned = self._pinned()
+            lookups = self._counters['hits'] + self._counters['spill_hits'] + self._counters['misses']
+            return dict(
+                self._counters,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                pinned_bytes=pinned,
+                budget_bytes=self.budget_bytes,
+                spilled_entries=len(self._spilled),
+                spilled_bytes=self._spilled_bytes,
+                hit_rate=self._counters['hits'] / lookups if lookups else None
+            )
+
+    def _pinned(self):
+        return self.pinned_bytes() if self.pinned_bytes else 0
+
+    def _admit(self, key, entry, value):
+        """Contabiliza o valor recém-calculado e despeja os menos usados até caber no orçamento"""
+        nbytes = estimate_nbytes(value)
+        evicted = []
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            entry['nbytes'] = nbytes
+            self._bytes += nbytes
+            pinned = min(self._pinned(), int(self.budget_bytes * MAX_PINNED_SHARE))
+            for other_key in list(self._entries):
+                if self._bytes + pinned <= self.budget_bytes:
+                    break
+                other = self._entries[other_key]
+                # Valores em cálculo ainda não têm tamanho e não podem sair
+                if other_key == key or not other['future'].done():
+                    continue
+                del self._entries[other_key]
+                self._bytes -= other['nbytes']
+                self._counters['evictions'] += 1
+                if other['spill'] and self.spill_dir and other['future'].exception() is None:
+                    evicted.append((other_key, other['future'].result()))
+
+        for other_key, other_value in evicted:
+            self._spill(other_key, other_value)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.pkl.z')
+
+    def _spill(self, key, value):
+        path = self._spill_path(key)
+        try:
+            data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), SPILL_COMPRESSION_LEVEL)
+            with open(path, 'wb') as spill_file:
+                spill_file.write(data)
+        except Exception:
+            logger.exception("Falha ao gravar no spill o valor %r", key)
+            return
+
+        removed = []
+        with self._lock:
+            if key in self._entries:
+                # Voltou a ser calculado enquanto era gravado: o spill não vale mais
+                removed.append(path)
+            else:
+                previous = self._spilled.pop(key, None)
+                if previous is not None:
+                    self._spilled_bytes -= previous[1]
+                self._spilled[key] = (path, len(data))
+                self._spilled_bytes += len(data)
+                self._counters['spills'] += 1
+                while self._spilled_bytes > self.spill_budget_bytes and self._spilled:
+                    _, (old_path, old_size) = self._spilled.popitem(last=False)
+                    self._spilled_bytes -= old_size
+                    removed.append(old_path)
+        for old_path in removed:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def _load_spilled(self, spilled):
+        """Relê um valor despejado; None se o arquivo sumiu ou não puder ser lido"""
+        path, _ = spilled
+        try:
+            with open(path, 'rb') as spill_file:
+                value = pickle.loads(zlib.decompress(spill_file.read()))
+        except Exception:
+            logger.exception("Falha ao reler o spill %s", path)
+            value = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._counters['spill_hits' if value is not None else 'misses'] += 1
+        return value
@@ -0,0 +1,143 @@
+"""Checklist (Question1..Question12) compactado em bits.
+
+Cada ligação guarda duas máscaras uint16: o bit i de ChecklistAnswered diz se
+o critério i foi avaliado e o de ChecklistPassed, se foi cumprido. Os doze
+float64 por linha viram 4 bytes, e consultas com vários critérios ("falhou em
+LGPD e Escuta Ativa mas acertou a Saudação") são operações bit a bit sobre um
+único vetor.
+"""
+import numpy as np
+
+QUESTION_COLUMNS = [f'Question{i}' for i in range(1, 13)]
+
+QUESTION_NAMES = {
+    'Question1': 'Saudação',
+    'Question2': 'Dados Cadastrais',
+    'Question3': 'LGPD',
+    'Question4': 'Técnica do Eco',
+    'Question5': 'Escuta Ativa',
+    'Question6': 'Conhecimento',
+    'Question7': 'Confirmação',
+    'Question8': 'Seleção Loja',
+    'Question9': 'Comunicação',
+    'Question10': 'Conduta',
+    'Question11': 'Encerramento',
+    'Question12': 'Pesquisa'
+}
+
+PASSED_COLUMN = 'ChecklistPassed'
+ANSWERED_COLUMN = 'ChecklistAnswered'
+
+QUESTION_BITS = {q: 1 << i for i, q in enumerate(QUESTION_COLUMNS)}
+
+# Nº de bits ligados de cada padrão de 12 bits (popcount por tabela)
+N_PATTERNS = 1 << len(QUESTION_COLUMNS)
+POPCOUNT = np.array([bin(pattern).count('1') for pattern in range(N_PATTERNS)], dtype=np.int64)
+# Padrão × critério: 1 onde o bit do critério está ligado
+PATTERN_BITS = (np.arange(N_PATTERNS)[:, None] >> np.arange(len(QUESTION_COLUMNS))) & 1
+
+
+def questions_mask(questions):
+    mask = 0
+    for q in questions:
+        mask |= QUESTION_BITS[q]
+    return mask
+
+
+def pack_checklist(df):
+    """Substitui as colunas Question1..12 (0/1/NaN) pelas duas máscaras de bits"""
+    passed = np.zeros(len(df), dtype=np.uint16)
+    answered = np.zeros(len(df), dtype=np.uint16)
+    present = [q for q in QUESTION_COLUMNS if q in df.columns]
+    for q in present:
+        values = df[q].to_numpy(dtype=float)
+        bit = np.uint16(QUESTION_BITS[q])
+        answered |= np.where(np.isnan(values), 0, bit).astype(np.uint16)
+        passed |= np.where(values == 1, bit, 0).astype(np.uint16)
+    df = df.drop(columns=present)
+    df[PASSED_COLUMN] = passed
+    df[ANSWERED_COLUMN] = answered
+    return df
+
+
+def unpack_checklist(df, questions=None):
+    """
+    Colunas Question1..12 de volta no lugar das máscaras (para exportação).
+    Sem questions, volta só os critérios avaliados em alguma linha.
+    """
+    if PASSED_COLUMN not in df.columns:
+        return df
+    if questions is None:
+        questions = checklist_questions(df)
+    questions = {q: question_values(df, q) for q in questions}
+    return df.drop(columns=[PASSED_COLUMN, ANSWERED_COLUMN]).assign(**questions)
+
+
+def checklist_questions(df):
+    """Critérios avaliados em alguma linha, na ordem do checklist"""
+    if ANSWERED_COLUMN not in df.columns or len(df) == 0:
+        return []
+    answered = int(np.bitwise_or.reduce(df[ANSWERED_COLUMN].to_numpy()))
+    return [q for q in QUESTION_COLUMNS if answered & QUESTION_BITS[q]]
+
+
+def question_values(df, q):
+    """Respostas de um critério como float: 1 cumprido, 0 não cumprido, NaN não avaliado"""
+    if ANSWERED_COLUMN not in df.columns:
+        return np.full(len(df), np.nan)
+    bit = QUESTION_BITS[q]
+    answered = (df[ANSWERED_COLUMN].to_numpy() & bit) != 0
+    passed = (df[PASSED_COLUMN].to_numpy() & bit) != 0
+    return np.where(answered, passed.astype(float), np.nan)
+
+
+def question_counts(df, codes, n_groups, questions):
+    """Matrizes grupo × critério de acertos e de avaliações, com um bincount por bit"""
+    passed = df[PASSED_COLUMN].to_numpy()
+    answered = df[ANSWERED_COLUMN].to_numpy()
+    sums = np.zeros((n_groups, len(questions)))
+    counts = np.zeros((n_groups, len(questions)))
+    for j, q in enumerate(questions):
+        bit = QUESTION_BITS[q]
+        sums[:, j] = np.bincount(codes, weights=(passed & bit) != 0, minlength=n_groups)
+        counts[:, j] = np.bincount(codes, weights=(answered & bit) != 0, minlength=n_groups)
+    return sums, counts
+
+
+def failed_bits(df):
+    """Máscara dos critérios avaliados e não cumpridos de cada ligação"""
+    return df[ANSWERED_COLUMN].to_numpy() & ~df[PASSED_COLUMN].to_numpy()
+
+
+def combined_mask(df, failed=(), passed=()):
+    """Ligações que falharam em todos os critérios de `failed` e cumpriram todos os de `passed`"""
+    mask = np.ones(len(df), dtype=bool)
+    if failed:
+        need = questions_mask(failed)
+        mask &= (failed_bits(df) & need) == need
+    if passed:
+        need = questions_mask(passed)
+        mask &= (df[PASSED_COLUMN].to_numpy() & need) == need
+    return mask
+
+
+def failure_counts(df):
+    """Quantos critérios cada ligação deixou de cumprir"""
+    return POPCOUNT[failed_bits(df)]
+
+
+def co_failure_matrix(df):
+    """
+    Matrizes 12 × 12 de ligações que falharam nos dois critérios e que foram
+    avaliadas nos dois (a diagonal traz cada critério sozinho). Em vez de
+    varrer as linhas por par, conta cada padrão de bits uma vez e cruza os
+    padrões com a tabela de bits.
+    """
+    if ANSWERED_COLUMN not in df.columns:
+        size = len(QUESTION_COLUMNS)
+        return np.zeros((size, size), dtype=np.int64), np.zeros((size, size), dtype=np.int64)
+    failed = np.bincount(failed_bits(df), minlength=N_PATTERNS)
+    answered = np.bincount(df[ANSWERED_COLUMN].to_numpy(), minlength=N_PATTERNS)
+    both_failed = PATTERN_BITS.T @ (PATTERN_BITS * failed[:, None])
+    both_answered = PATTERN_BITS.T @ (PATTERN_BITS * answered[:, None])
+    return both_failed, both_answered
@@ -0,0 +1,91 @@
+"""Cubo pré-agregado tempo × empresa × agente (× risco) para visões por período.
+
+As células são as somas e contagens diárias do motor de KPIs
+(kpi_engine.build_daily_aggregates). Qualquer recorte da barra lateral e
+qualquer pivô (empresa × semana ISO, agente × mês) sai dessas células, sem
+reler as linhas do dataset. O cubo é montado uma vez por dataset carregado,
+a partir das células diárias já calculadas pelo motor de KPIs.
+"""
+import pandas as pd
+
+from kpi_engine import KPI_METRICS, SUM_FIELDS
+
+CELL_KEYS = ['day', 'Empresas', 'CustomerAgent', 'ClientRisk']
+
+VOLUME_METRIC = 'Total de Análises'
+CUBE_METRICS = list(KPI_METRICS) + [VOLUME_METRIC]
+
+PERIODS = {
+    'Semana ISO': 'week',
+    'Mês': 'month'
+}
+
+PIVOT_ROWS = {
+    'Empresa': 'Empresas',
+    'Agente': 'CustomerAgent'
+}
+
+
+def period_labels(days, period):
+    """Rótulo ordenável do período de cada dia: AAAA-Sww (semana ISO) ou AAAA-MM"""
+    # O rótulo é calculado uma vez por dia distinto, não por célula
+    codes, unique_days = pd.factorize(days)
+    unique_days = pd.Series(unique_days)
+    if period == 'week':
+        iso = unique_days.dt.isocalendar()
+        labels = iso['year'].astype(str) + '-S' + iso['week'].astype(str).str.zfill(2)
+    else:
+        labels = unique_days.dt.strftime('%Y-%m')
+    return pd.Series(labels.to_numpy()[codes], index=days.index)
+
+
+class DataCube:
+    def __init__(self, cells):
+        self.cells = cells
+
+    def slice(self, empresa=None, agent=None, risk=None, start=None, end=None):
+        """Células da seleção (None = sem filtro; datas inclusivas)"""
+        cells = self.cells
+        mask = pd.Series(True, index=cells.index)
+        if empresa is not None:
+            mask &= cells['Empresas'] == empresa
+        if agent is not None:
+            mask &= cells['CustomerAgent'] == agent
+        if risk is not None:
+            mask &= cells['ClientRisk'] == risk
+        tz = cells['day'].dt.tz
+        if start is not None:
+            mask &= cells['day'] >= pd.Timestamp(start).tz_localize(tz)
+        if end is not None:
+            mask &= cells['day'] <= pd.Timestamp(end).tz_localize(tz)
+        return cells if mask.all() else cells[mask]
+
+    def pivot(self, rows, period, metric, max_rows=None, **filters):
+        """
+        Tabela linhas × períodos da métrica. rows é 'Empresas' ou 'CustomerAgent';
+        com max_rows, ficam só as linhas de maior volume.
+        """
+        cells = self.slice(**filters)
+        if len(cells) == 0:
+            return pd.DataFrame()
+
+        grouped = cells.groupby([cells[rows], period_labels(cells['day'], period).rename('Período')])[SUM_FIELDS].sum()
+        if metric == VOLUME_METRIC:
+            values = grouped['calls']
+        else:
+            numerator, denominator = KPI_METRICS[metric]
+            values = grouped[numerator] / grouped[denominator].where(grouped[denominator] > 0)
+            if metric != 'Porcentagem de Acerto':
+                values = values * 100
+
+        table = values.unstack('Período').sort_index(axis=1)
+        if max_rows is not None and len(table) > max_rows:
+            volume = grouped['calls'].groupby(level=0).sum()
+            table = table.loc[volume.nlargest(max_rows).index]
+        return table
+
+
+def build_data_cube(daily):
+    if daily is None or len(daily) == 0:
+        return None
+    return DataCube(daily[CELL_KEYS + SUM_FIELDS])
@@ -0,0 +1,107 @@
+"""Registro de datasets compartilhado entre as sessões do processo Streamlit.
+
+Cada upload é identificado pelo hash do conteúdo. Sessões que enviam o mesmo
+arquivo recebem visões rasas (sem cópia de dados) do mesmo DataFrame, e o
+dataset é descartado quando a última sessão que o referencia o libera.
+Depende de pandas com Copy-on-Write ativo para que as visões sejam somente
+leitura na prática: qualquer escrita numa visão copia apenas a coluna afetada.
+"""
+import hashlib
+import threading
+import time
+
+DEFAULT_IDLE_TIMEOUT = 3600
+
+
+def content_hash(data):
+    """Retorna o hash SHA-256 do conteúdo de um arquivo enviado"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class DatasetRegistry:
+    """Datasets únicos por conteúdo, com contagem de referências por sessão"""
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._sessions = {}
+        self._load_locks = {}
+
+    def acquire(self, key, session_id, loader):
+        """
+        Associa a sessão ao dataset `key` e devolve uma visão dele.
+        Se o dataset ainda não existir, `loader()` é chamado uma única vez,
+        mesmo com várias sessões pedindo o mesmo arquivo ao mesmo tempo.
+        """
+        with self._lock:
+            self._prune_idle()
+            if key in self._entries:
+                self._bind(session_id, key)
+                return self._entries[key]['frame'].copy(deep=False)
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                try:
+                    frame = loader()
+                    if frame is None:
+                        return None
+                    entry = {
+                        'frame': frame,
+                        'refs': 0,
+                        'nbytes': int(frame.memory_usage(deep=True).sum()),
+                        'loaded_at': time.time()
+                    }
+                    with self._lock:
+                        self._entries[key] = entry
+                finally:
+                    # Carga concluída, vazia ou com exceção: o lock da carga não serve mais
+                    with self._lock:
+                        self._load_locks.pop(key, None)
+
+        with self._lock:
+            self._bind(session_id, key)
+            return entry['frame'].copy(deep=False)
+
+    def release(self, session_id):
+        """Desassocia a sessão do dataset que ela estava usando"""
+        with self._lock:
+            binding = self._sessions.pop(session_id, None)
+            if binding is not None:
+                self._decref(binding[0])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'datasets': len(self._entries),
+                'sessions': len(self._sessions),
+                'bytes': sum(entry['nbytes'] for entry in self._entries.values())
+            }
+
+    def _bind(self, session_id, key):
+        previous = self._sessions.get(session_id)
+        self._sessions[session_id] = (key, time.time())
+        if previous is None:
+            self._entries[key]['refs'] += 1
+        elif previous[0] != key:
+            self._entries[key]['refs'] += 1
+            self._decref(previous[0])
+
+    def _decref(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry['refs'] -= 1
+        if entry['refs'] <= 0:
+            del self._entries[key]
+
+    def _prune_idle(self):
+        # O Streamlit não avisa quando uma aba é fechada; sessões sem atividade
+        # por mais de idle_timeout segundos deixam de segurar o dataset
+        cutoff = time.time() - self.idle_timeout
+        for session_id, (_, last_seen) in list(self._sessions.items()):
+            if last_seen < cutoff:
+                self.release(session_id)
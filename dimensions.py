@@ -0,0 +1,105 @@
+"""Dimensões de agentes e empresas do dataset.
+
+Montadas uma vez por dataset, na carga. Cada agente e cada empresa recebe
+uma chave int32, que é a sua posição na dimensão em ordem alfabética, e os
+vetores de chaves, alinhados às linhas do dataset, formam um índice
+acrescentado a ele (as colunas de nomes continuam no dataset). As opções dos
+filtros saem de uma contagem sobre esses vetores, sem ordenar nem comparar
+as strings repetidas em cada linha. O recorte por empresa ou agente compara
+inteiros, e o nome de exibição (primeiro + último nome) é calculado uma
+única vez por agente.
+"""
+import numpy as np
+import pandas as pd
+
+AGENT_KEY = 'AgentKey'
+COMPANY_KEY = 'CompanyKey'
+# Chave das linhas sem agente ou sem empresa
+MISSING_KEY = -1
+
+
+def display_name(name):
+    """Primeiro e último nome do agente, como nos rankings"""
+    parts = str(name).split()
+    if len(parts) >= 2:
+        return f"{parts[0]} {parts[-1]}"
+    return parts[0] if parts else str(name)
+
+
+def _factorize(series):
+    """Chaves int32 (em ordem alfabética dos valores) e os valores distintos"""
+    codes, uniques = pd.factorize(series, sort=True, use_na_sentinel=True)
+    return codes.astype(np.int32), uniques
+
+
+def _dimension(keys, values, key_name, name_column, dates):
+    """Dimensão indexada pela chave: nome, primeira e última análise e total de ligações"""
+    valid = keys != MISSING_KEY
+    dimension = pd.DataFrame({name_column: np.asarray(values, dtype=object)})
+    if dates is not None:
+        seen = pd.Series(dates[valid]).groupby(keys[valid]).agg(['min', 'max'])
+        dimension['FirstSeen'] = seen['min'].reindex(dimension.index)
+        dimension['LastSeen'] = seen['max'].reindex(dimension.index)
+    dimension['Calls'] = np.bincount(keys[valid], minlength=len(values))
+    dimension.index = pd.RangeIndex(len(values), name=key_name)
+    return dimension
+
+
+class Dimensions:
+    def __init__(self, agents, companies, agent_keys, company_keys):
+        self.agents = agents
+        self.companies = companies
+        # Chaves de cada linha do dataset, na ordem das linhas
+        self.agent_keys = agent_keys
+        self.company_keys = company_keys
+        self._agent_lookup = {name: key for key, name in enumerate(agents['CustomerAgent'])} if agents is not None else {}
+        self._company_lookup = {name: key for key, name in enumerate(companies['Empresas'])} if companies is not None else {}
+        self.agent_labels = dict(zip(agents['CustomerAgent'], agents['DisplayName'])) if agents is not None else {}
+
+    def company_options(self):
+        """Empresas do dataset, em ordem alfabética"""
+        return self.companies['Empresas'].tolist() if self.companies is not None else []
+
+    def agent_options(self, filter_mask=None):
+        """Agentes com ligações nas linhas de filter_mask (todas, se None), em ordem alfabética"""
+        if self.agents is None:
+            return []
+        keys = self.agent_keys if filter_mask is None else self.agent_keys[filter_mask]
+        present = np.bincount(keys[keys != MISSING_KEY], minlength=len(self.agents)) > 0
+        return self.agents['CustomerAgent'].to_numpy()[present].tolist()
+
+    def company_mask(self, empresa):
+        """Linhas da empresa, comparando chaves"""
+        return self.company_keys == self._company_lookup.get(empresa, MISSING_KEY - 1)
+
+    def agent_mask(self, agent):
+        """Linhas do agente, comparando chaves"""
+        return self.agent_keys == self._agent_lookup.get(agent, MISSING_KEY - 1)
+
+
+def build_dimensions(df):
+    """Dimensões de agentes e empresas e os vetores de chaves das linhas do dataset"""
+    dates = df['AnalysisDateTime'].to_numpy() if 'AnalysisDateTime' in df.columns else None
+    no_keys = np.full(len(df), MISSING_KEY, dtype=np.int32)
+
+    companies, company_keys = None, no_keys
+    if 'Empresas' in df.columns:
+        company_keys, company_names = _factorize(df['Empresas'])
+        companies = _dimension(company_keys, company_names, COMPANY_KEY, 'Empresas', dates)
+
+    agents, agent_keys = None, no_keys
+    if 'CustomerAgent' in df.columns:
+        agent_keys, agent_names = _factorize(df['CustomerAgent'])
+        agents = _dimension(agent_keys, agent_names, AGENT_KEY, 'CustomerAgent', dates)
+        agents.insert(1, 'DisplayName', [display_name(name) for name in agents['CustomerAgent']])
+        if companies is not None:
+            # Empresa do agente: a de mais ligações, pela contagem de pares de chaves
+            paired = (agent_keys != MISSING_KEY) & (company_keys != MISSING_KEY)
+            pairs = np.bincount(
+                agent_keys[paired].astype(np.int64) * len(companies) + company_keys[paired],
+                minlength=len(agents) * len(companies)
+            ).reshape(len(agents), len(companies))
+            main_company = np.where(pairs.any(axis=1), pairs.argmax(axis=1), MISSING_KEY)
+            agents.insert(2, 'Empresas', [companies['Empresas'].iat[key] if key != MISSING_KEY else None for key in main_company])
+
+    return Dimensions(agents, companies, agent_keys, company_keys)
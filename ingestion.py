@@ -0,0 +1,563 @@
+"""Leitura e tratamento da planilha de análises (aba Consulta1).
+
+Funções sem dependência do Streamlit, usadas pelo dashboard e pela API.
+
+A leitura em blocos (prepare_workbook_chunked) percorre a aba .xlsx em
+blocos de linhas e trata cada bloco assim que ele chega, acumulando KPIs
+parciais para a tela de carregamento. O df final é a concatenação dos blocos
+tratados, lidos com a mesma conversão de células do pandas.read_excel e com
+os tipos de cada coluna conciliados entre blocos, então sai idêntico ao de
+prepare_workbook.
+
+Além da planilha, os mesmos dados podem chegar em CSV, Parquet ou JSONL
+(uma análise por linha), lidos com os leitores multithread do Arrow quando
+o pyarrow estiver instalado. Todos passam pelo mesmo esquema, aliases de
+colunas e regras de descarte.
+
+Antes de ler uma planilha .xlsx, plan_ingestion estima o pico de memória só
+pelo que o arquivo declara (dimensão da aba e tamanho das strings
+compartilhadas, sem abrir as células) e escolhe a estratégia que cabe no
+orçamento: tudo na memória, em blocos tratados um a um (sem a cópia bruta da
+aba inteira) ou em blocos gravados em disco em Arrow e abertos via
+memory-map.
+"""
+import os
+import re
+import shutil
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from zipfile import BadZipFile, ZipFile
+
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.json as pa_json
+    import pyarrow.parquet as pa_parquet
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+from checklist_bits import QUESTION_COLUMNS, unpack_checklist
+from schema import SCORE_COLUMN, apply_schema, finalize_quarantine, quarantine_rows
+
+MIN_SCORE = 19.99
+
+DROP_EMPTY_SCORE = 'Nota vazia ou abaixo de 19.99'
+DROP_RISK = 'Risco INDETERMINADO ou vazio'
+DROP_EMPTY_COMPANY = 'Empresa vazia'
+
+SHEET_NAME = 'Consulta1'
+
+# Extensões aceitas, da planilha aos formatos nativos do sistema de origem
+EXCEL_EXTENSIONS = ['xlsx', 'xls']
+INPUT_EXTENSIONS = EXCEL_EXTENSIONS + ['csv', 'parquet', 'jsonl']
+
+# Linhas por bloco da leitura progressiva: cada bloco é uma atualização da tela
+CHUNK_ROWS = 10_000
+
+INGEST_BUDGET_ENV_VAR = 'MONITORAI_INGEST_BUDGET_MB'
+INGEST_SPILL_DIR_ENV_VAR = 'MONITORAI_INGEST_SPILL_DIR'
+DEFAULT_INGEST_BUDGET_MB = 1024
+
+# Estratégias de leitura, da mais rápida para a que menos usa memória
+STRATEGY_MEMORY = 'memoria'
+STRATEGY_CHUNKED = 'blocos'
+STRATEGY_DISK = 'disco'
+STRATEGY_LABELS = {
+    STRATEGY_MEMORY: 'de uma vez',
+    STRATEGY_CHUNKED: 'em blocos',
+    STRATEGY_DISK: 'em blocos gravados em disco'
+}
+
+# Calibrados pelo pico de RSS com planilhas Consulta1 sintéticas de 100 mil
+# linhas (synthetic_data.py): bytes por célula durante a leitura (listas de
+# células + DataFrame bruto + tratado), tamanho do resultado tratado por
+# célula e bytes de XML por célula, usado quando a aba não declara a dimensão
+PEAK_BYTES_PER_CELL = 50
+RESULT_BYTES_PER_CELL = 8
+XML_BYTES_PER_CELL = 32
+# O openpyxl mantém as strings compartilhadas (lista + índice) durante toda a
+# leitura: cerca de 5x o XML descompactado
+SHARED_STRINGS_FACTOR = 5
+# Leitor e parser carregados, independente do tamanho da planilha
+READER_OVERHEAD_BYTES = 40 * 1024 ** 2
+
+SPREADSHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+SHARED_STRINGS_COUNT_RE = re.compile(rb'uniqueCount="(\d+)"')
+
+
+class MissingSheetError(ValueError):
+    """A planilha enviada não tem a aba Consulta1"""
+
+
+class UnsupportedFormatError(ValueError):
+    """O arquivo enviado não é de um formato aceito"""
+
+
+def read_workbook(file):
+    xls = pd.ExcelFile(file)
+    if SHEET_NAME not in xls.sheet_names:
+        raise MissingSheetError(f"A planilha '{SHEET_NAME}' não foi encontrada no arquivo.")
+    return pd.read_excel(xls, sheet_name=SHEET_NAME)
+
+
+def input_format(name):
+    """Formato do arquivo pela extensão do nome; levanta UnsupportedFormatError se não for aceito"""
+    extension = os.path.splitext(str(name))[1].lower().lstrip('.')
+    if extension not in INPUT_EXTENSIONS:
+        raise UnsupportedFormatError(
+            f"Formato '.{extension}' não suportado. Envie um arquivo {', '.join('.' + ext for ext in INPUT_EXTENSIONS)}."
+        )
+    return extension
+
+
+def read_csv(file):
+    if not ARROW_AVAILABLE:
+        return pd.read_csv(file)
+    # Célula vazia em coluna de texto vira nulo, como na planilha
+    table = pa_csv.read_csv(
+        file,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        convert_options=pa_csv.ConvertOptions(strings_can_be_null=True)
+    )
+    return table.to_pandas()
+
+
+def read_parquet(file):
+    if not ARROW_AVAILABLE:
+        return pd.read_parquet(file)
+    return pa_parquet.read_table(file, use_threads=True).to_pandas()
+
+
+def read_jsonl(file):
+    if not ARROW_AVAILABLE:
+        return pd.read_json(file, lines=True)
+    return pa_json.read_json(file, read_options=pa_json.ReadOptions(use_threads=True)).to_pandas()
+
+
+INPUT_READERS = {
+    'xlsx': read_workbook,
+    'xls': read_workbook,
+    'csv': read_csv,
+    'parquet': read_parquet,
+    'jsonl': read_jsonl
+}
+
+
+def read_input(file, name=None):
+    """Lê o arquivo no formato indicado pela extensão de name (ou do próprio caminho)"""
+    return INPUT_READERS[input_format(name if name is not None else file)](file)
+
+
+def prepare_dataframe(df):
+    """
+    Aplica o esquema canônico e remove os registros inválidos; retorna (df, quarentena).
+    A quarentena reúne as linhas malformadas e as descartadas pelos filtros abaixo,
+    cada uma com o primeiro motivo que a excluiu.
+    """
+    df, quarantine = apply_schema(df)
+
+    # Todas as regras são avaliadas numa única passada e aplicadas com um só recorte
+    rules = [
+        # Filtrar registros com PERCENTUAL vazio ou menor que 19.99
+        (DROP_EMPTY_SCORE, ~(df[SCORE_COLUMN] >= MIN_SCORE).to_numpy())
+    ]
+    if 'ClientRisk' in df.columns:
+        # Filtrar registros com ClientRisk Indeterminado ou vazio
+        rules.append((DROP_RISK, ((df['ClientRisk'] == 'INDETERMINADO') | df['ClientRisk'].isna()).to_numpy()))
+    if 'Empresas' in df.columns:
+        # Filtrar registros com Empresas vazio (para consistência)
+        rules.append((DROP_EMPTY_COMPANY, df['Empresas'].isna().to_numpy()))
+
+    reasons = np.select([mask for _, mask in rules], [reason for reason, _ in rules], default='')
+    dropped = reasons != ''
+    if dropped.any():
+        # As linhas descartadas já passaram pelo esquema: o checklist volta às
+        # colunas Question1..12, como nas linhas malformadas da quarentena
+        rows = unpack_checklist(quarantine_rows(df, dropped, reasons[dropped]), QUESTION_COLUMNS)
+        quarantine = pd.concat([quarantine, rows])
+        df = df[~dropped]
+
+    return df, finalize_quarantine(quarantine)
+
+
+def clean_dataframe(df):
+    """Converte para o esquema canônico e remove os registros inválidos"""
+    return prepare_dataframe(df)[0]
+
+
+def prepare_workbook(file):
+    """Lê e trata a planilha; retorna (df, quarentena)"""
+    return prepare_dataframe(read_workbook(file))
+
+
+def prepare_input(file, name=None):
+    """Lê e trata um arquivo em qualquer formato aceito; retorna (df, quarentena)"""
+    return prepare_dataframe(read_input(file, name))
+
+
+def load_input(file, name=None):
+    """Lê e trata um arquivo em qualquer formato aceito"""
+    return prepare_input(file, name)[0]
+
+
+class PartialKpis:
+    """KPIs acumulados dos blocos já lidos e tratados durante o carregamento"""
+
+    def __init__(self, total_rows):
+        # Linhas de dados declaradas na planilha; None se ela não informar
+        self.total_rows = total_rows
+        self.rows_read = 0
+        self.records = 0
+        self.score_sum = 0.0
+        self.risk_counts = Counter()
+        self.company_counts = Counter()
+        self.started = time.monotonic()
+
+    def add(self, rows_read, chunk):
+        self.rows_read += rows_read
+        self.records += len(chunk)
+        self.score_sum += float(chunk[SCORE_COLUMN].sum())
+        if 'ClientRisk' in chunk.columns:
+            self.risk_counts.update(chunk['ClientRisk'].value_counts().to_dict())
+        if 'Empresas' in chunk.columns:
+            self.company_counts.update(chunk['Empresas'].value_counts().to_dict())
+
+    @property
+    def avg_score(self):
+        return self.score_sum / self.records if self.records else np.nan
+
+    @property
+    def fraction(self):
+        """Fração lida da planilha (0 a 1); None se o total não for conhecido"""
+        if not self.total_rows:
+            return None
+        return min(self.rows_read / self.total_rows, 1.0)
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def eta(self):
+        """Segundos estimados até o fim da leitura, pelo ritmo até aqui"""
+        fraction = self.fraction
+        if not fraction:
+            return None
+        return self.elapsed * (1 - fraction) / fraction
+
+
+def _convert_cell(cell):
+    """Mesma conversão de célula do leitor openpyxl do pandas"""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None:
+        return ""
+    elif cell.data_type == TYPE_ERROR:
+        return np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        val = int(cell.value)
+        if val == cell.value:
+            return val
+        return float(cell.value)
+    return cell.value
+
+
+def _parse_rows(data):
+    """Monta o DataFrame de linhas já convertidas (cabeçalho na primeira) como o read_excel"""
+    if len(data) > 0:
+        max_width = max(len(row) for row in data)
+        if min(len(row) for row in data) < max_width:
+            data = [row + (max_width - len(row)) * [""] for row in data]
+    try:
+        return TextParser(data, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def _sheet_member(archive):
+    """Caminho, dentro do .xlsx, do XML da aba Consulta1; None se ela não existir"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    sheet = next((sheet for sheet in workbook.iter(f'{SPREADSHEET_NS}sheet') if sheet.get('name') == SHEET_NAME), None)
+    if sheet is None:
+        return None
+    relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for relationship in relationships:
+        if relationship.get('Id') == sheet.get(RELATIONSHIP_ID):
+            target = relationship.get('Target')
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    return None
+
+
+def estimate_workbook(file):
+    """
+    Tamanho da aba Consulta1 pelo que o .xlsx declara, sem ler as células:
+    linhas, colunas e células da dimensão, bytes das strings compartilhadas e
+    os picos de memória estimados de cada estratégia. None se o arquivo não
+    for um .xlsx ou não tiver a aba.
+    """
+    try:
+        with ZipFile(file) as archive:
+            member = _sheet_member(archive)
+            if member is None:
+                return None
+            sheet_bytes = archive.getinfo(member).file_size
+            # A dimensão vem antes das células, logo no início do XML
+            with archive.open(member) as sheet_xml:
+                match = DIMENSION_RE.search(sheet_xml.read(4096))
+            shared_bytes, shared_count = 0, None
+            if 'xl/sharedStrings.xml' in archive.namelist():
+                shared_bytes = archive.getinfo('xl/sharedStrings.xml').file_size
+                with archive.open('xl/sharedStrings.xml') as shared_xml:
+                    count_match = SHARED_STRINGS_COUNT_RE.search(shared_xml.read(1024))
+                shared_count = int(count_match.group(1)) if count_match else None
+    except (BadZipFile, KeyError, ET.ParseError, OSError):
+        return None
+    finally:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+    rows = columns = None
+    if match and match.group(3):
+        rows = int(match.group(4)) - int(match.group(2))
+        columns = _column_number(match.group(3).decode()) - _column_number(match.group(1).decode()) + 1
+    # Sem dimensão (ou só "A1", como gravam alguns geradores), as células saem do tamanho do XML
+    cells = rows * columns if rows else sheet_bytes // XML_BYTES_PER_CELL
+    shared_peak = int(shared_bytes * SHARED_STRINGS_FACTOR) + READER_OVERHEAD_BYTES
+    chunk_cells = min(cells, CHUNK_ROWS * columns) if columns else min(cells, CHUNK_ROWS * 32)
+    return {
+        'rows': rows,
+        'columns': columns,
+        'cells': cells,
+        'sheet_bytes': sheet_bytes,
+        'shared_strings': shared_count,
+        'shared_strings_bytes': shared_bytes,
+        'result_bytes': cells * RESULT_BYTES_PER_CELL,
+        'peak_bytes': {
+            STRATEGY_MEMORY: cells * PEAK_BYTES_PER_CELL + shared_peak,
+            STRATEGY_CHUNKED: cells * RESULT_BYTES_PER_CELL + chunk_cells * PEAK_BYTES_PER_CELL + shared_peak,
+            STRATEGY_DISK: chunk_cells * PEAK_BYTES_PER_CELL + shared_peak
+        }
+    }
+
+
+def ingest_budget_bytes():
+    return int(float(os.environ.get(INGEST_BUDGET_ENV_VAR, DEFAULT_INGEST_BUDGET_MB)) * 1024 ** 2)
+
+
+def plan_ingestion(file, name=None, budget_bytes=None):
+    """
+    Escolhe como ler o arquivo: a estratégia mais rápida cujo pico estimado
+    cabe no orçamento. Sem estimativa (formatos que não são .xlsx), lê tudo
+    na memória; se nada couber, grava em disco, que é o que menos usa memória.
+    """
+    budget_bytes = ingest_budget_bytes() if budget_bytes is None else int(budget_bytes)
+    extension = input_format(name if name is not None else file)
+    estimate = estimate_workbook(file) if extension == 'xlsx' else None
+    plan = {'strategy': STRATEGY_MEMORY, 'estimate': estimate, 'budget_bytes': budget_bytes, 'over_budget': False}
+    if estimate is None:
+        return plan
+
+    strategies = [STRATEGY_MEMORY, STRATEGY_CHUNKED] + ([STRATEGY_DISK] if ARROW_AVAILABLE else [])
+    fitting = [strategy for strategy in strategies if estimate['peak_bytes'][strategy] <= budget_bytes]
+    plan['strategy'] = fitting[0] if fitting else strategies[-1]
+    plan['over_budget'] = not fitting
+    return plan
+
+
+def _row_chunks(rows, chunk_rows):
+    """
+    Blocos (índice da primeira linha de dados, linhas convertidas) das linhas
+    de dados da aba. Linhas vazias só saem junto com uma linha preenchida
+    posterior: as do fim da aba são descartadas, como no read_excel.
+    """
+    pending = []
+    first_index = 0
+    for row in rows:
+        converted_row = [_convert_cell(cell) for cell in row]
+        while converted_row and converted_row[-1] == "":
+            converted_row.pop()
+        pending.append(converted_row)
+
+        if len(pending) >= chunk_rows:
+            filled = max((i for i, pending_row in enumerate(pending) if pending_row), default=-1) + 1
+            if filled:
+                yield first_index, pending[:filled]
+                first_index += filled
+                pending = pending[filled:]
+
+    filled = max((i for i, pending_row in enumerate(pending) if pending_row), default=-1) + 1
+    if filled:
+        yield first_index, pending[:filled]
+
+
+def _unified_dtypes(chunk_dtypes):
+    """
+    Tipo final de cada coluna a partir dos tipos de cada bloco, ignorando os
+    blocos em que a coluna veio toda vazia (o parser não tem como inferi-lo)
+    """
+    targets = {}
+    for column in dict.fromkeys(column for dtypes in chunk_dtypes for column in dtypes):
+        seen = [dtypes[column] for dtypes in chunk_dtypes if column in dtypes]
+        filled = list(dict.fromkeys(dtype for dtype, all_na in seen if not all_na)) or [seen[0][0]]
+        if len(filled) == 1:
+            targets[column] = filled[0]
+        elif all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in filled):
+            targets[column] = np.result_type(*filled)
+        else:
+            targets[column] = np.dtype(object)
+    return targets
+
+
+def _cast_chunk(chunk, targets):
+    changed = {column: dtype for column, dtype in targets.items() if column in chunk.columns and chunk[column].dtype != dtype}
+    return chunk.astype(changed) if changed else chunk
+
+
+def _write_part(path, chunk):
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    pa_feather.write_feather(table, path, compression='uncompressed')
+
+
+def _read_part(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+
+
+def _assemble_on_disk(workdir, parts, targets):
+    """
+    Junta as partes gravadas num único arquivo Arrow, parte a parte, e o abre
+    via memory-map: o resultado fica nas páginas do arquivo, não no heap
+    """
+    path = os.path.join(workdir, 'dataset.arrow')
+    schema = None
+    writer = None
+    try:
+        for part in parts:
+            table = pa.Table.from_pandas(_cast_chunk(_read_part(part), targets), preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pa.ipc.new_file(path, schema)
+            writer.write_table(table.cast(schema))
+            os.remove(part)
+    finally:
+        if writer is not None:
+            writer.close()
+    df = _read_part(path)
+    # O memory-map continua válido sem o nome do arquivo (POSIX); onde não for
+    # possível apagar agora, o diretório sai no fim do processo
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return df
+
+
+def prepare_workbook_chunked(file, on_chunk=None, chunk_rows=CHUNK_ROWS, spill_dir=None):
+    """
+    Como prepare_workbook, tratando a aba bloco a bloco: só as linhas de um
+    bloco ficam na memória em formato bruto. Com spill_dir, os blocos tratados
+    também vão para disco (Arrow) e o df final é aberto via memory-map.
+    on_chunk, se informado, recebe os PartialKpis a cada bloco.
+    """
+    from openpyxl import load_workbook as open_xlsx
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        book = open_xlsx(file, read_only=True, data_only=True, keep_links=False)
+    except (BadZipFile, InvalidFileException):
+        # .xls e arquivos que não são .xlsx: leitura de uma vez
+        file.seek(0)
+        return prepare_workbook(file)
+
+    if not ARROW_AVAILABLE:
+        spill_dir = None
+    workdir = tempfile.mkdtemp(prefix='monitorai_ingest_', dir=spill_dir) if spill_dir is not None else None
+    try:
+        return _prepare_chunks(book, on_chunk, chunk_rows, workdir)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _prepare_chunks(book, on_chunk, chunk_rows, workdir):
+    chunks, quarantines, chunk_dtypes, parts = [], [], [], []
+    try:
+        if SHEET_NAME not in book.sheetnames:
+            raise MissingSheetError(f"A planilha '{SHEET_NAME}' não foi encontrada no arquivo.")
+        sheet = book[SHEET_NAME]
+        declared_rows = sheet.max_row
+        sheet.reset_dimensions()
+        partial = PartialKpis(declared_rows - 1 if declared_rows and declared_rows > 1 else None)
+
+        rows = sheet.rows
+        header = [_convert_cell(cell) for cell in next(rows, ())]
+        while header and header[-1] == "":
+            header.pop()
+
+        for first_index, data in _row_chunks(rows, chunk_rows):
+            raw = _parse_rows([header] + data)
+            # Índice contínuo entre blocos: a quarentena aponta a linha certa da planilha
+            raw.index = raw.index + first_index
+            chunk, quarantine = prepare_dataframe(raw)
+            quarantines.append(quarantine)
+            chunk_dtypes.append({column: (chunk[column].dtype, bool(chunk[column].isna().all())) for column in chunk.columns})
+            partial.add(len(data), chunk)
+            if workdir is not None:
+                parts.append(os.path.join(workdir, f'parte_{len(parts):05d}.arrow'))
+                _write_part(parts[-1], chunk)
+            else:
+                chunks.append(chunk)
+            if on_chunk is not None:
+                on_chunk(partial)
+    finally:
+        book.close()
+
+    if not quarantines:
+        # Aba sem linhas de dados: o mesmo resultado (ou erro de esquema) do read_excel
+        return prepare_dataframe(_parse_rows([header] if header else []))
+
+    targets = _unified_dtypes(chunk_dtypes)
+    if workdir is not None:
+        df = _assemble_on_disk(workdir, parts, targets)
+    else:
+        df = pd.concat([_cast_chunk(chunk, targets) for chunk in chunks])
+    return df, finalize_quarantine(pd.concat(quarantines))
+
+
+def prepare_planned(file, plan, on_chunk=None, name=None):
+    """
+    Lê e trata o arquivo com a estratégia de plan_ingestion; retorna (df, quarentena).
+    Só as leituras em blocos chamam on_chunk a cada bloco; a de uma vez o chama
+    uma vez, com o resultado completo.
+    """
+    if plan['strategy'] == STRATEGY_DISK:
+        spill_dir = os.environ.get(INGEST_SPILL_DIR_ENV_VAR) or tempfile.gettempdir()
+        return prepare_workbook_chunked(file, on_chunk, spill_dir=spill_dir)
+    if plan['strategy'] == STRATEGY_CHUNKED:
+        return prepare_workbook_chunked(file, on_chunk)
+    # De uma vez: o leitor do pandas, com uma única atualização do progresso no fim
+    df, quarantine = prepare_input(file, name)
+    if on_chunk is not None:
+        rows_read = len(df) + len(quarantine)
+        partial = PartialKpis(rows_read)
+        partial.add(rows_read, df)
+        on_chunk(partial)
+    return df, quarantine
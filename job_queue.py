@@ -0,0 +1,127 @@
+"""Fila de tarefas em segundo plano para exportações demoradas (PDF, Excel).
+
+As tarefas rodam num pool local de threads; cada uma recebe um ID, expõe
+status e progresso para consulta e grava o resultado num diretório
+temporário próprio, apagado quando a tarefa expira.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS_ENV_VAR = 'MONITORAI_JOB_WORKERS'
+JOB_TTL_ENV_VAR = 'MONITORAI_JOB_TTL'
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_TTL = 3600
+
+# Nome do arquivo de resultado no diretório da tarefa; o nome pedido em
+# submit (que pode vir do nome de um agente) só vale para o download
+RESULT_FILENAME = 'result'
+
+STATUS_PENDING = 'pendente'
+STATUS_RUNNING = 'executando'
+STATUS_DONE = 'concluído'
+STATUS_FAILED = 'erro'
+
+
+class JobQueue:
+    def __init__(self, workers=None, ttl=None, base_dir=None):
+        workers = workers or int(os.environ.get(JOB_WORKERS_ENV_VAR, DEFAULT_JOB_WORKERS))
+        self.ttl = ttl or int(os.environ.get(JOB_TTL_ENV_VAR, DEFAULT_JOB_TTL))
+        self.base_dir = base_dir or os.path.join(tempfile.gettempdir(), 'monitorai_jobs')
+        os.makedirs(self.base_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='monitorai-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, owner, label, filename, mime, func):
+        """
+        Agenda func(progress) e retorna o ID da tarefa. func deve devolver os
+        bytes do arquivo; progress(fração, mensagem) atualiza o andamento.
+        filename é só o nome sugerido no download, nunca um caminho.
+        """
+        self.purge_expired()
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'owner': owner,
+            'label': label,
+            'filename': filename,
+            'mime': mime,
+            'status': STATUS_PENDING,
+            'progress': 0.0,
+            'message': 'Na fila',
+            'error': None,
+            'path': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        self._executor.submit(self._run, job_id, func)
+        return job_id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def jobs_for(self, owner):
+        """Tarefas de uma sessão, da mais recente para a mais antiga"""
+        self.purge_expired()
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if job['owner'] == owner]
+        return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
+
+    def result(self, job_id):
+        job = self.status(job_id)
+        if job is None or job['status'] != STATUS_DONE:
+            return None
+        try:
+            with open(job['path'], 'rb') as result_file:
+                return result_file.read()
+        except OSError:
+            return None
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] is not None and job['finished_at'] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            shutil.rmtree(os.path.join(self.base_dir, job_id), ignore_errors=True)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, func):
+        self._update(job_id, status=STATUS_RUNNING, message='Processando')
+
+        def progress(fraction, message=None):
+            fields = {'progress': max(0.0, min(1.0, fraction))}
+            if message:
+                fields['message'] = message
+            self._update(job_id, **fields)
+
+        try:
+            data = func(progress)
+            job_dir = os.path.join(self.base_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            path = os.path.join(job_dir, RESULT_FILENAME)
+            with open(path, 'wb') as result_file:
+                result_file.write(data)
+            self._update(job_id, status=STATUS_DONE, progress=1.0, message='Pronto', path=path,
+                         finished_at=time.time())
+        except Exception as e:
+            self._update(job_id, status=STATUS_FAILED, message='Falhou', error=str(e),
+                         finished_at=time.time())
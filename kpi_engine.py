@@ -0,0 +1,162 @@
+"""Motor de KPIs por janela móvel.
+
+Os dados são pré-agregados uma vez por dia, empresa, agente e nível de risco
+(somas e contagens). Para uma seleção da barra lateral, as séries diárias viram
+somas de prefixo, e qualquer janela de N dias sai em O(1) pela diferença
+de dois prefixos, sem reler as linhas do dataset.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from checklist_bits import question_values
+from schema import SCORE_COLUMN
+
+ALL_VALUES = '__todos__'
+
+SUM_FIELDS = ['calls', 'score_sum', 'score_sq', 'score_n', 'baixo', 'alto', 'q1_sum', 'q1_n']
+
+# Métrica -> (campo do numerador, campo do denominador)
+KPI_METRICS = {
+    'Porcentagem de Acerto': ('score_sum', 'score_n'),
+    'Risco Baixo': ('baixo', 'calls'),
+    'Taxa Saudação': ('q1_sum', 'q1_n')
+}
+
+ROLLING_WINDOWS = (7, 30, 90)
+
+# Séries de prefixos guardadas por motor (LRU). O motor é compartilhado entre
+# sessões pelo cache, então o memo tem limite e lock próprios
+MAX_SERIES = 64
+
+
+def build_daily_aggregates(df):
+    """Somas e contagens diárias por empresa, agente e risco; None se não houver datas de análise"""
+    if 'AnalysisDateTime' not in df.columns:
+        return None
+
+    score = df[SCORE_COLUMN]
+    question1 = pd.Series(question_values(df, 'Question1'), index=df.index)
+
+    daily = pd.DataFrame({
+        'day': df['AnalysisDateTime'].dt.normalize(),
+        'Empresas': df['Empresas'] if 'Empresas' in df.columns else ALL_VALUES,
+        'CustomerAgent': df['CustomerAgent'] if 'CustomerAgent' in df.columns else ALL_VALUES,
+        'ClientRisk': df['ClientRisk'] if 'ClientRisk' in df.columns else ALL_VALUES,
+        'calls': 1,
+        'score_sum': score.fillna(0).to_numpy(),
+        'score_sq': (score ** 2).fillna(0).to_numpy(),
+        'score_n': score.notna().to_numpy(dtype=np.int64),
+        'baixo': (df['ClientRisk'] == 'BAIXO').to_numpy(dtype=np.int64) if 'ClientRisk' in df.columns else 0,
+        'alto': (df['ClientRisk'] == 'ALTO').to_numpy(dtype=np.int64) if 'ClientRisk' in df.columns else 0,
+        'q1_sum': question1.fillna(0).to_numpy(),
+        'q1_n': question1.notna().to_numpy(dtype=np.int64)
+    })
+    daily = daily[daily['day'].notna()]
+
+    group_cols = ['day', 'Empresas', 'CustomerAgent', 'ClientRisk']
+    return daily.groupby(group_cols, dropna=False, sort=True)[SUM_FIELDS].sum().reset_index()
+
+
+class PrefixSeries:
+    """Somas de prefixo diárias de uma seleção, de first_day até last_day"""
+
+    def __init__(self, first_day, prefix):
+        self.first_day = first_day
+        self.prefix = prefix
+
+    def _position(self, day):
+        # Índice do prefixo que acumula tudo até o fim de `day`, limitado ao intervalo existente
+        day = pd.Timestamp(day).normalize()
+        if day.tz is None and self.first_day.tz is not None:
+            day = day.tz_localize(self.first_day.tz)
+        offset = (day - self.first_day).days + 1
+        return int(np.clip(offset, 0, len(self.prefix['calls']) - 1))
+
+    def totals(self, end_day, days):
+        """Somas de todos os campos na janela de `days` dias que termina em end_day (inclusive)"""
+        end = self._position(end_day)
+        start = self._position(pd.Timestamp(end_day) - pd.Timedelta(days=days))
+        return {field: self.prefix[field][end] - self.prefix[field][start] for field in SUM_FIELDS}
+
+    def value(self, metric, end_day, days):
+        numerator, denominator = KPI_METRICS[metric]
+        totals = self.totals(end_day, days)
+        if totals[denominator] == 0:
+            return np.nan
+        value = totals[numerator] / totals[denominator]
+        return value if metric == 'Porcentagem de Acerto' else value * 100
+
+    def delta(self, metric, end_day, days):
+        """Variação (em pontos percentuais) da janela atual contra a janela anterior de mesmo tamanho"""
+        previous_end = pd.Timestamp(end_day) - pd.Timedelta(days=days)
+        return self.value(metric, end_day, days) - self.value(metric, previous_end, days)
+
+
+class KpiEngine:
+    def __init__(self, daily):
+        self.daily = daily
+        self.first_day = daily['day'].min()
+        self.last_day = daily['day'].max()
+        self._lock = threading.Lock()
+        self._series = OrderedDict()
+
+    def __getstate__(self):
+        # Para o spill do cache: o lock não é serializável e o memo é refeito sob demanda
+        return {'daily': self.daily}
+
+    def __setstate__(self, state):
+        self.__init__(state['daily'])
+
+    def series(self, empresa=None, agent=None, risk=None):
+        """Série de prefixos da seleção (None = sem filtro na dimensão); guarda as MAX_SERIES mais recentes"""
+        key = (empresa, agent, risk)
+        with self._lock:
+            if key in self._series:
+                self._series.move_to_end(key)
+                return self._series[key]
+
+        daily = self.daily
+        if empresa is not None:
+            daily = daily[daily['Empresas'] == empresa]
+        if agent is not None:
+            daily = daily[daily['CustomerAgent'] == agent]
+        if risk is not None:
+            daily = daily[daily['ClientRisk'] == risk]
+
+        n_days = (self.last_day - self.first_day).days + 1
+        positions = (daily['day'] - self.first_day).dt.days.to_numpy()
+        prefix = {}
+        for field in SUM_FIELDS:
+            per_day = np.bincount(positions, weights=daily[field].to_numpy(dtype=float), minlength=n_days)
+            prefix[field] = np.concatenate([[0.0], np.cumsum(per_day)])
+        series = PrefixSeries(self.first_day, prefix)
+
+        with self._lock:
+            self._series[key] = series
+            self._series.move_to_end(key)
+            while len(self._series) > MAX_SERIES:
+                self._series.popitem(last=False)
+        return series
+
+
+def build_kpi_engine(df):
+    daily = build_daily_aggregates(df)
+    if daily is None or len(daily) == 0:
+        return None
+    return KpiEngine(daily)
+
+
+def kpi_window_table(series, end_day):
+    """Tabela métrica × janelas móveis (7/30/90 dias) e variações semana/mês"""
+    rows = []
+    for metric in KPI_METRICS:
+        row = {'Métrica': metric}
+        for days in ROLLING_WINDOWS:
+            row[f'{days} dias'] = series.value(metric, end_day, days)
+        row['Δ Semana'] = series.delta(metric, end_day, 7)
+        row['Δ Mês'] = series.delta(metric, end_day, 30)
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,396 @@
+"""API HTTP local que serve em JSON os agregados do dashboard.
+
+Roda separada do Streamlit e lê os datasets já tratados do armazenamento
+Arrow compartilhado (ver arrow_store.py), ou um arquivo passado por --file
+(planilha, CSV, Parquet ou JSONL).
+
+Uso:
+    python monitor_api.py [--host 127.0.0.1] [--port 8502] [--file planilha.xlsx]
+
+Endpoints (GET):
+    /health                 estado do serviço e do cache
+    /datasets               datasets disponíveis (o primeiro é o padrão)
+    /kpis                   total, acerto médio, % risco baixo e taxa de saudação
+    /empresas               estatísticas por empresa
+    /agentes                ranking de agentes pela nota ajustada (top, ordem=melhores|piores, min_ligacoes)
+    /criterios              acerto por critério do checklist e pontos de melhoria
+
+Filtros aceitos em todos os endpoints de dados:
+    dataset, empresa, agente, risco, inicio, fim (AAAA-MM-DD, inclusivos)
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from agent_ranking import build_agent_ranking, rank_agents
+from aggregates import (
+    compute_company_stats,
+    compute_improvement_points,
+    compute_kpis,
+    filter_dataset
+)
+from arrow_store import list_datasets, open_dataset, save_dataset
+from dataset_registry import content_hash
+from ingestion import load_input
+from question_matrix import QUESTION_NAMES, build_question_matrix
+
+DEFAULT_PORT = 8502
+DEFAULT_CACHE_ENTRIES = 512
+# Datasets mantidos abertos pelo catálogo; os demais são reabertos do armazenamento
+DEFAULT_CATALOG_DATASETS = 4
+
+FILTER_PARAMS = ('empresa', 'agente', 'risco', 'inicio', 'fim')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def to_jsonable(value):
+    """Converte NaN em null e tipos numpy/pandas em tipos nativos do JSON"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class DatasetCatalog:
+    """
+    Datasets tratados em memória, abertos do armazenamento Arrow sob demanda.
+    Mantém abertos os max_datasets usados mais recentemente; os que só existem
+    em memória (o armazenamento falhou ao gravar) nunca saem, pois não há de
+    onde reabri-los.
+    """
+
+    def __init__(self, max_datasets=DEFAULT_CATALOG_DATASETS):
+        self.max_datasets = max_datasets
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        self._memory_only = set()
+
+    def register(self, key, df):
+        # Reabrir via memory-map faz a API usar as mesmas páginas que o dashboard
+        stored = save_dataset(key, df)
+        if stored:
+            df = open_dataset(key)
+        with self._lock:
+            if stored:
+                self._memory_only.discard(key)
+            else:
+                self._memory_only.add(key)
+            self._frames[key] = df
+            self._touch(key)
+
+    def register_workbook(self, path):
+        with open(path, 'rb') as workbook:
+            key = content_hash(workbook.read())
+        df = open_dataset(key)
+        if df is None:
+            df = load_input(path)
+        self.register(key, df)
+        return key
+
+    def keys(self):
+        with self._lock:
+            loaded = list(self._frames)
+        return loaded + [key for key in list_datasets() if key not in loaded]
+
+    def get(self, key=None):
+        if key is None:
+            keys = self.keys()
+            if not keys:
+                raise ApiError(404, "Nenhum dataset disponível. Envie uma planilha pelo dashboard ou use --file.")
+            key = keys[0]
+
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._touch(key)
+        if df is None:
+            df = open_dataset(key)
+            if df is None:
+                raise ApiError(404, f"Dataset '{key}' não encontrado.")
+            with self._lock:
+                df = self._frames.setdefault(key, df)
+                self._touch(key)
+        return key, df
+
+    def _touch(self, key):
+        # Marca key como o mais recente e fecha os usados há mais tempo
+        self._frames.move_to_end(key)
+        evictable = [k for k in self._frames if k not in self._memory_only]
+        for old in evictable[:max(len(self._frames) - self.max_datasets, 0)]:
+            del self._frames[old]
+
+
+class AggregateStore:
+    """
+    Cache LRU de respostas já serializadas, compartilhado por todas as requisições.
+    Requisições simultâneas pela mesma chave calculam a resposta uma só vez: a
+    primeira calcula e as demais esperam pelo lock da chave.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._compute_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        # Chamado com self._lock
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        return None
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            body = self._lookup(key)
+            if body is not None:
+                return body
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+
+        with compute_lock:
+            with self._lock:
+                # Outra requisição pode ter calculado enquanto esta esperava
+                body = self._lookup(key)
+                if body is not None:
+                    return body
+                self.misses += 1
+            try:
+                body = compute()
+                with self._lock:
+                    self._entries[key] = body
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._compute_locks.pop(key, None)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {'entradas': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def parse_filters(params):
+    filters = {}
+    for name in FILTER_PARAMS:
+        value = params.get(name, [None])[0]
+        if value in (None, '', 'Todas', 'Todos'):
+            filters[name] = None
+        elif name in ('inicio', 'fim'):
+            try:
+                filters[name] = date.fromisoformat(value)
+            except ValueError:
+                raise ApiError(400, f"Data inválida em '{name}': use AAAA-MM-DD.")
+        else:
+            filters[name] = value
+    return filters
+
+
+def parse_int(params, name, default):
+    value = params.get(name, [None])[0]
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(400, f"Parâmetro '{name}' deve ser inteiro.")
+
+
+def kpis_payload(df, params):
+    kpis = compute_kpis(df)
+    return {
+        'total_analises': kpis['total_analyses'],
+        'acerto_medio': kpis['avg_score'],
+        'risco_baixo_pct': kpis['low_risk_pct'],
+        'saudacao_pct': kpis['saudacao_pct']
+    }
+
+
+def empresas_payload(df, params):
+    company_stats = compute_company_stats(df)
+    if company_stats is None:
+        return []
+    return [
+        {'empresa': empresa, 'acerto_medio': score, 'total_analises': total, 'risco_baixo_pct': low_risk}
+        for empresa, score, total, low_risk in zip(
+            company_stats.index,
+            company_stats['Porcentagem Média'],
+            company_stats['Total Análises'],
+            company_stats['% Risco Baixo']
+        )
+    ]
+
+
+def agentes_payload(df, params):
+    top = parse_int(params, 'top', 5)
+    min_calls = parse_int(params, 'min_ligacoes', 0)
+    order = params.get('ordem', ['melhores'])[0]
+    if order not in ('melhores', 'piores'):
+        raise ApiError(400, "Parâmetro 'ordem' deve ser 'melhores' ou 'piores'.")
+
+    ranking = build_agent_ranking(df)
+    if ranking is None:
+        return []
+    ranking = ranking[ranking['Total Ligações'] >= min_calls]
+    ranking = rank_agents(ranking, top, ascending=(order == 'piores'))
+    return [
+        {
+            'agente': agent,
+            'acerto_medio': score,
+            'acerto_ajustado': adjusted,
+            'ic_inferior': lower,
+            'ic_superior': upper,
+            'total_ligacoes': calls
+        }
+        for agent, score, adjusted, lower, upper, calls in zip(
+            ranking.index,
+            ranking['Porcentagem Média'],
+            ranking['Nota Ajustada'],
+            ranking['Limite Inferior'],
+            ranking['Limite Superior'],
+            ranking['Total Ligações']
+        )
+    ]
+
+
+def criterios_payload(df, params):
+    question_matrix = build_question_matrix(df)
+    return {
+        'criterios': [
+            {'questao': q, 'criterio': QUESTION_NAMES.get(q, q), 'acerto_pct': perf}
+            for q, perf in question_matrix.overall_by_question().items()
+        ],
+        'pontos_de_melhoria': [
+            {'criterio': name, 'acerto_pct': perf}
+            for name, perf in compute_improvement_points(question_matrix)
+        ]
+    }
+
+
+ENDPOINTS = {
+    '/kpis': kpis_payload,
+    '/empresas': empresas_payload,
+    '/agentes': agentes_payload,
+    '/criterios': criterios_payload
+}
+
+
+class MonitorApi:
+    """Resolve uma requisição (caminho + query string) em (status, corpo JSON)"""
+
+    def __init__(self, catalog=None, store=None):
+        self.catalog = catalog or DatasetCatalog()
+        self.store = store or AggregateStore()
+        self.started_at = time.time()
+
+    def handle(self, path, query):
+        params = parse_qs(query)
+        try:
+            if path == '/health':
+                payload = {
+                    'status': 'ok',
+                    'uptime_s': round(time.time() - self.started_at, 1),
+                    'cache': self.store.stats()
+                }
+                return 200, json.dumps(payload).encode('utf-8')
+            if path == '/datasets':
+                return 200, json.dumps({'datasets': self.catalog.keys()}).encode('utf-8')
+            if path not in ENDPOINTS:
+                raise ApiError(404, f"Endpoint '{path}' não existe.")
+
+            dataset_key, df = self.catalog.get(params.get('dataset', [None])[0])
+            filters = parse_filters(params)
+            extra = tuple(sorted((k, tuple(v)) for k, v in params.items() if k not in FILTER_PARAMS + ('dataset',)))
+            cache_key = (path, dataset_key, tuple(filters[name] for name in FILTER_PARAMS), extra)
+
+            def compute():
+                filtered = filter_dataset(
+                    df,
+                    empresa=filters['empresa'],
+                    agent=filters['agente'],
+                    risk=filters['risco'],
+                    start=filters['inicio'],
+                    end=filters['fim']
+                )
+                payload = {'dataset': dataset_key, 'dados': ENDPOINTS[path](filtered, params)}
+                return json.dumps(to_jsonable(payload), ensure_ascii=False).encode('utf-8')
+
+            return 200, self.store.get_or_compute(cache_key, compute)
+        except ApiError as e:
+            return e.status, json.dumps({'erro': e.message}, ensure_ascii=False).encode('utf-8')
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, body = api.handle(url.path.rstrip('/') or '/', url.query)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Sem log por requisição: atrapalha os benchmarks e não agrega nada localmente
+            pass
+
+    return Handler
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # O backlog padrão (5) derruba conexões sob rajadas e gera retransmissões de ~1 s
+    request_queue_size = 128
+
+
+def create_server(api, host='127.0.0.1', port=DEFAULT_PORT):
+    return ApiServer((host, port), make_handler(api))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API JSON local com os agregados do Monitor AI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--file', help='planilha, CSV, Parquet ou JSONL a registrar antes de iniciar (opcional)')
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES)
+    args = parser.parse_args()
+
+    api = MonitorApi(store=AggregateStore(args.cache_entries))
+    if args.file:
+        key = api.catalog.register_workbook(args.file)
+        print(f"Dataset registrado: {key}")
+
+    server = create_server(api, args.host, args.port)
+    print(f"API do Monitor AI em http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Instrumentação opcional de tempo e memória por etapa do dashboard.
+
+Ativada pela variável de ambiente MONITORAI_PERF=1 ou pelo parâmetro de URL
+?perf=1. Quando desativada, as etapas não medem nada e o custo é desprezível.
+A memória de cada etapa é a variação do RSS do processo, lida de
+/proc/self/statm: não liga o tracemalloc (que pesaria em todas as sessões e
+threads do servidor) e, como é do processo inteiro, inclui o que outras
+sessões alocarem durante a etapa.
+
+O perfil de funções (cProfile) é ativado à parte, por MONITORAI_PROFILE=1 ou
+?profile=1: cada rerun roda sob o profiler determinístico, e o relatório traz
+as funções com maior tempo cumulativo, o arquivo .prof (pstats, para snakeviz
+ou python -m pstats) e as pilhas no formato "folded" do flamegraph.pl,
+speedscope e inferno.
+"""
+import cProfile
+import json
+import marshal
+import os
+import pstats
+import resource
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+PERF_ENV_VAR = 'MONITORAI_PERF'
+PERF_LOG_ENV_VAR = 'MONITORAI_PERF_LOG'
+DEFAULT_PERF_LOG = 'perf_log.jsonl'
+PROFILE_ENV_VAR = 'MONITORAI_PROFILE'
+# Ramos do flamegraph abaixo disso (µs) são podados na reconstrução das pilhas
+MIN_FOLDED_US = 50
+MAX_FOLDED_DEPTH = 80
+
+
+def _flag_enabled(env_var, param, query_params):
+    if os.environ.get(env_var, '').strip().lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if query_params is not None:
+        return str(query_params.get(param, '')).strip().lower() in ('1', 'true', 'yes', 'on')
+    return False
+
+
+def perf_enabled(query_params=None):
+    """Retorna True se a instrumentação foi solicitada por ambiente ou URL"""
+    return _flag_enabled(PERF_ENV_VAR, 'perf', query_params)
+
+
+def profile_enabled(query_params=None):
+    """Retorna True se o perfil de funções foi solicitado por ambiente (MONITORAI_PROFILE) ou URL (?profile=1)"""
+    return _flag_enabled(PROFILE_ENV_VAR, 'profile', query_params)
+
+
+def current_rss():
+    """RSS do processo em bytes; sem /proc (macOS), o pico desde o início do processo"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PerfRecorder:
+    """Registra tempo de parede e variação do RSS de cada etapa de um rerun"""
+
+    def __init__(self, enabled=False, session_id=None, log_path=None):
+        self.enabled = enabled
+        self.session_id = session_id or uuid.uuid4().hex[:12]
+        self.run_id = uuid.uuid4().hex[:12]
+        self.log_path = log_path or os.environ.get(PERF_LOG_ENV_VAR, DEFAULT_PERF_LOG)
+        self.records = []
+        self._depth = 0
+        self._run_start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        # O registro entra na lista na abertura para manter a ordem de execução
+        record = {'stage': name, 'depth': self._depth, 'wall_ms': None, 'rss_delta_kb': None}
+        self.records.append(record)
+
+        rss_before = current_rss()
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            record['wall_ms'] = round(elapsed_ms, 2)
+            record['rss_delta_kb'] = round((current_rss() - rss_before) / 1024, 1)
+
+    def total_ms(self):
+        return round((time.perf_counter() - self._run_start) * 1000, 2)
+
+    def flush(self):
+        """Anexa os registros deste rerun ao log JSONL local"""
+        if not self.enabled or not self.records:
+            return
+
+        timestamp = datetime.now().isoformat(timespec='seconds')
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as log_file:
+                for record in self.records:
+                    entry = {
+                        'timestamp': timestamp,
+                        'session_id': self.session_id,
+                        'run_id': self.run_id,
+                        **record
+                    }
+                    log_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError:
+            # O log é auxiliar: falha de escrita não deve derrubar o dashboard
+            pass
+
+
+# Profiler ativo em cada thread: um rerun interrompido por exceção não chega
+# ao stop(), e o seguinte na mesma thread precisa desligá-lo
+_active_profiles = threading.local()
+
+
+def function_label(func):
+    """Nome legível de uma função do pstats: nome (arquivo:linha), ou o nome de uma built-in"""
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class RerunProfiler:
+    """Perfil determinístico (cProfile) de um rerun ou de uma tarefa em segundo plano"""
+
+    def __init__(self, enabled=False, label='rerun'):
+        self.enabled = enabled
+        self.label = label
+        self.stats = None
+        self._profile = None
+
+    def start(self):
+        if not self.enabled:
+            return self
+        stale = getattr(_active_profiles, 'profile', None)
+        if stale is not None:
+            stale.disable()
+        self._profile = cProfile.Profile()
+        _active_profiles.profile = self._profile
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        if self._profile is None:
+            return self
+        self._profile.disable()
+        if getattr(_active_profiles, 'profile', None) is self._profile:
+            _active_profiles.profile = None
+        self.stats = pstats.Stats(self._profile)
+        self._profile = None
+        return self
+
+    def total_ms(self):
+        return round(self.stats.total_tt * 1000, 1) if self.stats is not None else 0.0
+
+    def top_functions(self, limit=30):
+        """Funções com maior tempo cumulativo: chamadas, tempo próprio e cumulativo (ms)"""
+        if self.stats is None:
+            return []
+        rows = [
+            {
+                'function': function_label(func),
+                'calls': nc,
+                'self_ms': round(tt * 1000, 2),
+                'cumulative_ms': round(ct * 1000, 2)
+            }
+            for func, (cc, nc, tt, ct, callers) in self.stats.stats.items()
+        ]
+        rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+        return rows[:limit]
+
+    def pstats_bytes(self):
+        """Conteúdo de um arquivo .prof, o mesmo que Stats.dump_stats grava"""
+        return marshal.dumps(self.stats.stats) if self.stats is not None else b''
+
+    def folded_stacks(self):
+        """
+        Pilhas no formato folded ("raiz;...;folha µs" por linha). O cProfile
+        só guarda pares chamador -> chamado, então as pilhas são reconstruídas
+        a partir das raízes, repartindo o tempo de cada função entre os
+        chamados na proporção do tempo cumulativo de cada aresta.
+        """
+        if self.stats is None:
+            return ''
+        entries = self.stats.stats
+        children = {}
+        for func, (cc, nc, tt, ct, callers) in entries.items():
+            for caller, edge in callers.items():
+                children.setdefault(caller, []).append((func, edge[3]))
+        roots = [func for func, entry in entries.items() if not any(caller in entries for caller in entry[4])]
+
+        totals = {}
+
+        def walk(func, path, budget_us):
+            ct_us = entries[func][3] * 1e6
+            scale = budget_us / ct_us if ct_us > 0 else 0.0
+            calls = [(child, edge_ct * 1e6 * scale) for child, edge_ct in children.get(func, ()) if child not in path]
+            spent = sum(child_us for _, child_us in calls)
+            if spent > budget_us > 0:
+                calls = [(child, child_us * budget_us / spent) for child, child_us in calls]
+            stack = path + (func,)
+            # Ramos podados (muito curtos ou fundos demais) ficam no tempo próprio da função
+            kept = [(child, child_us) for child, child_us in calls if child_us >= MIN_FOLDED_US] \
+                if len(stack) < MAX_FOLDED_DEPTH else []
+            self_us = budget_us - sum(child_us for _, child_us in kept)
+            if self_us >= 1:
+                key = ';'.join(function_label(f).replace(';', ',') for f in stack)
+                totals[key] = totals.get(key, 0) + self_us
+            for child, child_us in kept:
+                walk(child, stack, child_us)
+
+        for root in roots:
+            walk(root, (), entries[root][3] * 1e6)
+        return '\n'.join(f"{stack} {round(us)}" for stack, us in totals.items() if round(us) > 0) + '\n'
+
+
+def profiled(fn, label, sink):
+    """Envolve fn para rodar sob cProfile na thread que a executar; ao fim, sink(profiler)"""
+    def run(*args, **kwargs):
+        profiler = RerunProfiler(enabled=True, label=label).start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sink(profiler.stop())
+    return run
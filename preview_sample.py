@@ -0,0 +1,123 @@
+"""Amostra estratificada para o modo prévia de datasets muito grandes.
+
+Os estratos são as combinações Empresas × CustomerAgent. As linhas são
+ordenadas por estrato (em ordem aleatória dentro dele) e a amostra pega uma
+a cada N/n posições: todo estrato recebe a mesma fração f das suas linhas
+(alocação proporcional), então a amostra é autoponderada e médias e
+percentuais saem como médias simples dela. Os intervalos de confiança usam
+a variância da amostragem estratificada, com correção de população finita,
+para o recorte filtrado (domínio) da amostra.
+"""
+import numpy as np
+
+from checklist_bits import QUESTION_COLUMNS, checklist_questions, question_values
+from schema import SCORE_COLUMN
+
+SAMPLE_ROWS = 50_000
+# Abaixo disso o dataset inteiro já é rápido e a prévia não é oferecida
+PREVIEW_MIN_ROWS = 200_000
+STRATA_COLUMNS = ['Empresas', 'CustomerAgent']
+CONFIDENCE_Z = 1.96
+
+
+class PreviewSample:
+    def __init__(self, frame, positions, strata, fraction):
+        self.frame = frame
+        self.positions = positions
+        self.strata = strata
+        self.fraction = fraction
+
+    def select(self, filter_mask):
+        """Máscara do domínio na amostra a partir da máscara de filtros do dataset completo"""
+        return np.asarray(filter_mask, dtype=bool)[self.positions]
+
+    def mean(self, values, in_domain):
+        """
+        Média de `values` no domínio e a meia-largura do intervalo de 95%.
+        NaN em values fica fora do domínio (ex.: critério não avaliado).
+        """
+        values = np.asarray(values, dtype=float)
+        in_domain = in_domain & ~np.isnan(values)
+        n_domain = int(in_domain.sum())
+        if n_domain == 0:
+            return np.nan, np.nan
+        estimate = values[in_domain].mean()
+
+        # Linearização da média do domínio: z = (y - média) dentro do domínio, 0 fora
+        z = np.where(in_domain, values - estimate, 0.0)
+        n_strata = int(self.strata.max()) + 1
+        n_h = np.bincount(self.strata, minlength=n_strata)
+        sum_h = np.bincount(self.strata, weights=z, minlength=n_strata)
+        sq_h = np.bincount(self.strata, weights=z ** 2, minlength=n_strata)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            s2_h = np.where(n_h > 1, (sq_h - sum_h ** 2 / n_h) / (n_h - 1), 0.0)
+        variance = (1 - self.fraction) * (n_h * s2_h).sum() / n_domain ** 2
+        return estimate, CONFIDENCE_Z * np.sqrt(max(variance, 0.0))
+
+
+def build_preview_sample(df, sample_rows=SAMPLE_ROWS, seed=0):
+    """Amostra estratificada proporcional de até sample_rows linhas; None se o df já for pequeno"""
+    n_rows = len(df)
+    if n_rows <= sample_rows:
+        return None
+
+    strata_columns = [col for col in STRATA_COLUMNS if col in df.columns]
+    if strata_columns:
+        codes = df.groupby(strata_columns, dropna=False, sort=False).ngroup().to_numpy()
+    else:
+        codes = np.zeros(n_rows, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(n_rows), codes))
+    step = n_rows / sample_rows
+    picks = np.floor(rng.random() * step + np.arange(sample_rows) * step).astype(np.int64)
+    positions = np.sort(order[picks])
+
+    _, strata = np.unique(codes[positions], return_inverse=True)
+    return PreviewSample(df.iloc[positions], positions, strata, sample_rows / n_rows)
+
+
+def preview_kpis(sample, in_domain):
+    """Estimativas (valor, meia-largura) dos KPIs em percentual"""
+    frame = sample.frame
+    kpis = {'avg_score': sample.mean(frame[SCORE_COLUMN].to_numpy(dtype=float), in_domain)}
+    if 'ClientRisk' in frame.columns:
+        low_risk, margin = sample.mean((frame['ClientRisk'] == 'BAIXO').to_numpy(dtype=float), in_domain)
+        kpis['low_risk_pct'] = (low_risk * 100, margin * 100)
+    saudacao, margin = sample.mean(question_values(frame, 'Question1'), in_domain)
+    kpis['saudacao_pct'] = (saudacao * 100, margin * 100)
+    return kpis
+
+
+def preview_question_margins(sample, in_domain):
+    """Meia-largura (p.p.) do percentual de acerto de cada critério avaliado"""
+    frame = sample.frame
+    return {
+        q: sample.mean(question_values(frame, q), in_domain)[1] * 100
+        for q in QUESTION_COLUMNS if q in checklist_questions(frame)
+    }
+
+
+def preview_risk_margins(sample, in_domain):
+    """Meia-largura (p.p.) do percentual de cada nível de risco"""
+    frame = sample.frame
+    if 'ClientRisk' not in frame.columns:
+        return {}
+    risk = frame['ClientRisk']
+    return {
+        level: sample.mean((risk == level).to_numpy(dtype=float), in_domain)[1] * 100
+        for level in risk[in_domain].dropna().unique()
+    }
+
+
+def preview_company_margins(sample, in_domain):
+    """Meia-largura do acerto médio de cada empresa"""
+    frame = sample.frame
+    if 'Empresas' not in frame.columns:
+        return {}
+    score = frame[SCORE_COLUMN].to_numpy(dtype=float)
+    companies = frame['Empresas']
+    return {
+        company: sample.mean(score, in_domain & (companies == company).to_numpy())[1]
+        for company in companies[in_domain].dropna().unique()
+    }
@@ -0,0 +1,232 @@
+"""Sketches de quantis mergeáveis para distribuições de valores positivos.
+
+Cada valor cai num bucket logarítmico (estilo DDSketch): com precisão relativa
+a, o bucket k cobre (γ^(k-1), γ^k] com γ = (1+a)/(1-a), e qualquer quantil sai
+com erro relativo de no máximo a. Um sketch é só um vetor de contagens, então
+juntar sketches (dias numa semana, empresas no total) é somar vetores, e
+muitos grupos cabem numa matriz grupos × buckets construída numa única
+passada vetorizada.
+
+Junto das contagens cada grupo guarda os momentos exatos (soma, soma dos
+quadrados, mínimo e máximo) e, opcionalmente, um histograma de intervalos
+fixos, que também se juntam por soma ou min/max: média, desvio, mínimo,
+máximo e histograma de qualquer recorte saem exatos.
+"""
+import numpy as np
+import pandas as pd
+
+from schema import SCORE_COLUMN
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Valores abaixo disso contam como zero (não há log de zero nem de negativos)
+MIN_POSITIVE_VALUE = 1e-3
+# Notas vão de 0 a 100: 0,2% de erro relativo deixa a mediana a menos de 0,2 p.p. da exata
+SCORE_RELATIVE_ACCURACY = 0.002
+SCORE_HISTOGRAM_EDGES = np.arange(0, 105, 5)
+
+MOMENT_FIELDS = ['sum', 'sq', 'min', 'max']
+
+
+def factorize_keys(keys):
+    """Código de grupo de cada linha e o frame de chaves distintas, em ordem"""
+    # Fatoriza coluna a coluna e combina os códigos inteiros: bem mais rápido que um MultiIndex
+    column_codes, column_uniques = [], []
+    for col in keys.columns:
+        codes, uniques = pd.factorize(keys[col], sort=True)
+        column_codes.append(codes)
+        column_uniques.append(uniques)
+    sizes = [max(len(uniques), 1) for uniques in column_uniques]
+    combined = np.ravel_multi_index(column_codes, sizes) if column_codes else np.zeros(len(keys), dtype=np.int64)
+    present, codes = np.unique(combined, return_inverse=True)
+    positions = np.unravel_index(present, sizes)
+    group_keys = pd.DataFrame({
+        col: uniques.take(position) for col, uniques, position in zip(keys.columns, column_uniques, positions)
+    })
+    return codes, group_keys
+
+
+class SketchMatrix:
+    """
+    Um sketch por linha de `keys`; counts[i, j] conta o bucket min_bucket + j
+    do grupo i e moments[campo][i] guarda os momentos exatos do grupo. Com
+    `edges`, bins[i] traz o histograma exato do grupo nesses intervalos.
+    """
+
+    def __init__(self, keys, counts, zeros, min_bucket, moments, relative_accuracy=DEFAULT_RELATIVE_ACCURACY,
+                 edges=None, bins=None):
+        self.keys = keys.reset_index(drop=True)
+        self.counts = counts
+        self.zeros = zeros
+        self.min_bucket = min_bucket
+        self.moments = moments
+        self.relative_accuracy = relative_accuracy
+        self.edges = edges
+        self.bins = bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+
+    def totals(self):
+        return self.counts.sum(axis=1) + self.zeros
+
+    def select(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        moments = {field: values[mask] for field, values in self.moments.items()}
+        return SketchMatrix(
+            self.keys[mask], self.counts[mask], self.zeros[mask], self.min_bucket, moments, self.relative_accuracy,
+            self.edges, None if self.bins is None else self.bins[mask]
+        )
+
+    def rollup(self, by=None):
+        """Soma os sketches por um subconjunto das chaves (None = um único sketch com tudo)"""
+        if by is None:
+            keys = pd.DataFrame(index=[0])
+            codes = np.zeros(len(self.keys), dtype=np.int64)
+        else:
+            by = [by] if isinstance(by, str) else list(by)
+            codes, keys = factorize_keys(self.keys[by])
+        counts = np.zeros((len(keys), self.counts.shape[1]), dtype=self.counts.dtype)
+        np.add.at(counts, codes, self.counts)
+        zeros = np.bincount(codes, weights=self.zeros, minlength=len(keys)).astype(self.zeros.dtype)
+        bins = None
+        if self.bins is not None:
+            bins = np.zeros((len(keys), self.bins.shape[1]), dtype=self.bins.dtype)
+            np.add.at(bins, codes, self.bins)
+        return SketchMatrix(
+            keys, counts, zeros, self.min_bucket, rollup_moments(self.moments, codes, len(keys)), self.relative_accuracy,
+            self.edges, bins
+        )
+
+    def quantiles(self, qs=(0.5, 0.9, 0.99)):
+        """Matriz grupos × quantis; NaN para grupos vazios"""
+        totals = self.totals()
+        cumulative = np.cumsum(self.counts, axis=1)
+        bucket_values = 2 * self.gamma ** np.arange(self.min_bucket, self.min_bucket + self.counts.shape[1]) / (self.gamma + 1)
+
+        result = np.full((len(totals), len(qs)), np.nan)
+        for j, q in enumerate(qs):
+            # Posição (0-based) do valor de rank q entre os positivos, descontados os zeros
+            rank = np.floor(q * (totals - 1)) - self.zeros
+            in_zero = rank < 0
+            bucket = (cumulative <= rank[:, None]).sum(axis=1)
+            bucket = np.minimum(bucket, self.counts.shape[1] - 1)
+            values = bucket_values[bucket] if self.counts.shape[1] else np.zeros(len(totals))
+            result[:, j] = np.where(in_zero, 0.0, values)
+        # O valor representativo do bucket pode passar dos extremos observados
+        result = np.clip(result, self.moments['min'][:, None], self.moments['max'][:, None])
+        result[totals == 0] = np.nan
+        return result
+
+    def quantile_frame(self, qs=(0.5, 0.9, 0.99)):
+        frame = self.keys.copy()
+        for q, column in zip(qs, self.quantiles(qs).T):
+            frame[f"p{round(q * 100)}"] = column
+        frame['n'] = self.totals()
+        return frame
+
+    def stats_frame(self, qs=(0.5,)):
+        """Chaves com n, média, desvio amostral, mínimo, máximo (exatos) e os quantis pedidos"""
+        n = self.totals().astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.moments['sum'] / n
+            variance = (self.moments['sq'] - n * mean ** 2) / (n - 1)
+        frame = self.keys.copy()
+        frame['n'] = self.totals()
+        frame['mean'] = mean
+        frame['std'] = np.sqrt(np.maximum(variance, 0))
+        frame['min'] = np.where(n > 0, self.moments['min'], np.nan)
+        frame['max'] = np.where(n > 0, self.moments['max'], np.nan)
+        for q, column in zip(qs, self.quantiles(qs).T):
+            frame[f"p{round(q * 100)}"] = column
+        return frame
+
+    def histogram(self):
+        """Contagens de todos os grupos juntos nos intervalos de `edges` (último intervalo fechado)"""
+        if self.bins is None:
+            raise ValueError("Sketches montados sem intervalos de histograma")
+        return self.bins.sum(axis=0)
+
+
+def rollup_moments(moments, codes, n_groups):
+    """Momentos somados (soma, quadrados) e combinados (mínimo, máximo) por código de grupo"""
+    minimums = np.full(n_groups, np.inf)
+    maximums = np.full(n_groups, -np.inf)
+    np.minimum.at(minimums, codes, moments['min'])
+    np.maximum.at(maximums, codes, moments['max'])
+    return {
+        'sum': np.bincount(codes, weights=moments['sum'], minlength=n_groups),
+        'sq': np.bincount(codes, weights=moments['sq'], minlength=n_groups),
+        'min': minimums,
+        'max': maximums
+    }
+
+
+def build_sketches(values, keys, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, edges=None):
+    """
+    Sketches de `values` agrupados pelas colunas de `keys` (mesmo comprimento),
+    numa única passada. Valores NaN são ignorados; valores fora de `edges`
+    entram no primeiro ou no último intervalo do histograma.
+    """
+    values = np.asarray(values, dtype=float)
+    keys = keys.reset_index(drop=True)
+    valid = ~np.isnan(values) & keys.notna().all(axis=1).to_numpy()
+    values = values[valid]
+    keys = keys[valid]
+
+    codes, group_keys = factorize_keys(keys)
+    n_groups = len(group_keys)
+
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    positive = values >= MIN_POSITIVE_VALUE
+    buckets = np.ceil(np.log(values[positive]) / np.log(gamma)).astype(np.int64)
+    min_bucket = int(buckets.min()) if len(buckets) else 0
+    width = int(buckets.max()) - min_bucket + 1 if len(buckets) else 0
+
+    flat = codes[positive] * width + (buckets - min_bucket)
+    counts = np.bincount(flat, minlength=n_groups * width).reshape(n_groups, width)
+    zeros = np.bincount(codes[~positive], minlength=n_groups)
+    moments = rollup_moments({'sum': values, 'sq': values ** 2, 'min': values, 'max': values}, codes, n_groups)
+
+    bins = None
+    if edges is not None:
+        n_bins = len(edges) - 1
+        positions = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, n_bins - 1)
+        bins = np.bincount(codes * n_bins + positions, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    return SketchMatrix(group_keys, counts, zeros, min_bucket, moments, relative_accuracy, edges, bins)
+
+
+def sketch_keys(df):
+    keys = pd.DataFrame({'day': df['AnalysisDateTime'].dt.normalize()}, index=df.index)
+    keys['Empresas'] = df['Empresas'] if 'Empresas' in df.columns else 'Todas'
+    return keys
+
+
+def latency_minutes(df):
+    """Minutos entre a ligação (CallDate) e a análise (AnalysisDateTime); NaN sem alguma das datas"""
+    return (df['AnalysisDateTime'] - df['CallDate']).dt.total_seconds().to_numpy() / 60
+
+
+def build_latency_sketches(df, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    """Sketches da latência ligação → análise por dia × empresa; None sem as duas datas"""
+    if 'CallDate' not in df.columns or 'AnalysisDateTime' not in df.columns:
+        return None
+    return build_sketches(latency_minutes(df), sketch_keys(df), relative_accuracy)
+
+
+def build_score_sketches(df, relative_accuracy=SCORE_RELATIVE_ACCURACY):
+    """Sketches da nota (PERCENTUAL) por dia × empresa, com histograma de 5 em 5 p.p.; None sem datas de análise"""
+    if 'AnalysisDateTime' not in df.columns:
+        return None
+    return build_sketches(df[SCORE_COLUMN].to_numpy(dtype=float), sketch_keys(df), relative_accuracy, SCORE_HISTOGRAM_EDGES)
+
+
+def select_keys(sketches, empresa=None, start=None, end=None):
+    """Sketches de uma empresa e de um intervalo de dias (datas inclusivas); None não filtra"""
+    keys = sketches.keys
+    mask = np.ones(len(keys), dtype=bool)
+    if empresa is not None:
+        mask &= (keys['Empresas'] == empresa).to_numpy()
+    tz = keys['day'].dt.tz
+    if start is not None:
+        mask &= (keys['day'] >= pd.Timestamp(start).tz_localize(tz)).to_numpy()
+    if end is not None:
+        mask &= (keys['day'] <= pd.Timestamp(end).tz_localize(tz)).to_numpy()
+    return sketches if mask.all() else sketches.select(mask)
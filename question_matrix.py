@@ -0,0 +1,83 @@
+"""Matriz agentes × critérios do checklist (Question1..Question12).
+
+As somas e contagens de acertos de todos os agentes saem das máscaras de
+bits do checklist (checklist_bits.py), com uma contagem agrupada por
+critério; os percentuais gerais, por agente e o mapa de calor são
+derivados dela.
+"""
+import numpy as np
+import pandas as pd
+
+from checklist_bits import QUESTION_COLUMNS, QUESTION_NAMES, checklist_questions, question_counts
+
+
+class QuestionMatrix:
+    """Somas e contagens de acertos por agente (linhas) e critério (colunas)"""
+
+    def __init__(self, agents, questions, sums, counts, calls, total_sums=None, total_counts=None):
+        self.agents = agents
+        self.questions = questions
+        self.sums = sums
+        self.counts = counts
+        self.calls = calls
+        # Totais incluem as linhas sem agente, que não aparecem na matriz
+        self.total_sums = sums.sum(axis=0) if total_sums is None else total_sums
+        self.total_counts = counts.sum(axis=0) if total_counts is None else total_counts
+        self._agent_index = {agent: i for i, agent in enumerate(agents)}
+
+    def percentages(self):
+        """Matriz de percentuais de acerto (NaN onde o agente não tem avaliações do critério)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / self.counts * 100
+
+    def overall(self):
+        """Percentual de acerto de cada critério no conjunto inteiro, como df[q].mean() * 100"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.total_sums / self.total_counts * 100
+
+    def overall_by_question(self):
+        return dict(zip(self.questions, self.overall()))
+
+    def agent(self, agent):
+        """Percentuais de um agente por critério; dicionário vazio se o agente não existir"""
+        row = self._agent_index.get(agent)
+        if row is None:
+            return {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = self.sums[row] / self.counts[row] * 100
+        return dict(zip(self.questions, values))
+
+    def to_frame(self):
+        """Percentuais como DataFrame indexado por agente, com colunas nomeadas pelos critérios"""
+        return pd.DataFrame(
+            self.percentages(),
+            index=pd.Index(self.agents, name='CustomerAgent'),
+            columns=[QUESTION_NAMES.get(q, q) for q in self.questions]
+        )
+
+
+def build_question_matrix(df, agent_col='CustomerAgent'):
+    questions = checklist_questions(df)
+
+    if agent_col in df.columns:
+        codes, agents = pd.factorize(df[agent_col], sort=True)
+        agents = np.asarray(agents, dtype=object)
+    else:
+        codes = np.zeros(len(df), dtype=np.intp)
+        agents = np.array(['Todos'], dtype=object) if len(df) else np.array([], dtype=object)
+
+    n_agents = len(agents)
+    # Linhas sem agente vão para um grupo extra: contam no total, mas não na matriz
+    codes = np.where(codes < 0, n_agents, codes)
+
+    sums = np.zeros((n_agents + 1, len(questions)))
+    counts = np.zeros((n_agents + 1, len(questions)))
+    calls = np.bincount(codes, minlength=n_agents + 1)
+
+    if len(codes) and questions:
+        sums, counts = question_counts(df, codes, n_agents + 1, questions)
+
+    return QuestionMatrix(
+        agents, questions, sums[:n_agents], counts[:n_agents], calls[:n_agents],
+        total_sums=sums.sum(axis=0), total_counts=counts.sum(axis=0)
+    )
@@ -0,0 +1,193 @@
+"""Esquema canônico da aba Consulta1.
+
+Resolve uma única vez, na carga, as grafias alternativas dos cabeçalhos,
+converte cada coluna para o tipo esperado com checagens vetorizadas e separa
+as linhas com valores malformados num relatório de quarentena. O restante do
+app recebe sempre as mesmas colunas, com os mesmos tipos, e PERCENTUAL
+(0-100) presente, sem precisar testar NOTAS a cada uso. As respostas do
+checklist chegam compactadas em bits (checklist_bits.py).
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from checklist_bits import QUESTION_COLUMNS, pack_checklist
+
+SCORE_COLUMN = 'PERCENTUAL'
+AVALIACAO_COLUMN = 'Avaliação 100 pts'
+NOTAS_COLUMN = 'NOTAS'
+NOTAS_MAX = 81
+
+DATETIME_COLUMNS = ['AnalysisDateTime', 'CallDate']
+# IdAnalysis é só identificador (nada faz conta com ele): IDs alfanuméricos são válidos
+TEXT_COLUMNS = ['IdAnalysis', 'CustomerAgent', 'Empresas', 'Client', 'ClientRisk', 'ClientOutcome', 'Mp3FileName', 'Justification']
+NUMERIC_COLUMNS = [AVALIACAO_COLUMN, NOTAS_COLUMN, SCORE_COLUMN]
+BINARY_COLUMNS = list(QUESTION_COLUMNS)
+
+# Grafias aceitas além do nome canônico (comparadas sem acento, espaço, "_" e caixa)
+COLUMN_ALIASES = {
+    AVALIACAO_COLUMN: ['Avaliacao 100 pts', 'Avaliação100pts', 'Avaliacao100pts', 'Avaliação (100 pts)'],
+    'CustomerAgent': ['Agente', 'Customer Agent'],
+    'Empresas': ['Empresa'],
+    'AnalysisDateTime': ['Analysis Date Time', 'DataAnalise'],
+    'CallDate': ['Call Date', 'DataLigacao']
+}
+
+REQUIRED_COLUMNS = ['AnalysisDateTime', 'CustomerAgent']
+
+QUARANTINE_REASON_COLUMN = 'Motivo'
+QUARANTINE_ROW_COLUMN = 'Linha'
+
+
+class SchemaError(ValueError):
+    """A planilha não tem as colunas mínimas para o dashboard"""
+
+
+def normalize_name(name):
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ''.join(ch for ch in text.casefold() if ch.isalnum())
+
+
+def _canonical_lookup():
+    lookup = {}
+    for canonical in DATETIME_COLUMNS + TEXT_COLUMNS + NUMERIC_COLUMNS + BINARY_COLUMNS:
+        lookup[normalize_name(canonical)] = canonical
+    for canonical, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            lookup[normalize_name(alias)] = canonical
+    return lookup
+
+
+CANONICAL_LOOKUP = _canonical_lookup()
+
+
+def resolve_columns(columns):
+    """Mapa cabeçalho original -> nome canônico; a primeira grafia encontrada vence"""
+    mapping, taken = {}, set()
+    for column in columns:
+        canonical = CANONICAL_LOOKUP.get(normalize_name(column))
+        if canonical is not None and canonical not in taken and column != canonical:
+            mapping[column] = canonical
+        if canonical is not None:
+            taken.add(canonical)
+    return mapping
+
+
+def _coerce_numeric(series):
+    values = pd.to_numeric(series, errors='coerce')
+    return values, series.notna().to_numpy() & values.isna().to_numpy()
+
+
+def _coerce_text(series):
+    """
+    Texto preservando vazios. Números inteiros lidos como float (a coluna tem
+    vazios) viram "123", não "123.0".
+    """
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=float)
+        filled = values[~np.isnan(values)]
+        if len(filled) and np.array_equal(filled, np.round(filled)):
+            series = series.astype('Int64')
+    return series.astype(str).astype(object).where(series.notna().to_numpy(), np.nan)
+
+
+def _coerce_datetime(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series, np.zeros(len(series), dtype=bool)
+    values = pd.to_datetime(series, errors='coerce')
+    return values, series.notna().to_numpy() & values.isna().to_numpy()
+
+
+def apply_schema(df):
+    """
+    Retorna (frame canônico, quarentena). A quarentena traz as linhas
+    rejeitadas com a linha da planilha e o primeiro problema encontrado.
+    Levanta SchemaError se faltar coluna obrigatória ou de nota.
+    """
+    df = df.rename(columns=resolve_columns(df.columns))
+    # Cabeçalhos repetidos após a resolução: fica a primeira ocorrência
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if not any(col in df.columns for col in (AVALIACAO_COLUMN, NOTAS_COLUMN, SCORE_COLUMN)):
+        missing.append(f"{AVALIACAO_COLUMN} (ou {NOTAS_COLUMN})")
+    if missing:
+        raise SchemaError(f"Colunas obrigatórias ausentes: {', '.join(missing)}.")
+
+    # Ordem dos motivos = prioridade na quarentena (vale o primeiro problema da linha)
+    problems = []
+    columns = {}
+
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            columns[col], bad = _coerce_datetime(df[col])
+            problems.append((f"Data inválida em {col}", bad))
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            columns[col], bad = _coerce_numeric(df[col])
+            problems.append((f"Valor não numérico em {col}", bad))
+
+    for col in BINARY_COLUMNS:
+        if col in df.columns:
+            values, bad = _coerce_numeric(df[col])
+            answers = values.to_numpy(dtype=float)
+            out_of_set = (answers != 0) & (answers != 1) & ~np.isnan(answers)
+            columns[col] = values
+            problems.append((f"{col} fora de 0/1", bad | out_of_set))
+
+    for col in TEXT_COLUMNS:
+        if col in df.columns and not pd.api.types.is_string_dtype(df[col]):
+            columns[col] = _coerce_text(df[col])
+
+    raw = df
+    df = df.assign(**columns)
+
+    # Nota canônica: Avaliação 100 pts quando existir, senão NOTAS convertida
+    if AVALIACAO_COLUMN in df.columns:
+        df[SCORE_COLUMN] = df[AVALIACAO_COLUMN]
+    elif SCORE_COLUMN not in df.columns:
+        df[SCORE_COLUMN] = df[NOTAS_COLUMN] / NOTAS_MAX * 100
+
+    score = df[SCORE_COLUMN].to_numpy(dtype=float)
+    problems.append(("Nota fora de 0-100", (score < 0) | (score > 100)))
+
+    reasons = np.select([bad for _, bad in problems], [label for label, _ in problems], default='')
+    rejected = reasons != ''
+
+    # A quarentena guarda os valores originais, para o usuário achar o erro na planilha
+    return pack_checklist(df[~rejected]), quarantine_rows(raw, rejected, reasons[rejected])
+
+
+def quarantine_rows(df, mask, reasons):
+    """Linhas de df selecionadas por mask, com a linha da planilha e o motivo"""
+    rows = df[mask].copy()
+    # Linha da planilha: cabeçalho na linha 1, dados a partir da 2
+    rows.insert(0, QUARANTINE_REASON_COLUMN, reasons)
+    rows.insert(0, QUARANTINE_ROW_COLUMN, np.asarray(df.index[mask], dtype=np.int64) + 2)
+    return rows
+
+
+def finalize_quarantine(quarantine):
+    """
+    Ordena pela linha da planilha e converte em texto as colunas que misturam
+    valores válidos e malformados, para que a quarentena possa ser gravada e baixada.
+    """
+    mixed = {col: 'string' for col in quarantine.columns if quarantine[col].dtype == object}
+    quarantine = quarantine.astype(mixed) if mixed else quarantine
+    return quarantine.sort_values(QUARANTINE_ROW_COLUMN, kind='stable').reset_index(drop=True)
+
+
+def quarantine_summary(quarantine):
+    """Total de linhas da quarentena por motivo, do mais para o menos frequente"""
+    summary = quarantine[QUARANTINE_REASON_COLUMN].value_counts()
+    return summary.rename_axis(QUARANTINE_REASON_COLUMN).reset_index(name='Linhas')
+
+
+def score_source(df):
+    """Coluna de origem de PERCENTUAL no frame canônico"""
+    if AVALIACAO_COLUMN in df.columns:
+        return AVALIACAO_COLUMN
+    return NOTAS_COLUMN if NOTAS_COLUMN in df.columns else SCORE_COLUMN
@@ -17,7 +17,32 @@ from reportlab.graphics.charts.piecharts import Pie
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.lib.colors import HexColor
 import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import base64
+import uuid
+from perf_monitor import PerfRecorder, RerunProfiler, perf_enabled, profile_enabled, profiled
+from dataset_registry import DatasetRegistry, content_hash
+from arrow_store import open_dataset, save_dataset, side_table_key
+from question_matrix import QUESTION_COLUMNS, QUESTION_NAMES, build_question_matrix
+from checklist_bits import checklist_questions, co_failure_matrix, combined_mask, failure_counts, unpack_checklist
+from kpi_engine import build_kpi_engine, kpi_window_table
+from ingestion import (INPUT_EXTENSIONS, STRATEGY_LABELS, STRATEGY_MEMORY, MissingSheetError, UnsupportedFormatError,
+                       plan_ingestion, prepare_planned)
+from schema import NOTAS_COLUMN, SCORE_COLUMN, SchemaError, quarantine_summary, score_source
+from anomaly_detection import detect_anomalies, filter_alerts
+from agent_ranking import build_agent_ranking, rank_agents
+from trend_engine import MIN_TREND_WEEKS, SCORE_METRIC, build_agent_trends, describe_trend, metric_label
+from data_cube import PERIODS, PIVOT_ROWS, VOLUME_METRIC, CUBE_METRICS, build_data_cube
+from quantile_sketch import build_latency_sketches, build_score_sketches, select_keys
+from job_queue import STATUS_DONE, STATUS_FAILED, JobQueue
+from view_cache import ViewCache
+from dimensions import build_dimensions, display_name
+from bounded_cache import BoundedCache
+from aggregates import compute_company_stats, compute_improvement_points, compute_kpis
+from preview_sample import (PREVIEW_MIN_ROWS, build_preview_sample, preview_company_margins, preview_kpis,
+                            preview_question_margins, preview_risk_margins)
 
 
 def get_satisfaction_cluster(value):
@@ -277,48 +302,434 @@ custom_css = """
 
 st.markdown(custom_css, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data(file):
+# Os DataFrames carregados são compartilhados entre sessões; com Copy-on-Write
+# filtros e colunas auxiliares nunca alteram o dataset original
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+if 'session_id' not in st.session_state:
+    st.session_state['session_id'] = uuid.uuid4().hex[:12]
+
+# Instrumentação opcional (MONITORAI_PERF=1 ou ?perf=1): um registrador por rerun
+perf_recorder = PerfRecorder(
+    enabled=perf_enabled(st.query_params),
+    session_id=st.session_state['session_id']
+)
+
+# Perfil de funções opcional (MONITORAI_PROFILE=1 ou ?profile=1): o rerun inteiro sob cProfile
+rerun_profiler = RerunProfiler(enabled=profile_enabled(st.query_params)).start()
+
+def load_data(file, on_chunk=None):
+    """
+    Retorna (df tratado, quarentena) ou (None, None) se o arquivo não puder ser lido.
+    Aceita planilha, CSV, Parquet ou JSONL. A estratégia de leitura da planilha
+    sai da estimativa de memória feita antes de abri-la; com on_chunk, a
+    planilha é lida em blocos e on_chunk recebe os KPIs parciais e o plano.
+    """
     try:
-        xls = pd.ExcelFile(file)
-        if 'Consulta1' in xls.sheet_names:
-            df = pd.read_excel(file, sheet_name='Consulta1')
-            
-            if 'AnalysisDateTime' in df.columns:
-                df['AnalysisDateTime'] = pd.to_datetime(df['AnalysisDateTime'])
-            if 'CallDate' in df.columns:
-                df['CallDate'] = pd.to_datetime(df['CallDate'])
-            
-            avaliacao_cols = ['Avaliação 100 pts', 'Avaliacao 100 pts', 'Avaliação100pts', 'Avaliacao100pts']
-            for col in avaliacao_cols:
-                if col in df.columns:
-                    df['PERCENTUAL'] = pd.to_numeric(df[col], errors='coerce')
-                    break
-            
-            if 'PERCENTUAL' not in df.columns and 'NOTAS' in df.columns:
-                df['PERCENTUAL'] = (df['NOTAS'] / 81) * 100
-            
-            # Filtrar registros com PERCENTUAL vazio ou menor que 19.99
-            if 'PERCENTUAL' in df.columns:
-                df = df[(df['PERCENTUAL'].notna()) & (df['PERCENTUAL'] >= 19.99)]
-            
-            # Filtrar registros com ClientRisk Indeterminado ou vazio
-            if 'ClientRisk' in df.columns:
-                df = df[(df['ClientRisk'] != 'INDETERMINADO') & (df['ClientRisk'].notna())]
-            
-            # Filtrar registros com Empresas vazio (para consistência)
-            if 'Empresas' in df.columns:
-                df = df[df['Empresas'].notna()]
-            
-            return df
-        else:
-            st.error("A planilha 'Consulta1' não foi encontrada no arquivo.")
-            return None
+        plan = plan_ingestion(file, file.name)
+        st.session_state.setdefault('ingestion_plans', {})[file.file_id] = plan
+        if plan['over_budget']:
+            st.warning(
+                f"⚠️ A leitura deve usar cerca de {plan['estimate']['peak_bytes'][plan['strategy']] / 1024 ** 2:,.0f} MB, "
+                f"acima do orçamento de {plan['budget_bytes'] / 1024 ** 2:,.0f} MB; lendo em blocos gravados em disco."
+            )
+        chunk_callback = (lambda partial: on_chunk(partial, plan)) if on_chunk is not None else None
+        return prepare_planned(file, plan, chunk_callback, file.name)
+    except (MissingSheetError, UnsupportedFormatError, SchemaError) as e:
+        st.error(str(e))
+        return None, None
     except Exception as e:
         st.error(f"Erro ao carregar arquivo: {str(e)}")
+        return None, None
+
+QUARANTINE_TABLE = 'quarentena'
+
+@st.cache_resource
+def get_dataset_registry():
+    """Registro único por processo, compartilhado por todas as sessões"""
+    return DatasetRegistry()
+
+def load_stored_dataset(key, file, on_chunk=None):
+    """
+    Abre o dataset já tratado do armazenamento Arrow compartilhado entre processos.
+    Na primeira vez, trata a planilha, grava o resultado e reabre via memory-map
+    para que este processo também use as páginas compartilhadas.
+    """
+    df = open_dataset(key)
+    if df is not None:
+        return df
+    
+    df, quarantine = load_data(file, on_chunk)
+    if df is None:
         return None
+    
+    # A quarentena fica ao lado do dataset, para sessões e processos que o reabrirem
+    get_shared_cache().put(('dataset', key, QUARANTINE_TABLE), quarantine)
+    save_dataset(side_table_key(key, QUARANTINE_TABLE), quarantine)
+    if save_dataset(key, df):
+        return open_dataset(key)
+    return df
+
+@st.cache_resource
+def get_shared_cache():
+    """
+    Cache do processo para tudo que é derivado dos datasets. O orçamento de
+    memória limita só esses valores; os datasets em uso no registro apenas
+    reduzem o espaço disponível para eles
+    """
+    registry = get_dataset_registry()
+    return BoundedCache(pinned_bytes=lambda: registry.stats()['bytes'])
+
+def cached_for_dataset(name, dataset_key, builder):
+    """Memoiza um agregado do dataset completo no cache do processo, compartilhado por todas as sessões"""
+    return get_shared_cache().get_or_build(('dataset', dataset_key, name), builder)
+
+def get_quarantine(key):
+    return cached_for_dataset(QUARANTINE_TABLE, key, lambda: open_dataset(side_table_key(key, QUARANTINE_TABLE)))
+
+def quarantine_csv(key):
+    """CSV da quarentena, gerado uma vez por dataset para o botão de download"""
+    return cached_for_dataset('quarentena_csv', key, lambda: get_quarantine(key).to_csv(index=False).encode('utf-8-sig'))
+
+def upload_key(file):
+    """Hash do conteúdo do arquivo enviado, calculado uma vez por upload da sessão"""
+    upload_hashes = st.session_state.setdefault('upload_hashes', {})
+    if file.file_id not in upload_hashes:
+        upload_hashes[file.file_id] = content_hash(file.getvalue())
+    return upload_hashes[file.file_id]
+
+def load_shared_dataset(file, on_chunk=None):
+    """Retorna uma visão do dataset do arquivo, carregando-o só na primeira vez no processo"""
+    key = upload_key(file)
+    df = get_dataset_registry().acquire(
+        key,
+        st.session_state['session_id'],
+        lambda: load_stored_dataset(key, file, on_chunk)
+    )
+    if df is not None:
+        schedule_warmup(key, df)
+    return df
+
+@st.cache_resource
+def get_view_cache():
+    """Pré-aquecimento das visões por empresa, compartilhado pelo processo"""
+    return ViewCache()
+
+# Destino do cache da thread em curso (pré-aquecimento ou valores exatos da prévia)
+warmup_context = threading.local()
+
+def filters_cache_target():
+    """
+    Prefixo das chaves dos agregados da seleção atual no cache do processo:
+    a visão (dataset, empresa), compartilhada entre sessões, ou a combinação
+    de filtros da sessão.
+    """
+    view = st.session_state.get('company_view')
+    if view is not None:
+        return ('visao',) + tuple(view)
+    return ('sessao', st.session_state['session_id'], st.session_state.get('filter_state'))
+
+def cached_for_filters(name, builder):
+    """
+    Memoiza um agregado calculado sobre o df filtrado da sessão, no cache do
+    processo com orçamento de memória. Na visão de uma empresa sem outros
+    filtros, o valor é compartilhado entre as sessões e o pré-aquecimento o
+    preenche logo após o upload; os da sessão não vão para o spill em disco.
+    """
+    target = getattr(warmup_context, 'target', None)
+    if target is None:
+        target = filters_cache_target()
+    return get_shared_cache().get_or_build(target + (name,), builder, spill=target[0] == 'visao')
+
+def peek_for_filters(name):
+    """True se o agregado da seleção atual já está calculado"""
+    return get_shared_cache().peek(filters_cache_target() + (name,))
+
+def get_question_matrix(df):
+    return cached_for_filters('question_matrix', lambda: build_question_matrix(df))
+
+def get_agent_ranking(df):
+    return cached_for_filters('agent_ranking', lambda: build_agent_ranking(df))
 
-def generate_employee_pdf(df, employee_name):
+def get_agent_trends(df):
+    return cached_for_filters('agent_trends', lambda: build_agent_trends(df))
+
+def build_agent_comparison(df):
+    """Acerto médio, ligações e % de risco baixo por agente, do melhor para o pior"""
+    # Não filtrar risco aqui - precisamos de todas as ligações para cálculo correto
+    agent_comparison = df.groupby('CustomerAgent').agg({
+        SCORE_COLUMN: 'mean',
+        'IdAnalysis': 'count',
+        'ClientRisk': lambda x: (x == 'BAIXO').sum() / len(x) * 100 if len(x) > 0 else 0
+    }).round(1)
+    agent_comparison.columns = ['Porcentagem Média', 'Total Ligações', '% Risco Baixo']
+    return agent_comparison.sort_values('Porcentagem Média', ascending=False)
+
+def get_agent_comparison(df):
+    return cached_for_filters('agent_comparison', lambda: build_agent_comparison(df))
+
+def get_kpis(df):
+    return cached_for_filters('kpis', lambda: compute_kpis(df))
+
+def get_company_comparison(df):
+    return cached_for_filters('company_comparison', lambda: create_company_comparison(df))
+
+def get_risk_chart(df):
+    return cached_for_filters('risk_chart', lambda: create_risk_baixo_alto_chart(df))
+
+def get_performance_chart(df):
+    return cached_for_filters('performance_chart', lambda: create_performance_chart(df, get_question_matrix(df)))
+
+def get_agent_ranking_chart(df, labels=None):
+    return cached_for_filters('agent_ranking_chart', lambda: create_agent_ranking(df, ranking=get_agent_ranking(df), labels=labels))
+
+def get_bottom_performers_chart(df, labels=None):
+    return cached_for_filters('bottom_performers_chart', lambda: create_bottom_performers(df, ranking=get_agent_ranking(df), labels=labels))
+
+def get_improvement_points(df):
+    return cached_for_filters('improvement_points', lambda: create_improvement_points(df, get_question_matrix(df)))
+
+def get_timeline_chart(df):
+    return cached_for_filters('timeline_chart', lambda: create_timeline_chart(df))
+
+def get_question_heatmap(df):
+    return cached_for_filters('question_heatmap', lambda: create_question_heatmap(get_question_matrix(df)))
+
+def get_co_failure_view(df):
+    """Mapa de falhas combinadas e % de ligações com 2+ critérios não cumpridos"""
+    def build():
+        both_failed, both_answered = co_failure_matrix(df)
+        heatmap = create_co_failure_heatmap(both_failed, both_answered, checklist_questions(df))
+        return heatmap, (failure_counts(df) >= 2).mean() * 100
+    return cached_for_filters('co_failure_view', build)
+
+def get_score_histogram(score_sketch):
+    return cached_for_filters('score_histogram', lambda: create_score_histogram(score_sketch.edges, score_sketch.histogram()))
+
+def get_latency_chart(latency):
+    return cached_for_filters('latency_chart', lambda: create_latency_chart(latency.rollup('day').quantile_frame()))
+
+def warm_company_view(dataset_key, base_df, empresa):
+    """
+    Roda na thread de pré-aquecimento: calcula os agregados e gráficos da
+    visão de uma empresa com os mesmos getters usados pelo dashboard.
+    """
+    warmup_context.target = ('visao', dataset_key, empresa)
+    try:
+        dimensions = get_dimensions(dataset_key, base_df)
+        # Mesmo recorte do filtro de empresa com o período completo, que descarta datas vazias
+        mask = base_df['AnalysisDateTime'].notna().to_numpy()
+        if empresa != 'Todas':
+            mask = mask & dimensions.company_mask(empresa)
+        df = base_df if mask.all() else base_df[mask]
+        if len(df) == 0:
+            return
+        
+        get_kpis(df)
+        if 'Empresas' in df.columns:
+            get_company_comparison(df)
+        if 'CustomerAgent' in df.columns:
+            get_agent_comparison(df)
+        for getter in (get_risk_chart, get_performance_chart, get_improvement_points, get_timeline_chart,
+                       get_question_heatmap, get_co_failure_view, get_agent_trends):
+            getter(df)
+        get_agent_ranking_chart(df, dimensions.agent_labels)
+        get_bottom_performers_chart(df, dimensions.agent_labels)
+        
+        sketch_filters = dict(empresa=None if empresa == 'Todas' else empresa, agent=None, risk=None, date_range=())
+        score_sketch = get_filtered_sketches('nota', dataset_key, base_df, df, **sketch_filters)
+        if score_sketch is not None:
+            get_score_histogram(score_sketch.rollup())
+        latency = get_filtered_sketches('latencia', dataset_key, base_df, df, **sketch_filters)
+        if latency is not None:
+            get_latency_chart(latency)
+    finally:
+        warmup_context.target = None
+
+def schedule_warmup(dataset_key, base_df):
+    """Agenda, uma vez por dataset no processo, o pré-aquecimento de cada empresa e da visão geral"""
+    view_cache = get_view_cache()
+    if view_cache.progress(dataset_key) is not None:
+        return
+    # Empresas com mais análises primeiro; "Todas" por último, já que a sessão do upload a calcula agora
+    companies = get_dimensions(dataset_key, base_df).companies
+    companies = companies.sort_values('Calls', ascending=False, kind='stable')['Empresas'].tolist() if companies is not None else []
+    view_cache.schedule(dataset_key, companies + ['Todas'], lambda empresa: warm_company_view(dataset_key, base_df, empresa))
+
+def get_dimensions(dataset_key, base_df):
+    """Dimensões de agentes e empresas com as chaves de cada linha, montadas uma vez por upload"""
+    return cached_for_dataset('dimensoes', dataset_key, lambda: build_dimensions(base_df))
+
+def get_preview_sample(dataset_key, base_df):
+    """Amostra estratificada do dataset para o modo prévia, sorteada uma vez por upload"""
+    return cached_for_dataset('amostra_previa', dataset_key, lambda: build_preview_sample(base_df))
+
+@st.cache_resource
+def get_preview_executor():
+    """Threads que calculam os valores exatos enquanto a prévia está na tela"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='monitorai-preview')
+
+# Componentes que o modo prévia estima pela amostra até o valor exato ficar pronto
+PREVIEW_GETTERS = {
+    'kpis': get_kpis,
+    'company_comparison': get_company_comparison,
+    'risk_chart': get_risk_chart,
+    'performance_chart': get_performance_chart
+}
+
+def build_preview(sample, in_domain, total_analyses):
+    """KPIs e gráficos principais estimados pela amostra, com intervalos de 95%"""
+    frame = sample.frame[in_domain]
+    if len(frame) == 0:
+        return None
+    # Contagens da amostra expandidas para o total exato do recorte
+    scale = total_analyses / len(frame)
+    
+    kpis = {'total_analyses': total_analyses, 'margins': {}}
+    for key, (value, margin) in preview_kpis(sample, in_domain).items():
+        kpis[key] = 0 if pd.isna(value) else value
+        kpis['margins'][key] = margin
+    kpis.setdefault('low_risk_pct', 0)
+    
+    return {
+        'rows': len(frame),
+        'kpis': kpis,
+        'company_comparison': create_company_comparison(frame, scale, preview_company_margins(sample, in_domain)),
+        'risk_chart': create_risk_baixo_alto_chart(frame, scale, preview_risk_margins(sample, in_domain)),
+        'performance_chart': create_performance_chart(frame, errors=preview_question_margins(sample, in_domain))
+    }
+
+def get_preview(sample, filter_mask, total_analyses):
+    return cached_for_filters('preview', lambda: build_preview(sample, sample.select(filter_mask), total_analyses))
+
+def compute_exact_in_background(df):
+    """
+    Calcula os valores exatos dos componentes da prévia numa thread, gravando
+    no mesmo cache da seleção; os reruns seguintes já os encontram prontos.
+    Uma vez por combinação de filtros.
+    """
+    filter_state = st.session_state.get('filter_state')
+    running = st.session_state.get('preview_job')
+    if running is not None and running[0] == filter_state:
+        return
+    if running is not None:
+        running[1].cancel()
+    
+    target = filters_cache_target()
+    def run():
+        warmup_context.target = target
+        try:
+            for getter in PREVIEW_GETTERS.values():
+                getter(df)
+        finally:
+            warmup_context.target = None
+    st.session_state['preview_job'] = (filter_state, get_preview_executor().submit(run))
+
+def render_preview_status(ready, sample_rows):
+    """Aviso da prévia; recarrega a página quando mais valores exatos ficam prontos"""
+    now_ready = sum(peek_for_filters(name) for name in PREVIEW_GETTERS)
+    if now_ready > ready:
+        st.rerun()
+    st.info(
+        f"⚡ Modo prévia: valores estimados com {sample_rows:,} análises amostradas (± intervalo de 95%). "
+        f"Calculando os valores exatos... {now_ready}/{len(PREVIEW_GETTERS)}"
+    )
+
+def get_kpi_engine(dataset_key, base_df):
+    """Agregados diários do dataset completo, compartilhados por todas as sessões"""
+    return cached_for_dataset('kpi_engine', dataset_key, lambda: build_kpi_engine(base_df))
+
+def get_anomaly_alerts(dataset_key, base_df):
+    """Alertas de dias anômalos do dataset completo, calculados uma vez por upload"""
+    def build():
+        kpi_engine = get_kpi_engine(dataset_key, base_df)
+        return detect_anomalies(kpi_engine.daily if kpi_engine is not None else None)
+    return cached_for_dataset('anomaly_alerts', dataset_key, build)
+
+def get_data_cube(dataset_key, base_df):
+    """Cubo tempo × empresa × agente do dataset, montado sobre os agregados diários do motor de KPIs"""
+    def build():
+        kpi_engine = get_kpi_engine(dataset_key, base_df)
+        return build_data_cube(kpi_engine.daily if kpi_engine is not None else None)
+    return cached_for_dataset('data_cube', dataset_key, build)
+
+# Os agregados do dataset são indexados por empresa, agente, risco e dia, mas não
+# pelo critério combinado: com esse filtro ativo, são montados sobre o df filtrado
+def get_selection_kpi_engine(dataset_key, base_df, df, checklist_filter):
+    if checklist_filter:
+        return cached_for_filters('kpi_engine', lambda: build_kpi_engine(df))
+    return get_kpi_engine(dataset_key, base_df)
+
+def get_selection_alerts(dataset_key, base_df, df, checklist_filter):
+    if checklist_filter:
+        kpi_engine = get_selection_kpi_engine(dataset_key, base_df, df, checklist_filter)
+        return cached_for_filters('anomaly_alerts', lambda: detect_anomalies(kpi_engine.daily if kpi_engine is not None else None))
+    return get_anomaly_alerts(dataset_key, base_df)
+
+def get_selection_data_cube(dataset_key, base_df, df, checklist_filter):
+    if checklist_filter:
+        kpi_engine = get_selection_kpi_engine(dataset_key, base_df, df, checklist_filter)
+        return cached_for_filters('data_cube', lambda: build_data_cube(kpi_engine.daily if kpi_engine is not None else None))
+    return get_data_cube(dataset_key, base_df)
+
+SKETCH_BUILDERS = {
+    'latencia': build_latency_sketches,
+    'nota': build_score_sketches
+}
+
+def get_dataset_sketches(name, dataset_key, base_df):
+    """Sketches por dia × empresa do dataset completo ('latencia' ou 'nota')"""
+    return cached_for_dataset(f'sketches_{name}', dataset_key, lambda: SKETCH_BUILDERS[name](base_df))
+
+def get_filtered_sketches(name, dataset_key, base_df, df, empresa, agent, risk, date_range, checklist_filter=False):
+    """
+    Sketches da seleção. Empresa e período recortam os sketches do dataset;
+    com filtro de agente, risco ou critério combinado, os sketches são
+    montados sobre o df filtrado.
+    """
+    if agent is not None or risk is not None or checklist_filter:
+        return cached_for_filters(f'sketches_{name}', lambda: SKETCH_BUILDERS[name](df))
+    sketches = get_dataset_sketches(name, dataset_key, base_df)
+    if sketches is None:
+        return None
+    return select_keys(
+        sketches,
+        empresa=empresa,
+        start=date_range[0] if len(date_range) == 2 else None,
+        end=date_range[1] if len(date_range) == 2 else None
+    )
+
+def format_minutes(value):
+    if pd.isna(value):
+        return "—"
+    if value < 60:
+        return f"{value:.0f} min"
+    if value < 48 * 60:
+        return f"{value / 60:.1f} h"
+    return f"{value / 1440:.1f} dias"
+
+def format_pp_delta(value):
+    if pd.isna(value):
+        return "—"
+    return f"{value:+.1f} p.p."
+
+def kpi_trend_line(kpi_windows, metric):
+    """Linha extra do card de KPI com as variações semana contra semana e mês contra mês"""
+    if kpi_windows is None:
+        return ""
+    week = format_pp_delta(kpi_windows.loc[metric, 'Δ Semana'])
+    month = format_pp_delta(kpi_windows.loc[metric, 'Δ Mês'])
+    return f"<div class='kpi-delta'>📆 Semana: {week} · Mês: {month}</div>"
+
+def kpi_margin(kpis, key):
+    """Meia-largura do intervalo de 95% ao lado do valor do card, quando o KPI é uma estimativa da prévia"""
+    margin = kpis.get('margins', {}).get(key)
+    if margin is None or pd.isna(margin):
+        return ""
+    return f"<span style='font-size: 0.45em; font-weight: 500;'> ± {margin:.1f}</span>"
+
+def generate_employee_pdf(df, employee_name, question_matrix=None, trends=None, employee_mask=None):
     """
     Gera relatório PDF completo do colaborador com:
     1. Análise qualitativa para feedback do gestor
@@ -326,6 +737,10 @@ def generate_employee_pdf(df, employee_name):
     3. Pontos de melhoria
     4. Pontos positivos
     5. Plano de desenvolvimento individual
+    
+    question_matrix: matriz agentes × critérios já calculada para df (opcional)
+    trends: tendências semanais dos agentes já calculadas para df (opcional)
+    employee_mask: linhas de df do colaborador, pelas chaves da dimensão (opcional)
     """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
@@ -379,11 +794,12 @@ def generate_employee_pdf(df, employee_name):
     elements.append(Paragraph(f"Data: {datetime.now().strftime('%d/%m/%Y')}", normal_style))
     elements.append(Spacer(1, 0.3*inch))
     
-    # Filtrar dados do colaborador
-    employee_df = df[df['CustomerAgent'] == employee_name].copy()
+    # Filtrar dados do colaborador (pelas chaves da dimensão, quando informadas)
+    if employee_mask is None:
+        employee_mask = df['CustomerAgent'] == employee_name
+    employee_df = df[employee_mask].copy()
     
-    score_col = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
-    avg_score = employee_df[score_col].mean() if score_col == 'PERCENTUAL' else (employee_df[score_col].mean() / 81) * 100
+    avg_score = employee_df[SCORE_COLUMN].mean()
     total_calls = len(employee_df)
     
     if 'ClientRisk' in employee_df.columns and len(employee_df) > 0:
@@ -467,28 +883,12 @@ def generate_employee_pdf(df, employee_name):
     # ========== 2. ANÁLISE DO HISTÓRICO COMPLETO ==========
     elements.append(Paragraph("2. Análise do Histórico Completo", subtitle_style))
     
-    question_names = {
-        'Question1': 'Saudação',
-        'Question2': 'Dados Cadastrais',
-        'Question3': 'LGPD',
-        'Question4': 'Técnica do Eco',
-        'Question5': 'Escuta Ativa',
-        'Question6': 'Conhecimento',
-        'Question7': 'Confirmação',
-        'Question8': 'Seleção Loja',
-        'Question9': 'Comunicação',
-        'Question10': 'Conduta',
-        'Question11': 'Encerramento',
-        'Question12': 'Pesquisa'
-    }
-    
     # Calcular performance por critério
-    criteria_performance = {}
-    for i in range(1, 13):
-        q = f'Question{i}'
-        if q in employee_df.columns:
-            perf = employee_df[q].mean() * 100
-            criteria_performance[question_names.get(q, q)] = perf
+    if question_matrix is None:
+        question_matrix = build_question_matrix(employee_df)
+    criteria_performance = {
+        QUESTION_NAMES.get(q, q): perf for q, perf in question_matrix.agent(employee_name).items()
+    }
     
     # Análise textual do histórico
     historico_text = f"""
@@ -513,24 +913,28 @@ def generate_employee_pdf(df, employee_name):
     if weak_areas:
         historico_text += f"• <b>Áreas Críticas:</b> {', '.join(weak_areas[:3])} - Requerem atenção imediata.<br/>"
     
-    # Análise de evolução se houver dados temporais
-    if 'AnalysisDateTime' in employee_df.columns and len(employee_df) >= 5:
-        employee_df_sorted = employee_df.sort_values('AnalysisDateTime')
-        first_half = employee_df_sorted.head(len(employee_df_sorted)//2)
-        second_half = employee_df_sorted.tail(len(employee_df_sorted)//2)
-        
-        score_first = first_half[score_col].mean() if score_col == 'PERCENTUAL' else (first_half[score_col].mean() / 81) * 100
-        score_second = second_half[score_col].mean() if score_col == 'PERCENTUAL' else (second_half[score_col].mean() / 81) * 100
-        
-        trend = score_second - score_first
-        
+    # Análise de evolução: inclinação semanal do acerto (regressão sobre todas as semanas)
+    if trends is None:
+        trends = build_agent_trends(employee_df)
+    agent_trend = trends.agent(employee_name) if trends is not None else {}
+    trend = agent_trend.get(SCORE_METRIC, np.nan)
+    
+    if not pd.isna(trend):
+        trend_weeks = trends.agent_weeks(employee_name)
         historico_text += f"<br/><b>Evolução Temporal:</b> "
-        if trend > 5:
-            historico_text += f"Tendência positiva detectada (+{round(trend, 1)}%). O colaborador está melhorando consistentemente.<br/>"
-        elif trend < -5:
-            historico_text += f"Tendência negativa detectada ({round(trend, 1)}%). Necessário investigar causas da queda de performance.<br/>"
+        if describe_trend(trend) == 'positiva':
+            historico_text += f"Tendência positiva detectada ({trend:+.1f} p.p. por semana em {trend_weeks} semanas). O colaborador está melhorando consistentemente.<br/>"
+        elif describe_trend(trend) == 'negativa':
+            historico_text += f"Tendência negativa detectada ({trend:+.1f} p.p. por semana em {trend_weeks} semanas). Necessário investigar causas da queda de performance.<br/>"
         else:
             historico_text += f"Performance estável. Manter foco em consistência e buscar oportunidades de crescimento.<br/>"
+        
+        declining = sorted(
+            [(metric_label(m), slope) for m, slope in agent_trend.items() if m != SCORE_METRIC and describe_trend(slope) == 'negativa'],
+            key=lambda x: x[1]
+        )
+        if declining:
+            historico_text += f"• <b>Critérios em queda:</b> {', '.join(name for name, _ in declining[:3])}.<br/>"
     
     elements.append(Paragraph(historico_text, normal_style))
     elements.append(Spacer(1, 0.2*inch))
@@ -714,7 +1118,7 @@ def generate_employee_pdf(df, employee_name):
         history_data = [['Data', 'Acerto (%)', 'Risco', 'Satisfação']]
         for _, row in recent_df.iterrows():
             date_str = row['AnalysisDateTime'].strftime('%d/%m/%Y')
-            score = row[score_col] if score_col == 'PERCENTUAL' else (row[score_col]/81)*100
+            score = row[SCORE_COLUMN]
             risk = row.get('ClientRisk', 'N/A')
             client = row.get('Client', 'N/A')
             history_data.append([date_str, f'{round(score)}%', risk, client])
@@ -759,6 +1163,144 @@ def generate_employee_pdf(df, employee_name):
     buffer.seek(0)
     return buffer
 
+def export_excel_bytes(df, progress=None, chunk_rows=20000):
+    """Gera o Excel dos dados filtrados em blocos de linhas, informando o andamento"""
+    output = BytesIO()
+    total = len(df)
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        if total == 0:
+            unpack_checklist(df).to_excel(writer, sheet_name='Dados Filtrados', index=False)
+        for start in range(0, total, chunk_rows):
+            # O checklist volta a ser Question1..12 só no bloco que está sendo escrito
+            chunk = unpack_checklist(df.iloc[start:start + chunk_rows])
+            chunk.to_excel(
+                writer,
+                sheet_name='Dados Filtrados',
+                index=False,
+                header=(start == 0),
+                startrow=0 if start == 0 else start + 1
+            )
+            if progress:
+                written = start + len(chunk)
+                progress(0.9 * written / total, f"{written} de {total} linhas")
+    return output.getvalue()
+
+@st.cache_resource
+def get_job_queue():
+    """Pool de exportações em segundo plano, compartilhado pelo processo"""
+    return JobQueue()
+
+# Perfis das exportações guardados por sessão (as mais recentes)
+JOB_PROFILES_PER_SESSION = 5
+
+@st.cache_resource
+def get_job_profiles():
+    """Perfis das exportações rodadas em segundo plano com o perfil de funções ativo, por sessão"""
+    return {}
+
+def profile_job(fn, label):
+    """Com o perfil ativo, a exportação roda sob cProfile na thread da fila e o perfil fica com a sessão"""
+    if not rerun_profiler.enabled:
+        return fn
+    profiles = get_job_profiles().setdefault(st.session_state['session_id'], deque(maxlen=JOB_PROFILES_PER_SESSION))
+    return profiled(fn, label, profiles.append)
+
+def render_profile_report(profiler, key):
+    """Funções com maior tempo cumulativo e downloads do perfil (.prof e pilhas folded)"""
+    st.caption(f"{profiler.label}: {profiler.total_ms():.0f} ms de CPU em Python")
+    top = pd.DataFrame(profiler.top_functions())
+    if len(top) > 0:
+        top.columns = ['Função', 'Chamadas', 'Próprio (ms)', 'Cumulativo (ms)']
+        st.dataframe(top, use_container_width=True, hide_index=True, height=300)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="💾 .prof",
+            data=profiler.pstats_bytes(),
+            file_name=f"perfil_{key}.prof",
+            mime="application/octet-stream",
+            key=f"profile_prof_{key}",
+            help="pstats: abre no snakeviz ou em python -m pstats",
+            use_container_width=True
+        )
+    with col2:
+        st.download_button(
+            label="💾 Flamegraph",
+            data=profiler.folded_stacks().encode('utf-8'),
+            file_name=f"perfil_{key}.folded",
+            mime="text/plain",
+            key=f"profile_folded_{key}",
+            help="Pilhas no formato folded: flamegraph.pl, speedscope ou inferno",
+            use_container_width=True
+        )
+
+def render_export_jobs():
+    """Lista as exportações da sessão com andamento e botão de download"""
+    job_queue = get_job_queue()
+    jobs = job_queue.jobs_for(st.session_state['session_id'])
+    if not jobs:
+        st.caption("Nenhuma exportação em andamento.")
+        return
+    
+    for job in jobs:
+        if job['status'] == STATUS_DONE:
+            data = job_queue.result(job['id'])
+            if data is not None:
+                st.download_button(
+                    label=f"💾 {job['label']}",
+                    data=data,
+                    file_name=job['filename'],
+                    mime=job['mime'],
+                    key=f"download_{job['id']}",
+                    use_container_width=True
+                )
+        elif job['status'] == STATUS_FAILED:
+            st.error(f"❌ {job['label']}: {job['error']}")
+        else:
+            st.progress(job['progress'], text=f"⏳ {job['label']} - {job['message']}")
+
+def render_ingestion_progress(panel, partial, plan=None):
+    """Progresso da leitura da planilha com os KPIs dos blocos já tratados"""
+    fraction = partial.fraction
+    if fraction is None:
+        progress_text = f"⏳ Lendo planilha: {partial.rows_read:,} linhas"
+    else:
+        eta = partial.eta
+        progress_text = f"⏳ Lendo planilha: {partial.rows_read:,} de {partial.total_rows:,} linhas"
+        if eta is not None and fraction < 1:
+            progress_text += f" · cerca de {eta:.0f}s restantes"
+    if plan is not None and plan['strategy'] != STRATEGY_MEMORY:
+        progress_text += f" · leitura {STRATEGY_LABELS[plan['strategy']]}"
+    
+    risk_total = sum(partial.risk_counts.values())
+    risk_lines = " · ".join(
+        f"{level.title()}: {partial.risk_counts[level] / risk_total * 100:.0f}%"
+        for level in ('BAIXO', 'MEDIO', 'ALTO') if partial.risk_counts.get(level)
+    ) if risk_total else "—"
+    company_lines = "<br>".join(
+        f"{company}: {count:,}" for company, count in partial.company_counts.most_common(3)
+    ) or "—"
+    avg_score = partial.avg_score
+    
+    cards = [
+        ('Análises Válidas (parcial)', f"{partial.records:,}", f"{partial.elapsed:.0f}s de leitura"),
+        ('Porcentagem de Acerto (parcial)', "—" if pd.isna(avg_score) else f"{round(avg_score)}%", "Média dos blocos já lidos"),
+        ('Risco Baixo (parcial)', f"{partial.risk_counts.get('BAIXO', 0) / risk_total * 100:.0f}%" if risk_total else "—", risk_lines),
+        ('Empresas (parcial)', f"{len(partial.company_counts)}", company_lines)
+    ]
+    
+    with panel.container():
+        st.progress(fraction if fraction is not None else 0.0, text=progress_text)
+        for col, (label, value, delta) in zip(st.columns(4), cards):
+            with col:
+                st.markdown(f"""
+                <div class='kpi-card-modern'>
+                    <div class='kpi-label'>{label}</div>
+                    <div class='kpi-value'>{value}</div>
+                    <div class='kpi-delta'>{delta}</div>
+                </div>
+                """, unsafe_allow_html=True)
+
 def create_gauge_chart(value, title, color, reference=70):
     fig = go.Figure(go.Indicator(
         mode="gauge+number+delta",
@@ -793,19 +1335,22 @@ def create_gauge_chart(value, title, color, reference=70):
     
     return fig
 
-def create_performance_chart(df):
-    questions = [f'Question{i}' for i in range(1, 13)]
+def preview_error_bars(margins):
+    """Barras de erro dos intervalos de 95% do modo prévia"""
+    return dict(type='data', array=[0 if pd.isna(m) else m for m in margins], visible=True,
+                color=CARGLASS_GRAY, thickness=1.5, width=4)
+
+def create_performance_chart(df, question_matrix=None, errors=None):
+    """Acerto por critério; errors (p.p. por critério) desenha os intervalos de 95% da prévia"""
     question_labels = [
         'Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 
         'Q7', 'Q8', 'Q9', 'Q10', 'Q11', 'Q12'
     ]
     
-    performance = []
-    for q in questions:
-        if q in df.columns:
-            performance.append(df[q].mean() * 100)
-        else:
-            performance.append(0)
+    if question_matrix is None:
+        question_matrix = build_question_matrix(df)
+    overall = question_matrix.overall_by_question()
+    performance = [overall.get(q, 0) for q in QUESTION_COLUMNS]
     
     colors = [CARGLASS_GREEN if p >= 70 else CARGLASS_ORANGE if p >= 50 else CARGLASS_RED for p in performance]
     
@@ -820,13 +1365,14 @@ def create_performance_chart(df):
             text=[f'{round(p)}%' for p in performance],
             textposition='outside',
             textfont=dict(size=12, color=CARGLASS_DARK_RED, family='Inter', weight='bold'),
-            hovertemplate='<b>%{x}</b><br>Acerto: %{y:.0f}%<extra></extra>'
+            hovertemplate='<b>%{x}</b><br>Acerto: %{y:.0f}%<extra></extra>',
+            error_y=preview_error_bars([errors.get(q, 0) for q in QUESTION_COLUMNS]) if errors is not None else None
         )
     ])
     
     fig.update_layout(
         title={
-            'text': '✅ Performance do Checklist por Critério',
+            'text': '✅ Performance do Checklist por Critério' + (' (prévia)' if errors is not None else ''),
             'font': {'size': 22, 'color': CARGLASS_DARK_RED, 'family': 'Inter'},
             'x': 0.5,
             'xanchor': 'center'
@@ -954,14 +1500,20 @@ def create_satisfaction_donut(df):
     return None
 
 
-def create_risk_baixo_alto_chart(df):
-    """Cria gráfico de barras horizontais mostrando distribuição de Risco (Baixo, Médio e Alto)"""
+def create_risk_baixo_alto_chart(df, scale=1, errors=None):
+    """
+    Cria gráfico de barras horizontais mostrando distribuição de Risco (Baixo, Médio e Alto).
+    Na prévia, df é a amostra: scale expande as contagens para o recorte
+    inteiro e errors traz a meia-largura (p.p.) de cada nível.
+    """
     if 'ClientRisk' in df.columns:
         # Usar todos os riscos (Baixo, Médio e Alto)
         risk_counts = df['ClientRisk'].value_counts()
+        if scale != 1:
+            risk_counts = (risk_counts * scale).round().astype(int)
         
         # Total de registros
-        total_records = len(df)
+        total_records = int(round(len(df) * scale))
         
         if len(risk_counts) == 0:
             return None
@@ -1004,7 +1556,10 @@ def create_risk_baixo_alto_chart(df):
             textposition='outside',
             textfont=dict(size=14, color=CARGLASS_DARK_RED, family='Inter', weight='bold'),
             hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<br>Percentual: %{customdata:.1f}%<extra></extra>',
-            customdata=percentages
+            customdata=percentages,
+            error_x=preview_error_bars([
+                errors.get(risk, 0) / 100 * total_records for risk in risk_order if risk in risk_counts.index
+            ]) if errors is not None else None
         ))
         
         # Calcular total mostrado no gráfico
@@ -1012,7 +1567,7 @@ def create_risk_baixo_alto_chart(df):
         
         fig.update_layout(
             title={
-                'text': f'⚠️ Distribuição de Risco (Total: {total_shown} registros)',
+                'text': f'⚠️ Distribuição de Risco ({"≈ " if errors is not None else ""}Total: {total_shown} registros)',
                 'font': {'size': 20, 'color': CARGLASS_DARK_RED, 'family': 'Inter'},
                 'x': 0.5,
                 'xanchor': 'center'
@@ -1104,35 +1659,24 @@ def create_risk_analysis(df):
         return fig
     return None
 
-def create_agent_ranking(df, top_n=5):
-    score_column = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
+def create_agent_ranking(df, top_n=5, ranking=None, labels=None):
+    if ranking is None:
+        ranking = build_agent_ranking(df)
     
-    if 'CustomerAgent' in df.columns and score_column in df.columns:
-        agent_scores = df.groupby('CustomerAgent').agg({
-            score_column: 'mean',
-            'IdAnalysis': 'count'
-        }).round(1)
-        
-        if score_column == 'NOTAS':
-            agent_scores[score_column] = (agent_scores[score_column] / 81) * 100
-        
-        agent_scores.columns = ['Porcentagem Média', 'Total Ligações']
-        agent_scores = agent_scores.sort_values('Porcentagem Média', ascending=False).head(top_n)
+    if ranking is not None:
+        # Ordena pela nota ajustada ao volume: poucas ligações não bastam para liderar
+        agent_scores = rank_agents(ranking, top_n)
         
-        agent_names = []
-        for name in agent_scores.index:
-            parts = name.split()
-            if len(parts) >= 2:
-                agent_names.append(f"{parts[0]} {parts[-1]}")
-            else:
-                agent_names.append(parts[0])
+        # Nomes de exibição da dimensão de agentes (primeiro + último nome)
+        labels = labels or {}
+        agent_names = [labels.get(name) or display_name(name) for name in agent_scores.index]
         
         colors_agents = [CARGLASS_PURPLE if i == 0 else CARGLASS_LIGHT_PURPLE for i in range(len(agent_names))]
         
         fig = go.Figure()
         
         fig.add_trace(go.Bar(
-            x=agent_scores['Porcentagem Média'],
+            x=agent_scores['Nota Ajustada'],
             y=agent_names,
             orientation='h',
             marker=dict(
@@ -1140,15 +1684,18 @@ def create_agent_ranking(df, top_n=5):
                 line=dict(color='white', width=2)
             ),
             text=[f"{round(score)}%<br>{calls} ligações" 
-                  for score, calls in zip(agent_scores['Porcentagem Média'], agent_scores['Total Ligações'])],
+                  for score, calls in zip(agent_scores['Nota Ajustada'], agent_scores['Total Ligações'])],
+            customdata=agent_scores[['Porcentagem Média', 'Limite Inferior', 'Limite Superior', 'Total Ligações']].to_numpy(),
             textposition='outside',
             textfont=dict(size=11, color=CARGLASS_DARK_RED, family='Inter', weight='bold'),
-            hovertemplate='<b>%{y}</b><br>Acerto: %{round(x)}%<br>Ligações: %{text}<extra></extra>'
+            hovertemplate='<b>%{y}</b><br>Acerto ajustado: %{x:.1f}%<br>Acerto bruto: %{customdata[0]:.1f}%'
+                          '<br>IC 95%: %{customdata[1]:.1f}% - %{customdata[2]:.1f}%'
+                          '<br>Ligações: %{customdata[3]}<extra></extra>'
         ))
         
         fig.update_layout(
             title={
-                'text': '👥 Top 5 Agentes por Porcentagem de Acerto',
+                'text': '👥 Top 5 Agentes por Porcentagem de Acerto<br><sub style="font-size:12px;">(ajustada pelo volume de ligações)</sub>',
                 'font': {'size': 20, 'color': CARGLASS_DARK_RED, 'family': 'Inter'},
                 'x': 0.5,
                 'xanchor': 'center'
@@ -1173,38 +1720,23 @@ def create_agent_ranking(df, top_n=5):
         return fig
     return None
 
-def create_bottom_performers(df, bottom_n=5):
-    score_column = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
+def create_bottom_performers(df, bottom_n=5, ranking=None, labels=None):
+    if ranking is None:
+        ranking = build_agent_ranking(df)
     
-    if 'CustomerAgent' in df.columns and score_column in df.columns:
-        agent_scores = df.groupby('CustomerAgent').agg({
-            score_column: 'mean',
-            'IdAnalysis': 'count'
-        }).round(1)
-        
-        if score_column == 'NOTAS':
-            agent_scores[score_column] = (agent_scores[score_column] / 81) * 100
-        
-        agent_scores.columns = ['Porcentagem Média', 'Total Ligações']
+    if ranking is not None:
+        agent_scores = rank_agents(ranking, bottom_n, ascending=True)
         
-        agent_scores = agent_scores[agent_scores['Total Ligações'] >= 10]
-        
-        agent_scores = agent_scores.sort_values('Porcentagem Média', ascending=True).head(bottom_n)
-        
-        agent_names = []
-        for name in agent_scores.index:
-            parts = name.split()
-            if len(parts) >= 2:
-                agent_names.append(f"{parts[0]} {parts[-1]}")
-            else:
-                agent_names.append(parts[0])
+        # Nomes de exibição da dimensão de agentes (primeiro + último nome)
+        labels = labels or {}
+        agent_names = [labels.get(name) or display_name(name) for name in agent_scores.index]
         
         colors_agents = [CARGLASS_RED if i == 0 else CARGLASS_ORANGE for i in range(len(agent_names))]
         
         fig = go.Figure()
         
         fig.add_trace(go.Bar(
-            x=agent_scores['Porcentagem Média'],
+            x=agent_scores['Nota Ajustada'],
             y=agent_names,
             orientation='h',
             marker=dict(
@@ -1212,10 +1744,13 @@ def create_bottom_performers(df, bottom_n=5):
                 line=dict(color='white', width=2)
             ),
             text=[f"{round(score)}%<br>{calls} ligações" 
-                  for score, calls in zip(agent_scores['Porcentagem Média'], agent_scores['Total Ligações'])],
+                  for score, calls in zip(agent_scores['Nota Ajustada'], agent_scores['Total Ligações'])],
+            customdata=agent_scores[['Porcentagem Média', 'Limite Inferior', 'Limite Superior', 'Total Ligações']].to_numpy(),
             textposition='outside',
             textfont=dict(size=11, color=CARGLASS_DARK_RED, family='Inter'),
-            hovertemplate='<b>%{y}</b><br>Acerto: %{round(x)}%<br>Ligações: %{text}<extra></extra>'
+            hovertemplate='<b>%{y}</b><br>Acerto ajustado: %{x:.1f}%<br>Acerto bruto: %{customdata[0]:.1f}%'
+                          '<br>IC 95%: %{customdata[1]:.1f}% - %{customdata[2]:.1f}%'
+                          '<br>Ligações: %{customdata[3]}<extra></extra>'
         ))
         
         fig.update_layout(
@@ -1256,19 +1791,14 @@ def create_bottom_performers(df, bottom_n=5):
     return None
 
 def create_timeline_chart(df):
-    score_column = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
-    
-    if 'AnalysisDateTime' in df.columns and score_column in df.columns:
+    if 'AnalysisDateTime' in df.columns:
         try:
             if len(df) == 0:
                 return None
             
-            df_timeline = df.set_index('AnalysisDateTime').resample('D')[score_column].agg(['mean', 'count']).reset_index()
+            df_timeline = df.set_index('AnalysisDateTime').resample('D')[SCORE_COLUMN].agg(['mean', 'count']).reset_index()
             df_timeline.columns = ['Data', 'Porcentagem Média', 'Quantidade']
             
-            if score_column == 'NOTAS':
-                df_timeline['Porcentagem Média'] = (df_timeline['Porcentagem Média'] / 81) * 100
-            
             df_timeline = df_timeline.dropna()
             
             if len(df_timeline) == 0:
@@ -1352,50 +1882,224 @@ def create_timeline_chart(df):
             return None
     return None
 
-def create_improvement_points(df):
-    question_names = {
-        'Question1': 'Saudação',
-        'Question2': 'Dados Cadastrais',
-        'Question3': 'LGPD',
-        'Question4': 'Técnica do Eco',
-        'Question5': 'Escuta Ativa',
-        'Question6': 'Conhecimento',
-        'Question7': 'Confirmação',
-        'Question8': 'Seleção Loja',
-        'Question9': 'Comunicação',
-        'Question10': 'Conduta',
-        'Question11': 'Encerramento',
-        'Question12': 'Pesquisa'
-    }
+def create_improvement_points(df, question_matrix=None):
+    if question_matrix is None:
+        question_matrix = build_question_matrix(df)
     
-    weak_questions = []
-    for i in range(1, 13):
-        q = f'Question{i}'
-        if q in df.columns:
-            performance = df[q].mean() * 100
-            if performance < 70:
-                weak_questions.append((q, performance))
+    return compute_improvement_points(question_matrix)
+
+def create_question_heatmap(question_matrix):
+    """Mapa de calor agentes × critérios a partir da matriz pré-calculada"""
+    if len(question_matrix.agents) == 0 or not question_matrix.questions:
+        return None
     
-    weak_questions.sort(key=lambda x: x[1])
+    heatmap_df = question_matrix.to_frame()
+    
+    fig = go.Figure(go.Heatmap(
+        z=heatmap_df.to_numpy(),
+        x=heatmap_df.columns.tolist(),
+        y=heatmap_df.index.tolist(),
+        zmin=0,
+        zmax=100,
+        colorscale=[[0, CARGLASS_RED], [0.5, CARGLASS_YELLOW], [0.7, CARGLASS_GREEN], [1, CARGLASS_GREEN]],
+        colorbar=dict(
+            title=dict(text="Acerto (%)", font=dict(size=11, family='Inter')),
+            tickfont=dict(size=10, family='Inter')
+        ),
+        hovertemplate='<b>%{y}</b><br>%{x}: %{z:.0f}%<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title='🗺️ Mapa de Calor: Agentes × Critérios',
+        xaxis=dict(
+            side='top',
+            tickfont=dict(size=11, color=CARGLASS_GRAY, family='Inter')
+        ),
+        yaxis=dict(
+            autorange='reversed',
+            tickfont=dict(size=10, color=CARGLASS_DARK_RED, family='Inter')
+        ),
+        height=max(400, 22 * len(heatmap_df) + 150),
+        paper_bgcolor='white',
+        font={'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+        margin=dict(l=180, r=60, t=120, b=40)
+    )
     
-    return [(question_names.get(q, q), perf) for q, perf in weak_questions[:3]]
+    return fig
 
-def create_company_comparison(df):
-    if 'Empresas' in df.columns and 'PERCENTUAL' in df.columns:
-        # DataFrame já vem filtrado do load_data
-        company_stats = df.groupby('Empresas').agg({
-            'PERCENTUAL': 'mean',
-            'ClientRisk': lambda x: (x == 'BAIXO').sum() / len(x) * 100 if len(x) > 0 else 0
-        }).round(1)
-        
-        # Adicionar contagem usando size() que conta TODOS os registros (não ignora NaN)
-        company_stats['Total Análises'] = df.groupby('Empresas').size()
-        
-        company_stats.columns = ['Porcentagem Média', '% Risco Baixo', 'Total Análises']
-        # Reordenar colunas
-        company_stats = company_stats[['Porcentagem Média', 'Total Análises', '% Risco Baixo']]
-        company_stats = company_stats.sort_values('Porcentagem Média', ascending=False)
-        
+def create_co_failure_heatmap(both_failed, both_answered, questions):
+    """Mapa de calor critério × critério: % das ligações avaliadas nos dois que falharam nos dois"""
+    if not questions or both_answered.max() == 0:
+        return None
+    
+    positions = [QUESTION_COLUMNS.index(q) for q in questions]
+    failed = both_failed[np.ix_(positions, positions)]
+    answered = both_answered[np.ix_(positions, positions)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rates = np.where(answered > 0, failed / answered * 100, np.nan)
+    labels = [QUESTION_NAMES.get(q, q) for q in questions]
+    
+    fig = go.Figure(go.Heatmap(
+        z=rates,
+        x=labels,
+        y=labels,
+        zmin=0,
+        colorscale=[[0, '#FFF5F5'], [1, CARGLASS_RED]],
+        customdata=failed,
+        colorbar=dict(
+            title=dict(text="Falha conjunta (%)", font=dict(size=11, family='Inter')),
+            tickfont=dict(size=10, family='Inter')
+        ),
+        hovertemplate='<b>%{y} + %{x}</b><br>Falharam nos dois: %{z:.1f}% (%{customdata} ligações)<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title='🔗 Falhas Combinadas entre Critérios',
+        xaxis=dict(
+            side='top',
+            tickfont=dict(size=11, color=CARGLASS_GRAY, family='Inter')
+        ),
+        yaxis=dict(
+            autorange='reversed',
+            tickfont=dict(size=11, color=CARGLASS_DARK_RED, family='Inter')
+        ),
+        height=560,
+        paper_bgcolor='white',
+        font={'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+        margin=dict(l=160, r=60, t=140, b=40)
+    )
+    
+    return fig
+
+def create_period_heatmap(pivot, row_label, period_label, metric):
+    """Mapa de calor linhas × períodos a partir de um pivô do cubo pré-agregado"""
+    if pivot.empty:
+        return None
+    
+    is_volume = metric == VOLUME_METRIC
+    fig = go.Figure(go.Heatmap(
+        z=pivot.to_numpy(dtype=float),
+        x=pivot.columns.tolist(),
+        y=pivot.index.tolist(),
+        zmin=None if is_volume else 0,
+        zmax=None if is_volume else 100,
+        colorscale=[[0, '#F3E8FF'], [1, CARGLASS_PURPLE]] if is_volume else
+                   [[0, CARGLASS_RED], [0.5, CARGLASS_YELLOW], [0.7, CARGLASS_GREEN], [1, CARGLASS_GREEN]],
+        colorbar=dict(
+            title=dict(text="Análises" if is_volume else f"{metric} (%)", font=dict(size=11, family='Inter')),
+            tickfont=dict(size=10, family='Inter')
+        ),
+        hovertemplate='<b>%{y}</b><br>%{x}: ' + ('%{z:.0f}' if is_volume else '%{z:.1f}%') + '<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=f'🗓️ {metric}: {row_label} × {period_label}',
+        xaxis=dict(
+            side='top',
+            tickfont=dict(size=10, color=CARGLASS_GRAY, family='Inter')
+        ),
+        yaxis=dict(
+            autorange='reversed',
+            tickfont=dict(size=10, color=CARGLASS_DARK_RED, family='Inter')
+        ),
+        height=max(350, 22 * len(pivot) + 150),
+        paper_bgcolor='white',
+        font={'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+        margin=dict(l=180, r=60, t=120, b=40)
+    )
+    
+    return fig
+
+def create_score_histogram(edges, counts):
+    """Distribuição das notas em faixas, a partir do histograma dos sketches"""
+    labels = [f"{int(low)}-{int(high)}%" for low, high in zip(edges[:-1], edges[1:])]
+    bar_colors = [CARGLASS_GREEN if low >= 70 else CARGLASS_YELLOW if low >= 50 else CARGLASS_RED for low in edges[:-1]]
+    
+    fig = go.Figure(go.Bar(
+        x=labels,
+        y=counts,
+        marker=dict(color=bar_colors, line=dict(color='white', width=1)),
+        hovertemplate='<b>Nota %{x}</b><br>Análises: %{y}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title={
+            'text': '📊 Distribuição das Notas',
+            'font': {'size': 20, 'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+            'x': 0.5,
+            'xanchor': 'center'
+        },
+        xaxis=dict(
+            title=dict(text='Faixa de Acerto', font=dict(size=13, color=CARGLASS_GRAY, family='Inter')),
+            tickfont=dict(size=10, color=CARGLASS_GRAY, family='Inter')
+        ),
+        yaxis=dict(
+            title=dict(text='Análises', font=dict(size=13, color=CARGLASS_GRAY, family='Inter')),
+            tickfont=dict(size=11, color=CARGLASS_GRAY, family='Inter')
+        ),
+        height=380,
+        plot_bgcolor='#FAFBFC',
+        paper_bgcolor='white',
+        font={'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+        bargap=0.1,
+        margin=dict(l=60, r=40, t=70, b=60)
+    )
+    
+    return fig
+
+def create_latency_chart(daily_quantiles):
+    """p50/p90/p99 diários da latência ligação → análise, em horas"""
+    if daily_quantiles is None or len(daily_quantiles) == 0:
+        return None
+    
+    fig = go.Figure()
+    for column, label, color in (('p50', 'p50', CARGLASS_GREEN), ('p90', 'p90', CARGLASS_YELLOW), ('p99', 'p99', CARGLASS_RED)):
+        fig.add_trace(go.Scatter(
+            x=daily_quantiles['day'],
+            y=daily_quantiles[column] / 60,
+            mode='lines+markers',
+            name=label,
+            line=dict(color=color, width=2),
+            marker=dict(size=5, color=color),
+            customdata=daily_quantiles['n'],
+            hovertemplate=f'<b>%{{x|%d/%m/%Y}}</b><br>{label}: %{{y:.1f}} h<br>Análises: %{{customdata}}<extra></extra>'
+        ))
+    
+    fig.update_layout(
+        title={
+            'text': '⏱️ Tempo entre Ligação e Análise (p50 / p90 / p99)',
+            'font': {'size': 20, 'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+            'x': 0.5,
+            'xanchor': 'center'
+        },
+        xaxis=dict(
+            title=dict(text='Data da Análise', font=dict(size=13, color=CARGLASS_GRAY, family='Inter')),
+            tickfont=dict(size=11, color=CARGLASS_GRAY, family='Inter')
+        ),
+        yaxis=dict(
+            title=dict(text='Horas', font=dict(size=13, color=CARGLASS_GRAY, family='Inter')),
+            tickfont=dict(size=11, color=CARGLASS_GRAY, family='Inter'),
+            rangemode='tozero'
+        ),
+        height=420,
+        plot_bgcolor='#FAFBFC',
+        paper_bgcolor='white',
+        hovermode='x unified',
+        font={'color': CARGLASS_DARK_RED, 'family': 'Inter'},
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, font=dict(size=11, family='Inter')),
+        margin=dict(l=60, r=40, t=80, b=60)
+    )
+    
+    return fig
+
+def create_company_comparison(df, scale=1, errors=None):
+    # DataFrame já vem filtrado do load_data; na prévia é a amostra, com as
+    # contagens expandidas por scale e a meia-largura do acerto em errors
+    company_stats = compute_company_stats(df)
+    
+    if company_stats is not None:
+        if scale != 1:
+            company_stats['Total Análises'] = (company_stats['Total Análises'] * scale).round().astype(int)
         # Total de análises no gráfico
         total_in_chart = int(company_stats['Total Análises'].sum())
         
@@ -1410,11 +2114,12 @@ def create_company_comparison(df):
                   for _, row in company_stats.iterrows()],
             textposition='outside',
             hovertemplate='<b>%{x}</b><br>Acerto: %{y:.0f}%<br>Análises: %{customdata}<extra></extra>',
-            customdata=company_stats['Total Análises']
+            customdata=company_stats['Total Análises'],
+            error_y=preview_error_bars([errors.get(company, 0) for company in company_stats.index]) if errors is not None else None
         ))
         
         fig.update_layout(
-            title=f'📊 Comparativo de Performance por Empresa<br><sub style="font-size:12px;">({total_in_chart} análises)</sub>',
+            title=f'📊 Comparativo de Performance por Empresa<br><sub style="font-size:12px;">({"≈ " if errors is not None else ""}{total_in_chart} análises)</sub>',
             xaxis_title='Empresa',
             yaxis_title='Porcentagem de Acerto',
             yaxis_range=[0, max(company_stats['Porcentagem Média']) * 1.1],
@@ -1430,6 +2135,16 @@ def create_company_comparison(df):
         return fig, company_stats
     return None, None
 
+st.markdown("""
+<div class='header-gradient'>
+    <h1>🔴 Monitor AI</h1>
+    <p>Dashboard de Indicadores de Gestão - Análise de Atendimento</p>
+</div>
+""", unsafe_allow_html=True)
+
+# KPIs parciais enquanto a planilha é lida; esvaziado ao fim do carregamento
+ingestion_panel = st.empty()
+
 with st.sidebar:
     st.markdown("""
     <div style='text-align: center; padding: 25px; background: white; border-radius: 15px; margin-bottom: 25px; box-shadow: 0 4px 12px rgba(0,0,0,0.1);'>
@@ -1440,34 +2155,70 @@ with st.sidebar:
     
     st.markdown("### 📁 Upload de Dados")
     uploaded_file = st.file_uploader(
-        "Selecione o arquivo Excel",
-        type=['xlsx', 'xls'],
-        help="Faça upload do arquivo de análises de monitoria"
+        "Selecione o arquivo de análises",
+        type=INPUT_EXTENSIONS,
+        help="Planilha Excel (aba Consulta1) ou exportação do sistema de origem em CSV, Parquet ou JSONL"
     )
     
     if uploaded_file:
-        df = load_data(uploaded_file)
+        with perf_recorder.stage('load_data'):
+            base_df = load_shared_dataset(uploaded_file, lambda partial, plan: render_ingestion_progress(ingestion_panel, partial, plan))
+        ingestion_panel.empty()
         
-        if df is not None:
-            st.success(f"✅ {len(df)} registros carregados")
+        df = base_df
+        if base_df is not None:
+            st.success(f"✅ {len(base_df)} registros carregados")
+            
+            plan = st.session_state.get('ingestion_plans', {}).get(uploaded_file.file_id)
+            if plan is not None and plan['estimate'] is not None:
+                st.caption(
+                    f"📐 Planilha lida {STRATEGY_LABELS[plan['strategy']]}: pico estimado de "
+                    f"{plan['estimate']['peak_bytes'][plan['strategy']] / 1024 ** 2:,.0f} MB "
+                    f"(orçamento de {plan['budget_bytes'] / 1024 ** 2:,.0f} MB)"
+                )
+            
+            quarantine = get_quarantine(upload_key(uploaded_file))
+            if quarantine is not None and len(quarantine) > 0:
+                with st.expander(f"🧹 {len(quarantine)} registro(s) descartado(s)", expanded=False):
+                    st.dataframe(quarantine_summary(quarantine), use_container_width=True, hide_index=True)
+                    st.download_button(
+                        label="💾 Baixar Registros Descartados (CSV)",
+                        data=quarantine_csv(upload_key(uploaded_file)),
+                        file_name=f"registros_descartados_{datetime.now().strftime('%Y%m%d')}.csv",
+                        mime="text/csv",
+                        use_container_width=True
+                    )
             
             st.markdown("---")
             st.markdown("### 🔍 Filtros")
             
-            if 'Empresas' in df.columns:
-                empresas = ['Todas'] + sorted(df['Empresas'].dropna().unique().tolist())
+            # Os filtros acumulam uma máscara sobre o dataset compartilhado;
+            # o recorte é materializado uma única vez no final
+            filter_mask = np.ones(len(base_df), dtype=bool)
+            filter_state = [upload_key(uploaded_file)]
+            selected_empresa, selected_agent, selected_risk, date_range = 'Todas', 'Todos', 'Todos', ()
+            full_period = True
+            
+            # Opções e recortes de empresa e agente saem das dimensões, por chaves inteiras
+            dimensions = get_dimensions(upload_key(uploaded_file), base_df)
+            
+            if 'Empresas' in base_df.columns:
+                empresas = ['Todas'] + dimensions.company_options()
                 selected_empresa = st.selectbox(
                     "🏢 Empresa",
                     empresas,
                     help="Filtrar por empresa específica"
                 )
                 
-                if selected_empresa != 'Todas':
-                    df = df[df['Empresas'] == selected_empresa]
+                with perf_recorder.stage('filtro_empresa'):
+                    filter_state.append(selected_empresa)
+                    if selected_empresa != 'Todas':
+                        filter_mask &= dimensions.company_mask(selected_empresa)
             
-            if 'AnalysisDateTime' in df.columns:
-                min_date = df['AnalysisDateTime'].min().date()
-                max_date = df['AnalysisDateTime'].max().date()
+            if 'AnalysisDateTime' in base_df.columns:
+                analysis_dates = base_df['AnalysisDateTime'][filter_mask]
+                min_date = analysis_dates.min().date()
+                max_date = analysis_dates.max().date()
                 
                 date_range = st.date_input(
                     "📅 Período de Análise",
@@ -1476,33 +2227,108 @@ with st.sidebar:
                     max_value=max_date
                 )
                 
-                if len(date_range) == 2:
-                    df = df[(df['AnalysisDateTime'].dt.date >= date_range[0]) & 
-                           (df['AnalysisDateTime'].dt.date <= date_range[1])]
+                full_period = tuple(date_range) == (min_date, max_date)
+                
+                with perf_recorder.stage('filtro_periodo'):
+                    filter_state.append(tuple(date_range))
+                    if len(date_range) == 2:
+                        period_tz = base_df['AnalysisDateTime'].dt.tz
+                        period_start = pd.Timestamp(date_range[0]).tz_localize(period_tz)
+                        period_end = pd.Timestamp(date_range[1]).tz_localize(period_tz) + timedelta(days=1)
+                        filter_mask &= ((base_df['AnalysisDateTime'] >= period_start) & 
+                                        (base_df['AnalysisDateTime'] < period_end)).to_numpy()
             
-            if 'CustomerAgent' in df.columns:
-                agents = ['Todos'] + sorted(df['CustomerAgent'].dropna().unique().tolist())
+            if 'CustomerAgent' in base_df.columns:
+                agents = ['Todos'] + dimensions.agent_options(filter_mask)
                 selected_agent = st.selectbox(
                     "👤 Agente",
                     agents
                 )
                 
-                if selected_agent != 'Todos':
-                    df = df[df['CustomerAgent'] == selected_agent]
+                with perf_recorder.stage('filtro_agente'):
+                    filter_state.append(selected_agent)
+                    if selected_agent != 'Todos':
+                        filter_mask &= dimensions.agent_mask(selected_agent)
             
-            if 'ClientRisk' in df.columns:
-                risks = ['Todos'] + sorted(df['ClientRisk'].dropna().unique().tolist())
+            if 'ClientRisk' in base_df.columns:
+                risks = ['Todos'] + sorted(base_df['ClientRisk'][filter_mask].dropna().unique().tolist())
                 selected_risk = st.selectbox(
                     "⚠️ Nível de Risco",
                     risks
                 )
                 
-                if selected_risk != 'Todos':
-                    df = df[df['ClientRisk'] == selected_risk]
+                with perf_recorder.stage('filtro_risco'):
+                    filter_state.append(selected_risk)
+                    if selected_risk != 'Todos':
+                        filter_mask &= (base_df['ClientRisk'] == selected_risk).to_numpy()
+            
+            checklist_failed, checklist_passed = [], []
+            available_questions = checklist_questions(base_df)
+            if available_questions:
+                with st.expander("🧩 Critério Combinado", expanded=False):
+                    checklist_failed = st.multiselect(
+                        "Falhou em",
+                        available_questions,
+                        format_func=lambda q: QUESTION_NAMES.get(q, q),
+                        help="Ligações que não cumpriram todos os critérios selecionados"
+                    )
+                    checklist_passed = st.multiselect(
+                        "Acertou em",
+                        [q for q in available_questions if q not in checklist_failed],
+                        format_func=lambda q: QUESTION_NAMES.get(q, q),
+                        help="Ligações que cumpriram todos os critérios selecionados"
+                    )
+                
+                with perf_recorder.stage('filtro_criterios'):
+                    filter_state.append((tuple(checklist_failed), tuple(checklist_passed)))
+                    if checklist_failed or checklist_passed:
+                        filter_mask &= combined_mask(base_df, failed=checklist_failed, passed=checklist_passed)
+            checklist_filter = bool(checklist_failed or checklist_passed)
+            
+            preview_mode = False
+            if len(base_df) >= PREVIEW_MIN_ROWS:
+                preview_mode = st.toggle(
+                    "⚡ Modo prévia",
+                    help="Mostra primeiro os KPIs e gráficos principais estimados por uma amostra estratificada "
+                         "(com intervalo de 95%) enquanto os valores exatos são calculados"
+                )
+            
+            # Só empresa (ou nada) selecionada: a visão pode vir do cache pré-aquecido
+            only_company = full_period and selected_agent == 'Todos' and selected_risk == 'Todos' and not checklist_filter
+            st.session_state['company_view'] = (upload_key(uploaded_file), selected_empresa) if only_company else None
+            
+            with perf_recorder.stage('aplicar_filtros'):
+                df = base_df if filter_mask.all() else base_df[filter_mask]
+            st.session_state['filter_state'] = tuple(filter_state)
+            
+            warmup_progress = get_view_cache().progress(upload_key(uploaded_file))
+            if warmup_progress is not None and warmup_progress[0] < warmup_progress[1]:
+                st.caption(f"🔥 Pré-calculando visões por empresa: {warmup_progress[0]}/{warmup_progress[1]}")
+            
+            registry_stats = get_dataset_registry().stats()
+            st.caption(
+                f"🗂️ {registry_stats['datasets']} dataset(s) em memória compartilhada "
+                f"por {registry_stats['sessions']} sessão(ões) "
+                f"({registry_stats['bytes'] / 1024 ** 2:.1f} MB)"
+            )
+            
+            cache_stats = get_shared_cache().stats()
+            hit_rate = f"{cache_stats['hit_rate'] * 100:.0f}%" if cache_stats['hit_rate'] is not None else "—"
+            spill_text = (
+                f" · {cache_stats['spilled_entries']} em disco ({cache_stats['spilled_bytes'] / 1024 ** 2:.1f} MB, "
+                f"{cache_stats['spill_hits']} relidos)"
+            ) if get_shared_cache().spill_dir else ""
+            st.caption(
+                f"🧠 Cache: {cache_stats['bytes'] / 1024 ** 2:.0f} MB de agregados + "
+                f"{cache_stats['pinned_bytes'] / 1024 ** 2:.0f} MB de datasets, orçamento de "
+                f"{cache_stats['budget_bytes'] / 1024 ** 2:.0f} MB para os agregados · {cache_stats['entries']} valores · "
+                f"{hit_rate} de acertos ({cache_stats['hits']} acertos, {cache_stats['misses']} falhas) · "
+                f"{cache_stats['evictions']} despejos{spill_text}"
+            )
             
             st.markdown("---")
             
-            if 'PERCENTUAL' in df.columns:
+            if score_source(df) != NOTAS_COLUMN:
                 st.info("📊 Usando porcentagem de acerto (0-100%)")
             else:
                 st.warning("⚠️ Coluna 'Avaliação 100 pts' não encontrada. Convertendo NOTAS para porcentagem.")
@@ -1511,7 +2337,7 @@ with st.sidebar:
             st.markdown("### 📄 Relatório Individual")
             
             if 'CustomerAgent' in df.columns:
-                agents_for_pdf = sorted(df['CustomerAgent'].dropna().unique().tolist())
+                agents_for_pdf = dimensions.agent_options(filter_mask)
                 selected_agent_pdf = st.selectbox(
                     "Selecione o Colaborador",
                     agents_for_pdf,
@@ -1519,72 +2345,92 @@ with st.sidebar:
                 )
                 
                 if st.button("📄 Gerar Relatório PDF", use_container_width=True):
-                    pdf_buffer = generate_employee_pdf(df, selected_agent_pdf)
-                    st.download_button(
-                        label="💾 Download PDF",
-                        data=pdf_buffer,
-                        file_name=f"relatorio_{selected_agent_pdf.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
+                    # O PDF é gerado em segundo plano; o download aparece em "Exportações"
+                    with perf_recorder.stage('generate_employee_pdf'):
+                        pdf_df, pdf_matrix, pdf_trends = df, get_question_matrix(df), get_agent_trends(df)
+                        pdf_mask = dimensions.agent_mask(selected_agent_pdf)[filter_mask]
+                        get_job_queue().submit(
+                            st.session_state['session_id'],
+                            f"PDF {selected_agent_pdf}",
+                            f"relatorio_{selected_agent_pdf.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
+                            "application/pdf",
+                            profile_job(
+                                lambda progress, agent=selected_agent_pdf: generate_employee_pdf(pdf_df, agent, pdf_matrix, pdf_trends, pdf_mask).getvalue(),
+                                f"PDF {selected_agent_pdf}"
+                            )
+                        )
             
             st.markdown("---")
             st.markdown("### 💾 Exportar Dados")
             
             if st.button("📊 Gerar Relatório Excel", use_container_width=True):
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, sheet_name='Dados Filtrados', index=False)
-                
-                output.seek(0)
-                st.download_button(
-                    label="💾 Download Excel",
-                    data=output,
-                    file_name=f"monitoria_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+                with perf_recorder.stage('export_excel'):
+                    excel_df = df
+                    get_job_queue().submit(
+                        st.session_state['session_id'],
+                        f"Excel ({len(excel_df)} registros)",
+                        f"monitoria_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        profile_job(lambda progress: export_excel_bytes(excel_df, progress), "Excel")
+                    )
+            
+            st.markdown("---")
+            st.markdown("### 📥 Exportações")
+            
+            # Enquanto houver exportação em andamento, o painel se atualiza sozinho
+            export_pending = any(
+                job['status'] not in (STATUS_DONE, STATUS_FAILED)
+                for job in get_job_queue().jobs_for(st.session_state['session_id'])
+            )
+            st.fragment(render_export_jobs, run_every=2 if export_pending else None)()
     else:
         df = None
+        get_dataset_registry().release(st.session_state['session_id'])
         st.info("👆 Carregue um arquivo para começar")
 
-st.markdown("""
-<div class='header-gradient'>
-    <h1>🔴 Monitor AI</h1>
-    <p>Dashboard de Indicadores de Gestão - Análise de Atendimento</p>
-</div>
-""", unsafe_allow_html=True)
-
 if df is not None and len(df) > 0:
     
     col1, col2, col3, col4 = st.columns(4)
     
+    # Modo prévia: o que ainda não tem valor exato sai da amostra, e os exatos
+    # são calculados em segundo plano e entram na tela conforme ficam prontos
+    preview, preview_pending = None, []
+    if preview_mode:
+        preview_pending = [name for name in PREVIEW_GETTERS if not peek_for_filters(name)]
+        preview_sample = get_preview_sample(upload_key(uploaded_file), base_df) if preview_pending else None
+        if preview_sample is not None:
+            with perf_recorder.stage('preview'):
+                preview = get_preview(preview_sample, filter_mask, len(df))
+        if preview is not None:
+            compute_exact_in_background(df)
+            st.fragment(render_preview_status, run_every=1)(len(PREVIEW_GETTERS) - len(preview_pending), preview['rows'])
+        else:
+            preview_pending = []
+    
     # Total de análises - usar len(df) direto após filtros
     # A tabela mostra a soma dos registros por empresa, que deve ser igual a len(df)
-    total_analyses = len(df)
-    
-    if 'PERCENTUAL' in df.columns:
-        avg_score = df['PERCENTUAL'].mean()
-    else:
-        avg_score = (df['NOTAS'].mean() / 81) * 100 if 'NOTAS' in df.columns else 0
-    
-    low_risk_pct = (df['ClientRisk'] == 'BAIXO').sum() / len(df) * 100 if 'ClientRisk' in df.columns else 0
-    
-    # Taxa de Saudação (Question1) - mesmo cálculo do gráfico
-    saudacao_pct = 0
-    if 'Question1' in df.columns and len(df) > 0:
-        # Garantir que estamos usando o mesmo cálculo do gráfico de performance
-        saudacao_pct = df['Question1'].mean() * 100
-    else:
-        # Se Question1 não existir, tentar calcular de outra forma
-        saudacao_pct = 0
-    
-    if 'AnalysisDateTime' in df.columns:
-        last_week = df[df['AnalysisDateTime'] >= (datetime.now() - timedelta(days=7))]
-        week_count = len(last_week)
-        week_delta = f"📈 +{week_count} esta semana"
-    else:
-        week_delta = ""
+    with perf_recorder.stage('kpis'):
+        kpis = preview['kpis'] if 'kpis' in preview_pending else get_kpis(df)
+        total_analyses = kpis['total_analyses']
+        avg_score = kpis['avg_score']
+        low_risk_pct = kpis['low_risk_pct']
+        saudacao_pct = kpis['saudacao_pct']
+        
+        # Janelas móveis saem das somas de prefixo do motor de KPIs, sem reler o df
+        kpi_series, kpi_windows = None, None
+        kpi_engine = get_selection_kpi_engine(upload_key(uploaded_file), base_df, df, checklist_filter)
+        if kpi_engine is not None:
+            kpi_series = kpi_engine.series(
+                empresa=None if selected_empresa == 'Todas' else selected_empresa,
+                agent=None if selected_agent == 'Todos' else selected_agent,
+                risk=None if selected_risk == 'Todos' else selected_risk
+            )
+            kpi_anchor = date_range[1] if len(date_range) == 2 else kpi_engine.last_day
+            kpi_windows = kpi_window_table(kpi_series, kpi_anchor).set_index('Métrica')
+            week_count = int(kpi_series.totals(kpi_anchor, 7)['calls'])
+            week_delta = f"📈 +{week_count} nos últimos 7 dias"
+        else:
+            week_delta = ""
     
     with col1:
         st.markdown(f"""
@@ -1601,8 +2447,9 @@ if df is not None and len(df) > 0:
         st.markdown(f"""
         <div class='kpi-card-modern'>
             <div class='kpi-label'>Porcentagem de Acerto</div>
-            <div class='kpi-value'>{round(avg_score)}%</div>
+            <div class='kpi-value'>{round(avg_score)}%{kpi_margin(kpis, 'avg_score')}</div>
             <div class='kpi-delta'>{delta_text}</div>
+            {kpi_trend_line(kpi_windows, 'Porcentagem de Acerto')}
         </div>
         """, unsafe_allow_html=True)
     
@@ -1612,8 +2459,9 @@ if df is not None and len(df) > 0:
         st.markdown(f"""
         <div class='kpi-card-modern'>
             <div class='kpi-label'>Risco Baixo</div>
-            <div class='kpi-value'>{round(low_risk_pct)}%</div>
+            <div class='kpi-value'>{round(low_risk_pct)}%{kpi_margin(kpis, 'low_risk_pct')}</div>
             <div class='kpi-delta'>{risk_text}</div>
+            {kpi_trend_line(kpi_windows, 'Risco Baixo')}
         </div>
         """, unsafe_allow_html=True)
     
@@ -1623,11 +2471,54 @@ if df is not None and len(df) > 0:
         st.markdown(f"""
         <div class='kpi-card-modern'>
             <div class='kpi-label'>Taxa Saudação</div>
-            <div class='kpi-value'>{round(saudacao_pct)}%</div>
+            <div class='kpi-value'>{round(saudacao_pct)}%{kpi_margin(kpis, 'saudacao_pct')}</div>
             <div class='kpi-delta'>{sat_text}</div>
+            {kpi_trend_line(kpi_windows, 'Taxa Saudação')}
         </div>
         """, unsafe_allow_html=True)
     
+    if kpi_series is not None:
+        with st.expander("📆 KPIs por Janela Móvel", expanded=False):
+            st.caption(f"Janelas encerradas em {pd.Timestamp(kpi_anchor).strftime('%d/%m/%Y')}; variações contra a janela anterior de mesmo tamanho")
+            st.dataframe(
+                kpi_windows.style.format({
+                    '7 dias': '{:.1f}%',
+                    '30 dias': '{:.1f}%',
+                    '90 dias': '{:.1f}%',
+                    'Δ Semana': '{:+.1f} p.p.',
+                    'Δ Mês': '{:+.1f} p.p.'
+                }, na_rep='—'),
+                use_container_width=True
+            )
+    
+    with perf_recorder.stage('alertas_anomalia'):
+        alerts = filter_alerts(
+            get_selection_alerts(upload_key(uploaded_file), base_df, df, checklist_filter),
+            empresa=None if selected_empresa == 'Todas' else selected_empresa,
+            agent=None if selected_agent == 'Todos' else selected_agent,
+            start=date_range[0] if len(date_range) == 2 else None,
+            end=date_range[1] if len(date_range) == 2 else None
+        )
+    
+    if len(alerts) > 0:
+        critical_count = int((alerts['Severidade'] == 'Crítico').sum())
+        with st.expander(f"🚨 Alertas de Anomalia ({len(alerts)}, {critical_count} críticos)", expanded=False):
+            st.caption(
+                "Dias em que o acerto caiu ou o risco ALTO subiu muito acima do normal do agente ou da empresa, "
+                "comparando com os 28 dias anteriores. Ordenados do mais para o menos anômalo."
+            )
+            alert_table = alerts.head(100).copy()
+            alert_table['Data'] = alert_table['Data'].dt.strftime('%d/%m/%Y')
+            st.dataframe(
+                alert_table.style.format({
+                    'Valor do Dia': '{:.1f}%',
+                    'Referência': '{:.1f}%',
+                    'z': '{:+.1f}'
+                }, na_rep='—'),
+                use_container_width=True,
+                hide_index=True
+            )
+    
     st.markdown("<br>", unsafe_allow_html=True)
     
     if 'Empresas' in df.columns:
@@ -1636,7 +2527,8 @@ if df is not None and len(df) > 0:
         col1, col2 = st.columns([2, 1])
         
         with col1:
-            company_chart, company_stats = create_company_comparison(df)
+            with perf_recorder.stage('create_company_comparison'):
+                company_chart, company_stats = preview['company_comparison'] if 'company_comparison' in preview_pending else get_company_comparison(df)
             if company_chart:
                 st.plotly_chart(company_chart, use_container_width=True)
         
@@ -1651,7 +2543,8 @@ if df is not None and len(df) > 0:
                     '% Risco Baixo': [company_stats['% Risco Baixo'].mean()]
                 }, index=['MÉDIA GERAL'])
                 
-                company_stats_with_avg = pd.concat([company_stats, media_row])
+                with perf_recorder.stage('tabela_empresas'):
+                    company_stats_with_avg = pd.concat([company_stats, media_row])
                 
                 st.dataframe(
                     company_stats_with_avg.style.format({
@@ -1666,14 +2559,16 @@ if df is not None and len(df) > 0:
     with col1:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
         # Gráfico de Risco Baixo vs Alto (removido Satisfação)
-        risk_comparison_chart = create_risk_baixo_alto_chart(df)
+        with perf_recorder.stage('create_risk_baixo_alto_chart'):
+            risk_comparison_chart = preview['risk_chart'] if 'risk_chart' in preview_pending else get_risk_chart(df)
         if risk_comparison_chart:
             st.plotly_chart(risk_comparison_chart, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
     with col2:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
-        performance_chart = create_performance_chart(df)
+        with perf_recorder.stage('create_performance_chart'):
+            performance_chart = preview['performance_chart'] if 'performance_chart' in preview_pending else get_performance_chart(df)
         if performance_chart:
             st.plotly_chart(performance_chart, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
@@ -1688,7 +2583,8 @@ if df is not None and len(df) > 0:
         if 'ClientRisk' in df.columns:
             required_cols = ['Mp3FileName', 'Justification', 'CustomerAgent']
             if all(col in df.columns for col in required_cols):
-                high_risk_df = df[df['ClientRisk'] == 'ALTO'][required_cols].copy()
+                with perf_recorder.stage('tabela_risco_alto'):
+                    high_risk_df = df[df['ClientRisk'] == 'ALTO'][required_cols].copy()
                 if not high_risk_df.empty:
                     high_risk_df.columns = ['Gravação (MP3)', 'Justificativa', 'Agente']
                     st.dataframe(high_risk_df, use_container_width=True, hide_index=True, height=400)
@@ -1703,14 +2599,16 @@ if df is not None and len(df) > 0:
     
     with col2:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
-        agent_ranking = create_agent_ranking(df)
+        with perf_recorder.stage('create_agent_ranking'):
+            agent_ranking = get_agent_ranking_chart(df, dimensions.agent_labels)
         if agent_ranking:
             st.plotly_chart(agent_ranking, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
     with col3:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
-        bottom_chart = create_bottom_performers(df)
+        with perf_recorder.stage('create_bottom_performers'):
+            bottom_chart = get_bottom_performers_chart(df, dimensions.agent_labels)
         if bottom_chart:
             st.plotly_chart(bottom_chart, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
@@ -1719,7 +2617,8 @@ if df is not None and len(df) > 0:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
         st.markdown("<h3 style='color: " + CARGLASS_DARK_RED + "; font-size: 18px; margin-bottom: 20px;'>🎯 Pontos de Melhoria</h3>", unsafe_allow_html=True)
         
-        improvement_points = create_improvement_points(df)
+        with perf_recorder.stage('create_improvement_points'):
+            improvement_points = get_improvement_points(df)
         
         for q_name, perf in improvement_points:
             if perf < 50:
@@ -1739,7 +2638,8 @@ if df is not None and len(df) > 0:
         st.markdown("</div>", unsafe_allow_html=True)
     
     st.markdown("<div class='content-card'>", unsafe_allow_html=True)
-    timeline = create_timeline_chart(df)
+    with perf_recorder.stage('create_timeline_chart'):
+        timeline = get_timeline_chart(df)
     if timeline:
         st.plotly_chart(timeline, use_container_width=True)
     st.markdown("</div>", unsafe_allow_html=True)
@@ -1747,45 +2647,30 @@ if df is not None and len(df) > 0:
     st.markdown("<br>", unsafe_allow_html=True)
     st.markdown("## 📊 Análise Detalhada por Agente")
     
-    tab1, tab2, tab3 = st.tabs(["📈 Performance Individual", "🎯 Comparativo", "📝 Detalhes"])
-    
-    question_names = {
-        'Question1': 'Saudação',
-        'Question2': 'Dados Cadastrais',
-        'Question3': 'LGPD',
-        'Question4': 'Técnica do Eco',
-        'Question5': 'Escuta Ativa',
-        'Question6': 'Conhecimento',
-        'Question7': 'Confirmação',
-        'Question8': 'Seleção Loja',
-        'Question9': 'Comunicação',
-        'Question10': 'Conduta',
-        'Question11': 'Encerramento',
-        'Question12': 'Pesquisa'
-    }
+    tab1, tab2, tab3, tab4 = st.tabs(["📈 Performance Individual", "🎯 Comparativo", "📝 Detalhes", "⏱️ Latência"])
     
     with tab1:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
         
         selected_agent = st.selectbox(
             "Selecione o Agente para Análise Detalhada",
-            options=sorted(df['CustomerAgent'].unique()) if 'CustomerAgent' in df.columns else [],
+            options=dimensions.agent_options(filter_mask) if 'CustomerAgent' in df.columns else [],
             key='agent_detail'
         )
         
         if selected_agent:
-            agent_df = df[df['CustomerAgent'] == selected_agent]
+            # Recorte pela chave do agente na dimensão, sobre as linhas da seleção
+            agent_df = base_df[filter_mask & dimensions.agent_mask(selected_agent)]
             
-            col1, col2, col3, col4 = st.columns(4)
+            agent_trends = get_agent_trends(df)
+            agent_trend = agent_trends.agent(selected_agent) if agent_trends is not None else {}
+            
+            col1, col2, col3, col4, col5 = st.columns(5)
             
             with col1:
                 st.metric("Total Ligações", len(agent_df))
             with col2:
-                score_col = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
-                if score_col == 'NOTAS':
-                    score_val = (agent_df[score_col].mean() / 81) * 100
-                else:
-                    score_val = agent_df[score_col].mean()
+                score_val = agent_df[SCORE_COLUMN].mean()
                 st.metric("Acerto Médio", f"{round(score_val)}%")
             with col3:
                 risk_baixo = (agent_df['ClientRisk'] == 'BAIXO').sum() / len(agent_df) * 100 if 'ClientRisk' in agent_df.columns else 0
@@ -1794,16 +2679,24 @@ if df is not None and len(df) > 0:
                 agent_df['Client_Cluster'] = agent_df['Client'].apply(get_satisfaction_cluster) if 'Client' in agent_df.columns else None
                 satisfaction = (agent_df['Client_Cluster'] == 'SATISFEITO').sum() / len(agent_df) * 100 if 'Client' in agent_df.columns else 0
                 st.metric("Satisfação", f"{round(satisfaction)}%")
+            with col5:
+                score_trend = agent_trend.get(SCORE_METRIC, np.nan)
+                st.metric(
+                    "Tendência Semanal",
+                    "—" if pd.isna(score_trend) else f"{score_trend:+.1f} p.p.",
+                    delta=None if pd.isna(score_trend) else describe_trend(score_trend),
+                    delta_color='off' if describe_trend(score_trend) in ('estável', 'sem dados') else ('normal' if score_trend > 0 else 'inverse'),
+                    help=f"Inclinação do acerto por semana (mínimo de {MIN_TREND_WEEKS} semanas com análises)"
+                )
             
-            questions_performance = []
-            for i in range(1, 13):
-                q = f'Question{i}'
-                if q in agent_df.columns:
-                    perf = agent_df[q].mean() * 100
-                    questions_performance.append({
-                        'Critério': question_names.get(q, q),
-                        'Performance': perf
-                    })
+            questions_performance = [
+                {
+                    'Critério': QUESTION_NAMES.get(q, q),
+                    'Performance': perf,
+                    'Tendência': agent_trend.get(q, np.nan)
+                }
+                for q, perf in get_question_matrix(df).agent(selected_agent).items()
+            ]
             
             if questions_performance:
                 perf_df = pd.DataFrame(questions_performance)
@@ -1818,8 +2711,10 @@ if df is not None and len(df) > 0:
                         line=dict(color='white', width=2)
                     ),
                     text=[f'{round(p)}%' for p in perf_df['Performance']],
+                    customdata=perf_df['Tendência'],
                     textposition='outside',
-                    textfont=dict(size=11, color=CARGLASS_DARK_RED, family='Inter', weight='bold')
+                    textfont=dict(size=11, color=CARGLASS_DARK_RED, family='Inter', weight='bold'),
+                    hovertemplate='<b>%{y}</b><br>Acerto: %{x:.0f}%<br>Tendência: %{customdata:+.1f} p.p./semana<extra></extra>'
                 ))
                 
                 fig.update_layout(
@@ -1856,21 +2751,9 @@ if df is not None and len(df) > 0:
     with tab2:
         st.markdown("<div class='content-card'>", unsafe_allow_html=True)
         
-        score_col = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
-        
-        if 'CustomerAgent' in df.columns and score_col in df.columns:
-            # Não filtrar risco aqui - precisamos de todas as ligações para cálculo correto
-            agent_comparison = df.groupby('CustomerAgent').agg({
-                score_col: 'mean',
-                'IdAnalysis': 'count',
-                'ClientRisk': lambda x: (x == 'BAIXO').sum() / len(x) * 100 if len(x) > 0 else 0
-            }).round(1)
-            
-            if score_col == 'NOTAS':
-                agent_comparison[score_col] = (agent_comparison[score_col] / 81) * 100
-            
-            agent_comparison.columns = ['Porcentagem Média', 'Total Ligações', '% Risco Baixo']
-            agent_comparison = agent_comparison.sort_values('Porcentagem Média', ascending=False)
+        if 'CustomerAgent' in df.columns:
+            with perf_recorder.stage('tabela_comparativo_agentes'):
+                agent_comparison = get_agent_comparison(df)
             
             fig = go.Figure()
             
@@ -1889,7 +2772,7 @@ if df is not None and len(df) > 0:
                     ),
                     line=dict(width=2, color='white')
                 ),
-                text=[name.split()[0] for name in agent_comparison.index],
+                text=[dimensions.agent_labels.get(name) or display_name(name) for name in agent_comparison.index],
                 textposition='top center',
                 textfont=dict(size=9, color=CARGLASS_DARK_RED, family='Inter'),
                 hovertemplate='<b>%{text}</b><br>Ligações: %{x}<br>Acerto: %{y:.0f}%<br>Risco Baixo: %{marker.size:.1f}%<extra></extra>'
@@ -1932,6 +2815,73 @@ if df is not None and len(df) > 0:
                 height=400
             )
         
+        with perf_recorder.stage('create_question_heatmap'):
+            question_heatmap = get_question_heatmap(df)
+        if question_heatmap:
+            st.plotly_chart(question_heatmap, use_container_width=True)
+        
+        with perf_recorder.stage('falhas_combinadas'):
+            co_failure_heatmap, multiple_failures = get_co_failure_view(df)
+        if co_failure_heatmap:
+            st.plotly_chart(co_failure_heatmap, use_container_width=True)
+            st.caption(f"{multiple_failures:.1f}% das ligações da seleção deixaram de cumprir 2 ou mais critérios.")
+        
+        agent_trends = get_agent_trends(df)
+        if agent_trends is not None:
+            st.markdown("### 📈 Maiores Evoluções e Quedas")
+            trend_metric = st.selectbox(
+                "Métrica",
+                options=agent_trends.metrics,
+                format_func=metric_label,
+                key='trend_metric'
+            )
+            improved, declined = agent_trends.movers(trend_metric)
+            st.caption(f"Inclinação semanal por agente, ponderada pelo volume de ligações (mínimo de {MIN_TREND_WEEKS} semanas com análises)")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("**🚀 Mais evoluíram**")
+                st.dataframe(
+                    improved.style.format({'Tendência (p.p./semana)': '{:+.2f}'}),
+                    use_container_width=True
+                )
+            with col2:
+                st.markdown("**📉 Mais caíram**")
+                st.dataframe(
+                    declined.style.format({'Tendência (p.p./semana)': '{:+.2f}'}),
+                    use_container_width=True
+                )
+        
+        data_cube = get_selection_data_cube(upload_key(uploaded_file), base_df, df, checklist_filter)
+        if data_cube is not None:
+            st.markdown("### 🗓️ Visão por Período")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                pivot_row_label = st.selectbox("Linhas", list(PIVOT_ROWS), key='pivot_rows')
+            with col2:
+                pivot_period_label = st.selectbox("Período", list(PERIODS), key='pivot_period')
+            with col3:
+                pivot_metric = st.selectbox("Métrica", CUBE_METRICS, key='pivot_metric')
+            
+            # O pivô recorta o cubo pré-agregado com os filtros da barra lateral, sem reler o df
+            with perf_recorder.stage('pivot_periodo'):
+                pivot = data_cube.pivot(
+                    PIVOT_ROWS[pivot_row_label],
+                    PERIODS[pivot_period_label],
+                    pivot_metric,
+                    max_rows=40,
+                    empresa=None if selected_empresa == 'Todas' else selected_empresa,
+                    agent=None if selected_agent == 'Todos' else selected_agent,
+                    risk=None if selected_risk == 'Todos' else selected_risk,
+                    start=date_range[0] if len(date_range) == 2 else None,
+                    end=date_range[1] if len(date_range) == 2 else None
+                )
+                period_heatmap = create_period_heatmap(pivot, pivot_row_label, pivot_period_label, pivot_metric)
+            if period_heatmap:
+                st.plotly_chart(period_heatmap, use_container_width=True)
+                if pivot_row_label == 'Agente':
+                    st.caption("Mostrando os 40 agentes com mais análises na seleção")
+        
         st.markdown("</div>", unsafe_allow_html=True)
     
     with tab3:
@@ -1942,20 +2892,17 @@ if df is not None and len(df) > 0:
         
         if 'Empresas' in df.columns:
             display_columns.insert(1, 'Empresas')
-        
-        if 'PERCENTUAL' in df.columns:
-            display_columns.append('PERCENTUAL')
-        elif 'NOTAS' in df.columns:
-            display_columns.append('NOTAS')
+        display_columns.append(SCORE_COLUMN)
         
         available_columns = [col for col in display_columns if col in df.columns]
         
         if available_columns:
-            df_display = df[available_columns].sort_values('AnalysisDateTime', ascending=False).head(100).copy()
+            with perf_recorder.stage('tabela_detalhes'):
+                df_display = df[available_columns].sort_values('AnalysisDateTime', ascending=False).head(100).copy()
             
             # Renomear colunas para exibição
             column_rename = {
-                'PERCENTUAL': 'Percentual %',
+                SCORE_COLUMN: 'Percentual %',
                 'AnalysisDateTime': 'Data Análise',
                 'CustomerAgent': 'Agente',
                 'ClientRisk': 'Risco',
@@ -1974,55 +2921,99 @@ if df is not None and len(df) > 0:
         
         with col1:
             st.markdown("### 📊 Estatísticas Gerais")
-            score_col = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
+            # Estatísticas e histograma saem da junção dos sketches da seleção, sem varrer as linhas
+            with perf_recorder.stage('estatisticas_gerais'):
+                score_sketch = get_filtered_sketches(
+                    'nota', upload_key(uploaded_file), base_df, df,
+                    empresa=None if selected_empresa == 'Todas' else selected_empresa,
+                    agent=None if selected_agent == 'Todos' else selected_agent,
+                    risk=None if selected_risk == 'Todos' else selected_risk,
+                    date_range=date_range,
+                    checklist_filter=checklist_filter
+                )
+                score_sketch = score_sketch.rollup() if score_sketch is not None else None
+                score_stats = score_sketch.stats_frame().iloc[0] if score_sketch is not None else None
             
-            if score_col == 'NOTAS':
-                avg_val = (df[score_col].mean() / 81) * 100
-                med_val = (df[score_col].median() / 81) * 100
-                std_val = (df[score_col].std() / 81) * 100
-                min_val = (df[score_col].min() / 81) * 100
-                max_val = (df[score_col].max() / 81) * 100
+            if score_stats is not None and score_stats['n'] > 0:
+                stats_df = pd.DataFrame({
+                    'Métrica': ['Acerto Médio', 'Acerto Mediano', 'Desvio Padrão', 'Acerto Mínimo', 'Acerto Máximo'],
+                    'Valor': [
+                        f"{round(score_stats['mean'])}%",
+                        f"{round(score_stats['p50'])}%",
+                        f"{round(score_stats['std'])}%" if pd.notna(score_stats['std']) else "—",
+                        f"{round(score_stats['min'])}%",
+                        f"{round(score_stats['max'])}%"
+                    ]
+                })
+                st.dataframe(stats_df, use_container_width=True, hide_index=True)
             else:
-                avg_val = df[score_col].mean()
-                med_val = df[score_col].median()
-                std_val = df[score_col].std()
-                min_val = df[score_col].min()
-                max_val = df[score_col].max()
-            
-            stats_df = pd.DataFrame({
-                'Métrica': ['Acerto Médio', 'Acerto Mediano', 'Desvio Padrão', 'Acerto Mínimo', 'Acerto Máximo'],
-                'Valor': [
-                    f"{round(avg_val)}%",
-                    f"{round(med_val)}%",
-                    f"{round(std_val)}%",
-                    f"{round(min_val)}%",
-                    f"{round(max_val)}%"
-                ]
-            })
-            st.dataframe(stats_df, use_container_width=True, hide_index=True)
+                st.info("Sem notas na seleção.")
         
         with col2:
             st.markdown("### 🏆 Rankings")
-            if 'CustomerAgent' in df.columns:
-                score_col = 'PERCENTUAL' if 'PERCENTUAL' in df.columns else 'NOTAS'
-                
-                if score_col == 'NOTAS':
-                    agent_scores = df.groupby('CustomerAgent')[score_col].mean()
-                    agent_scores = (agent_scores / 81) * 100
-                else:
-                    agent_scores = df.groupby('CustomerAgent')[score_col].mean()
-                
-                best_agents = agent_scores.sort_values(ascending=False).head(3)
-                worst_agents = agent_scores.sort_values(ascending=True).head(3)
+            ranking = get_agent_ranking(df) if 'CustomerAgent' in df.columns else None
+            if ranking is not None:
+                # Mesma nota ajustada ao volume dos gráficos de ranking: poucas ligações não bastam para a medalha
+                best_agents = rank_agents(ranking, 3)
+                worst_agents = rank_agents(ranking, 3, ascending=True)
                 
                 st.markdown("**Top 3 Melhores:**")
-                for i, (agent, score) in enumerate(best_agents.items(), 1):
+                for i, (agent, row) in enumerate(best_agents.iterrows(), 1):
                     medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉"
-                    st.markdown(f"{medal} {agent}: {round(score)}%")
+                    st.markdown(f"{medal} {agent}: {round(row['Nota Ajustada'])}% ({int(row['Total Ligações'])} ligações)")
                 
                 st.markdown("<br>**3 Para Melhorar:**", unsafe_allow_html=True)
-                for agent, score in worst_agents.items():
-                    st.markdown(f"📈 {agent}: {round(score)}%")
+                for agent, row in worst_agents.iterrows():
+                    st.markdown(f"📈 {agent}: {round(row['Nota Ajustada'])}% ({int(row['Total Ligações'])} ligações)")
+        
+        if score_stats is not None and score_stats['n'] > 0:
+            score_histogram = get_score_histogram(score_sketch)
+            st.plotly_chart(score_histogram, use_container_width=True)
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+    
+    with tab4:
+        st.markdown("<div class='content-card'>", unsafe_allow_html=True)
+        st.markdown("### ⏱️ Tempo entre Ligação e Análise")
+        
+        # Percentis saem de sketches mergeáveis por dia × empresa: o recorte soma sketches, sem ordenar o df
+        with perf_recorder.stage('latencia'):
+            latency = get_filtered_sketches(
+                'latencia', upload_key(uploaded_file), base_df, df,
+                empresa=None if selected_empresa == 'Todas' else selected_empresa,
+                agent=None if selected_agent == 'Todos' else selected_agent,
+                risk=None if selected_risk == 'Todos' else selected_risk,
+                date_range=date_range,
+                checklist_filter=checklist_filter
+            )
+            overall = latency.rollup().quantile_frame().iloc[0] if latency is not None else None
+        
+        if overall is None or overall['n'] == 0:
+            st.info("Sem datas de ligação (CallDate) e de análise na seleção para calcular a latência.")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Mediana (p50)", format_minutes(overall['p50']))
+            col2.metric("p90", format_minutes(overall['p90']))
+            col3.metric("p99", format_minutes(overall['p99']))
+            col4.metric("Análises com Latência", f"{int(overall['n']):,}")
+            st.caption("Percentis aproximados com erro relativo de até 1%.")
+            
+            with perf_recorder.stage('create_latency_chart'):
+                latency_chart = get_latency_chart(latency)
+            if latency_chart:
+                st.plotly_chart(latency_chart, use_container_width=True)
+            
+            company_latency = latency.rollup('Empresas').quantile_frame()
+            if 'Empresas' in df.columns:
+                st.markdown("### 🏢 Latência por Empresa")
+                company_table = pd.DataFrame({
+                    'Empresa': company_latency['Empresas'],
+                    'p50': company_latency['p50'].map(format_minutes),
+                    'p90': company_latency['p90'].map(format_minutes),
+                    'p99': company_latency['p99'].map(format_minutes),
+                    'Análises': company_latency['n'].astype(np.int64)
+                })
+                st.dataframe(company_table, use_container_width=True, hide_index=True)
         
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -2054,3 +3045,27 @@ else:
             <p style='color: """ + CARGLASS_GRAY + """;'>Identifique padrões e oportunidades de melhoria ao longo do tempo</p>
         </div>
         """, unsafe_allow_html=True)
+
+rerun_profiler.stop()
+if rerun_profiler.enabled:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("🔬 Perfil de Funções", expanded=False):
+            render_profile_report(rerun_profiler, 'rerun')
+            for i, job_profile in enumerate(reversed(get_job_profiles().get(st.session_state['session_id'], ()))):
+                st.markdown(f"**{job_profile.label}**")
+                render_profile_report(job_profile, f"job_{i}")
+
+if perf_recorder.enabled:
+    with st.sidebar:
+        st.markdown("---")
+        with st.expander("⏱️ Performance", expanded=False):
+            st.caption(f"Rerun total: {round(perf_recorder.total_ms())} ms")
+            if perf_recorder.records:
+                perf_df = pd.DataFrame(perf_recorder.records)
+                perf_df['stage'] = ['· ' * depth + stage for stage, depth in zip(perf_df['stage'], perf_df['depth'])]
+                perf_df = perf_df.drop(columns=['depth'])
+                perf_df.columns = ['Etapa', 'Tempo (ms)', 'Δ RSS (KB)']
+                st.dataframe(perf_df, use_container_width=True, hide_index=True)
+            st.caption(f"Log: {perf_recorder.log_path}")
+    perf_recorder.flush()
@@ -0,0 +1,72 @@
+"""Gerador de planilhas Consulta1 sintéticas para benchmarks e testes de carga.
+
+Uso:
+    python synthetic_data.py 50000 consulta1_sintetica.xlsx
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+RISK_LEVELS = ['BAIXO', 'MEDIO', 'ALTO', 'INDETERMINADO']
+RISK_WEIGHTS = [0.6, 0.2, 0.15, 0.05]
+CLIENT_LEVELS = ['ALTA', 'NEUTRA', 'BAIXA', 'SATISFEITO', 'INSATISFEITO']
+
+
+def make_consulta1(n_rows, seed=0, n_agents=40, n_companies=4, days=180, start='2025-01-01'):
+    """DataFrame com as mesmas colunas da aba Consulta1 exportada pelo sistema de origem"""
+    rng = np.random.default_rng(seed)
+
+    first_names = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João']
+    last_names = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Ferreira']
+    agents = np.array([
+        f"{first_names[i % len(first_names)]} {last_names[(i // len(first_names)) % len(last_names)]} {i:03d}"
+        for i in range(n_agents)
+    ], dtype=object)
+    companies = np.array([f"Empresa {chr(ord('A') + i)}" for i in range(n_companies)], dtype=object)
+
+    # Cada agente atende por uma empresa e tem uma taxa de acerto própria
+    agent_company = rng.integers(0, n_companies, n_agents)
+    agent_skill = rng.uniform(0.45, 0.95, n_agents)
+    question_difficulty = np.linspace(0.15, -0.15, 12)
+
+    agent_idx = rng.integers(0, n_agents, n_rows)
+    call_date = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days * 24 * 60, n_rows), unit='m')
+    analysis_delay = pd.to_timedelta(rng.gamma(2.0, 6.0, n_rows) * 60, unit='m')
+
+    hit_prob = np.clip(agent_skill[agent_idx, None] + question_difficulty[None, :], 0.02, 0.99)
+    questions = (rng.random((n_rows, 12)) < hit_prob).astype(float)
+    score = questions.mean(axis=1) * 100
+    # Uma pequena parte das análises sai com nota inválida, como no sistema real
+    invalid = rng.random(n_rows) < 0.02
+    score[invalid] = rng.uniform(0, 19, invalid.sum())
+
+    data = {
+        'IdAnalysis': np.arange(1, n_rows + 1),
+        'AnalysisDateTime': (call_date + analysis_delay).round('s'),
+        'CallDate': call_date,
+        'CustomerAgent': agents[agent_idx],
+        'Empresas': companies[agent_company[agent_idx]],
+        'Client': rng.choice(CLIENT_LEVELS, n_rows),
+        'ClientRisk': rng.choice(RISK_LEVELS, n_rows, p=RISK_WEIGHTS),
+        'ClientOutcome': rng.choice(['RESOLVIDO', 'NÃO RESOLVIDO'], n_rows, p=[0.8, 0.2]),
+        'Mp3FileName': [f"gravacao_{i:08d}.mp3" for i in range(1, n_rows + 1)],
+        'Justification': rng.choice(['Cliente satisfeito', 'Cliente reclamou do prazo', 'Cliente ameaçou cancelar'], n_rows)
+    }
+    for i in range(12):
+        data[f'Question{i + 1}'] = questions[:, i]
+    data['Avaliação 100 pts'] = score.round(2)
+    data['NOTAS'] = (score / 100 * 81).round(1)
+
+    return pd.DataFrame(data)
+
+
+def write_workbook(df, path):
+    df.to_excel(path, sheet_name='Consulta1', index=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    write_workbook(make_consulta1(int(sys.argv[1])), sys.argv[2])
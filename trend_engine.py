@@ -0,0 +1,114 @@
+"""Tendência semanal por agente, para o acerto geral e cada critério do checklist.
+
+As análises são agrupadas por agente e semana (segunda a domingo) em somas e
+contagens; a inclinação de cada agente × métrica sai de uma regressão linear
+ponderada pelo número de ligações da semana, resolvida em forma fechada para
+todos os agentes de uma vez. A unidade é pontos percentuais por semana.
+"""
+import numpy as np
+import pandas as pd
+
+from checklist_bits import QUESTION_NAMES, checklist_questions, question_values
+from schema import SCORE_COLUMN
+
+SCORE_METRIC = SCORE_COLUMN
+MIN_TREND_WEEKS = 3
+# Inclinação (p.p./semana) a partir da qual a tendência deixa de ser "estável"
+TREND_THRESHOLD = 0.5
+
+
+def metric_label(metric):
+    return 'Acerto Geral' if metric == SCORE_METRIC else QUESTION_NAMES.get(metric, metric)
+
+
+def describe_trend(slope):
+    if pd.isna(slope):
+        return 'sem dados'
+    if slope >= TREND_THRESHOLD:
+        return 'positiva'
+    if slope <= -TREND_THRESHOLD:
+        return 'negativa'
+    return 'estável'
+
+
+class AgentTrends:
+    def __init__(self, agents, metrics, slopes, weeks, calls):
+        self.agents = agents
+        self.metrics = metrics
+        self.slopes = slopes
+        self.weeks = weeks
+        self.calls = calls
+        self._positions = {agent: i for i, agent in enumerate(agents)}
+
+    def agent(self, name):
+        """Inclinação de cada métrica para um agente (NaN com menos de MIN_TREND_WEEKS semanas)"""
+        i = self._positions.get(name)
+        if i is None:
+            return {metric: np.nan for metric in self.metrics}
+        return dict(zip(self.metrics, self.slopes[i]))
+
+    def agent_weeks(self, name):
+        i = self._positions.get(name)
+        return 0 if i is None else int(self.weeks[i])
+
+    def movers(self, metric=SCORE_METRIC, n=5):
+        """Agentes que mais evoluíram e que mais caíram na métrica, com tendência definida"""
+        column = self.metrics.index(metric)
+        frame = pd.DataFrame({
+            'Tendência (p.p./semana)': self.slopes[:, column],
+            'Semanas': self.weeks,
+            'Total Ligações': self.calls
+        }, index=pd.Index(self.agents, name='Agente')).dropna(subset=['Tendência (p.p./semana)'])
+        improved = frame[frame['Tendência (p.p./semana)'] > 0].nlargest(n, 'Tendência (p.p./semana)')
+        declined = frame[frame['Tendência (p.p./semana)'] < 0].nsmallest(n, 'Tendência (p.p./semana)')
+        return improved, declined
+
+
+def build_agent_trends(df, agent_col='CustomerAgent'):
+    """Inclinações semanais de todos os agentes; None sem datas ou agentes"""
+    if agent_col not in df.columns or 'AnalysisDateTime' not in df.columns:
+        return None
+
+    metrics = [SCORE_METRIC]
+    values = [df[SCORE_COLUMN].to_numpy(dtype=float)]
+    for q in checklist_questions(df):
+        metrics.append(q)
+        values.append(question_values(df, q) * 100)
+
+    codes, agents = pd.factorize(df[agent_col], sort=True)
+    days = df['AnalysisDateTime'].dt.normalize()
+    valid = (codes >= 0) & days.notna().to_numpy()
+    if not valid.any():
+        return None
+
+    # Semana relativa à primeira segunda-feira do conjunto
+    first_monday = days[valid].min() - pd.Timedelta(days=days[valid].min().weekday())
+    week = ((days[valid] - first_monday).dt.days.to_numpy() // 7).astype(np.int64)
+    codes = codes[valid]
+    n_agents, n_weeks = len(agents), int(week.max()) + 1
+    flat = codes * n_weeks + week
+    size = n_agents * n_weeks
+
+    calls = np.bincount(codes, minlength=n_agents)
+    calls_per_week = np.bincount(flat, minlength=size).reshape(n_agents, n_weeks)
+    weeks_with_data = (calls_per_week > 0).sum(axis=1)
+
+    x = np.arange(n_weeks, dtype=float)
+    slopes = np.full((n_agents, len(metrics)), np.nan)
+    for j, metric_values in enumerate(values):
+        y = metric_values[valid]
+        present = ~np.isnan(y)
+        # Somas ponderadas pelo nº de ligações de cada semana: Σw, Σwx, Σwy, Σwx², Σwxy
+        w = np.bincount(flat[present], minlength=size).reshape(n_agents, n_weeks).astype(float)
+        wy = np.bincount(flat[present], weights=y[present], minlength=size).reshape(n_agents, n_weeks)
+        s = w.sum(axis=1)
+        sx = w @ x
+        sxx = w @ (x ** 2)
+        sy = wy.sum(axis=1)
+        sxy = wy @ x
+        denominator = s * sxx - sx ** 2
+        enough = ((w > 0).sum(axis=1) >= MIN_TREND_WEEKS) & (denominator > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes[:, j] = np.where(enough, (s * sxy - sx * sy) / denominator, np.nan)
+
+    return AgentTrends(list(agents), metrics, slopes, weeks_with_data, calls)
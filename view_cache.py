@@ -0,0 +1,62 @@
+"""Pré-aquecimento em segundo plano das visões por empresa após o upload.
+
+Uma visão é um dataset recortado só por empresa ("Todas" ou uma das
+Empresas), sem outros filtros. Logo após o upload, um pool de threads
+calcula as visões de todas as empresas, e a troca de empresa no dashboard já
+encontra tudo pronto. Os agregados e gráficos ficam no cache do processo
+(bounded_cache.py), compartilhado por todas as sessões; um valor sendo
+calculado pelo pré-aquecimento não é recalculado pela sessão que o pedir:
+ela espera o resultado em andamento. Aqui fica só o agendamento e o
+andamento de cada dataset.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+WARMUP_WORKERS_ENV_VAR = 'MONITORAI_WARMUP_WORKERS'
+# Uma thread basta: o pré-aquecimento não deve disputar CPU com os reruns das sessões
+DEFAULT_WARMUP_WORKERS = 1
+MAX_DATASETS = 4
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCache:
+    def __init__(self, workers=None, max_datasets=MAX_DATASETS):
+        workers = workers if workers is not None else int(os.environ.get(WARMUP_WORKERS_ENV_VAR, DEFAULT_WARMUP_WORKERS))
+        self.max_datasets = max_datasets
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='monitorai-warmup')
+        self._lock = threading.Lock()
+        # dataset -> andamento, do agendado há mais tempo para o mais recente
+        self._progress = OrderedDict()
+
+    def schedule(self, dataset_key, views, warm):
+        """Agenda warm(visão) para cada visão do dataset, uma única vez por dataset"""
+        with self._lock:
+            if dataset_key in self._progress:
+                return
+            self._progress[dataset_key] = {'done': 0, 'total': len(views)}
+            while len(self._progress) > self.max_datasets:
+                self._progress.popitem(last=False)
+        self._executor.submit(self._run, dataset_key, list(views), warm)
+
+    def _run(self, dataset_key, views, warm):
+        for view in views:
+            with self._lock:
+                if dataset_key not in self._progress:
+                    return
+            try:
+                warm(view)
+            except Exception:
+                logger.exception("Falha ao pré-aquecer a visão %s", view)
+            with self._lock:
+                if dataset_key in self._progress:
+                    self._progress[dataset_key]['done'] += 1
+
+    def progress(self, dataset_key):
+        """(visões prontas, total) do pré-aquecimento do dataset; None se não foi agendado"""
+        with self._lock:
+            progress = self._progress.get(dataset_key)
+            return (progress['done'], progress['total']) if progress else None